@@ -10,7 +10,7 @@ Item {
     property var bedTemperature: null // int
     property var targetBedTemperature: null
     property int maxBedTemperature : OutputDevice.max_bed_temperature
-    property var bedTemperatures : OutputDevice.historical_bed_temperatures // Array[number]
+    property var bedTemperatures : OutputDevice.bed_temperature_history // TemperatureHistory
 
     height: 40 * screenScaleFactor
     width: childrenRect.width
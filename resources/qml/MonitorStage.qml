@@ -1,6 +1,6 @@
 // Copyright 2020 Luc Rubio <luc@loociano.com>
 // Plugin is licensed under the GNU Lesser General Public License v3.0.
-import QtQuick 2.2
+import QtQuick 2.15
 import QtQuick.Controls 2.0
 import UM 1.3 as UM
 import Cura 1.0 as Cura
@@ -20,6 +20,7 @@ Component
         }
 
         Item {
+            id: activePrinterSection
             anchors {
                 top: parent.top
                 topMargin: 48 * screenScaleFactor
@@ -47,6 +48,18 @@ Component
                             printer: OutputDevice.printer
                         }
 
+                        CheckBox {
+                            id: broadcastTargetCheckBox
+                            anchors {
+                                top: printerCard.bottom
+                                topMargin: UM.Theme.getSize('default_margin').height
+                                left: printerCard.left
+                            }
+                            text: catalog.i18nc('@option:check', 'Include in multi-printer send')
+                            checked: OutputDevice.is_broadcast_target
+                            onClicked: OutputDevice.setBroadcastTarget(checked)
+                        }
+
                         Item {
                             anchors {
                                 top: printerCard.bottom
@@ -90,5 +103,52 @@ Component
                 }
             }
         }
+
+        Item {
+            id: fleetSection
+            anchors {
+                top: activePrinterSection.bottom
+                topMargin: 48 * screenScaleFactor
+                bottom: parent.bottom
+                horizontalCenter: parent.horizontalCenter
+            }
+            width: 834 * screenScaleFactor
+            visible: OutputDevice.fleet !== null && OutputDevice.fleet.count > 1
+
+            Label {
+                id: fleetLabel
+                text: catalog.i18nc('@label', 'All printers') + ' (' + (OutputDevice.fleet ? OutputDevice.fleet.count : 0) + ')'
+                color: UM.Theme.getColor('monitor_text_primary')
+                font: UM.Theme.getFont('large_bold')
+                renderType: Text.NativeRendering
+            }
+
+            // Virtualized: delegates, and their charts, exist only for the cards
+            // in view plus one row above and below.
+            GridView {
+                id: fleetGrid
+                anchors {
+                    top: fleetLabel.bottom
+                    topMargin: UM.Theme.getSize('default_margin').height
+                    left: parent.left
+                    right: parent.right
+                    bottom: parent.bottom
+                }
+                clip: true
+                model: fleetSection.visible ? OutputDevice.fleet : null
+                cellWidth: width / 3
+                cellHeight: 156 * screenScaleFactor
+                cacheBuffer: cellHeight
+                // Recycles delegates scrolled out of view.
+                reuseItems: true
+                boundsBehavior: Flickable.StopAtBounds
+                ScrollBar.vertical: ScrollBar {}
+                delegate: MonitorFleetCard {
+                    width: fleetGrid.cellWidth - 12 * screenScaleFactor
+                    height: fleetGrid.cellHeight - 12 * screenScaleFactor
+                    device: model.device
+                }
+            }
+        }
     }
 }
@@ -9,7 +9,7 @@ Item {
     property var hotendTemperature : null // int
     property var targetHotendTemperature : null // int
     property int maxHotendTemperature : OutputDevice.max_hotend_temperature
-    property var hotendTemperatures : OutputDevice.historical_hotend_temperatures // Array[number]
+    property var hotendTemperatures : OutputDevice.hotend_temperature_history // TemperatureHistory
 
     height: 40 * screenScaleFactor
     width: childrenRect.width
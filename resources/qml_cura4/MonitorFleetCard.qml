@@ -0,0 +1,84 @@
+// Copyright 2020 Luc Rubio <luc@loociano.com>
+// Plugin is licensed under the GNU Lesser General Public License v3.0.
+import QtQuick 2.3
+import QtQuick.Controls 2.0
+import UM 1.3 as UM
+
+// Compact card of one printer in the fleet overview. Binds to the device
+// directly, so only cards in view follow status updates.
+Item {
+    id: fleetCard
+    property var device: null // MPSM2NetworkedPrinterOutputDevice
+    property var printer: device ? device.printer : null
+    property var borderSize: 1 * screenScaleFactor
+
+    Rectangle {
+        anchors.fill: parent
+        color: UM.Theme.getColor('monitor_card_background')
+        border {
+            color: device === OutputDevice
+                ? UM.Theme.getColor('primary')
+                : UM.Theme.getColor('monitor_card_border')
+            width: borderSize
+        }
+        radius: 2 * screenScaleFactor
+    }
+
+    Column {
+        anchors {
+            fill: parent
+            margins: 12 * screenScaleFactor
+        }
+        spacing: 6 * screenScaleFactor
+
+        Label {
+            width: parent.width
+            text: device ? device.name : ''
+            color: UM.Theme.getColor('monitor_text_primary')
+            elide: Text.ElideRight
+            font: UM.Theme.getFont('default_bold')
+            renderType: Text.NativeRendering
+        }
+
+        Label {
+            width: parent.width
+            text: {
+                if (!printer) {
+                    return ''
+                }
+                switch (printer.state) {
+                    case 'idle':
+                        return catalog.i18nc('@label:status', 'Ready to print')
+                    case 'printing':
+                        return catalog.i18nc('@label:status', 'Printing') + ' '
+                            + (printer.activePrintJob ? printer.activePrintJob.progress : 0) + '%'
+                }
+                return ''
+            }
+            color: UM.Theme.getColor('monitor_text_primary')
+            elide: Text.ElideRight
+            font: UM.Theme.getFont('default')
+            renderType: Text.NativeRendering
+        }
+
+        Label {
+            width: parent.width
+            text: printer
+                ? printer.extruders[0].hotendTemperature + '/' + printer.extruders[0].targetHotendTemperature + 'ºC  '
+                    + printer.bedTemperature + '/' + printer.targetBedTemperature + 'ºC'
+                : ''
+            color: UM.Theme.getColor('monitor_text_primary')
+            elide: Text.ElideRight
+            font: UM.Theme.getFont('default')
+            renderType: Text.NativeRendering
+        }
+
+        TemperatureChart {
+            width: parent.width
+            height: 40 * screenScaleFactor
+            temperatures: device ? device.hotend_temperature_history : null
+            targetTemperature: printer ? printer.extruders[0].targetHotendTemperature : 0
+            maxTemperature: device ? device.max_hotend_temperature : 0
+        }
+    }
+}
@@ -3,6 +3,7 @@
 import QtQuick 2.2
 import QtQuick.Controls 1.4
 import QtQuick.Controls.Styles 1.4
+import QtQuick.Controls 2.0 as Controls2
 import UM 1.3 as UM
 import Cura 1.0 as Cura
 import QtGraphicalEffects 1.0
@@ -22,6 +23,7 @@ Component
         }
 
         Item {
+            id: activePrinterSection
             anchors {
                 top: parent.top
                 topMargin: 48 * screenScaleFactor
@@ -49,6 +51,18 @@ Component
                             printer: OutputDevice.printer
                         }
 
+                        CheckBox {
+                            id: broadcastTargetCheckBox
+                            anchors {
+                                top: printerCard.bottom
+                                topMargin: UM.Theme.getSize('default_margin').height
+                                left: printerCard.left
+                            }
+                            text: catalog.i18nc('@option:check', 'Include in multi-printer send')
+                            checked: OutputDevice.is_broadcast_target
+                            onClicked: OutputDevice.setBroadcastTarget(checked)
+                        }
+
                         Item {
                             anchors {
                                 top: printerCard.bottom
@@ -94,5 +108,50 @@ Component
                 }
             }
         }
+
+        Item {
+            id: fleetSection
+            anchors {
+                top: activePrinterSection.bottom
+                topMargin: 48 * screenScaleFactor
+                bottom: parent.bottom
+                horizontalCenter: parent.horizontalCenter
+            }
+            width: 834 * screenScaleFactor
+            visible: OutputDevice.fleet !== null && OutputDevice.fleet.count > 1
+
+            Label {
+                id: fleetLabel
+                text: catalog.i18nc('@label', 'All printers') + ' (' + (OutputDevice.fleet ? OutputDevice.fleet.count : 0) + ')'
+                color: UM.Theme.getColor('monitor_text_primary')
+                font: UM.Theme.getFont('large_bold')
+                renderType: Text.NativeRendering
+            }
+
+            // Virtualized: delegates, and their charts, exist only for the cards
+            // in view plus one row above and below.
+            GridView {
+                id: fleetGrid
+                anchors {
+                    top: fleetLabel.bottom
+                    topMargin: UM.Theme.getSize('default_margin').height
+                    left: parent.left
+                    right: parent.right
+                    bottom: parent.bottom
+                }
+                clip: true
+                model: fleetSection.visible ? OutputDevice.fleet : null
+                cellWidth: width / 3
+                cellHeight: 156 * screenScaleFactor
+                cacheBuffer: cellHeight
+                boundsBehavior: Flickable.StopAtBounds
+                Controls2.ScrollBar.vertical: Controls2.ScrollBar {}
+                delegate: MonitorFleetCard {
+                    width: fleetGrid.cellWidth - 12 * screenScaleFactor
+                    height: fleetGrid.cellHeight - 12 * screenScaleFactor
+                    device: model.device
+                }
+            }
+        }
     }
 }
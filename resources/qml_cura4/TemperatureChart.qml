@@ -1,81 +1,56 @@
 // Copyright 2020 Luc Rubio <luc@loociano.com>
 // Plugin is licensed under the GNU Lesser General Public License v3.0.
 import QtQuick 2.3
-import "../js/Chart.js" as Chart
+import QtQuick.Controls 2.0
+import UM 1.3 as UM
+import MPSM2 1.0 as MPSM2
 
-Chart {
-    property var temperatures // Array[number]
+Item {
+    id: chart
+    property var temperatures // TemperatureHistory
     property int targetTemperature
     property int maxTemperature
 
-    function generateFlatData(value) {
-        var result = [];
-        for (var i = 0; i < temperatures.length; i++) {
-            result.push(value);
+    MPSM2.TemperaturePlot {
+        anchors {
+            left: parent.left
+            right: axisLabels.left
+            rightMargin: 4 * screenScaleFactor
+            top: parent.top
+            bottom: parent.bottom
         }
-        return result;
+        history: temperatures
+        targetTemperature: chart.targetTemperature
+        maxTemperature: chart.maxTemperature
+        lineColor: '#80c0ff'
+        targetColor: '#0464b9'
     }
 
-    function generateData() {
-        animateToNewData();
-        return temperatures
-    }
+    Item {
+        id: axisLabels
+        anchors {
+            right: parent.right
+            top: parent.top
+            bottom: parent.bottom
+        }
+        width: Math.max(maxLabel.contentWidth, minLabel.contentWidth)
 
-    chartType: 'line'
-    chartData: {
-        return {
-            labels: generateFlatData(''),
-            datasets: [{
-                fill: false,
-                pointRadius: 0,
-                borderColor: 'rgba(128,192,255,255)',
-                borderWidth: 2,
-                hoverBorderWidth: 0,
-                hoverRadius: 0,
-                hitRadius: 0,
-                data: generateData(),
-            },{
-                fill: false,
-                pointRadius: 0,
-                borderColor: 'rgba(4,100,185,255)',
-                borderWidth: 1,
-                borderDash: [100, 100],
-                hitRadius: 0,
-                data: generateFlatData(targetTemperature),
-            }]
+        Label {
+            id: maxLabel
+            anchors.top: parent.top
+            text: chart.maxTemperature + 'ºC'
+            color: UM.Theme.getColor('monitor_text_primary')
+            font.pixelSize: 10 * screenScaleFactor
+            renderType: Text.NativeRendering
         }
-    }
-    chartOptions: {
-        return {
-            animation: false,
-            maintainAspectRatio: false,
-            responsive: true,
-            legend: {
-                display: false,
-            },
-            tooltips: {
-                enabled: false,
-            },
-            scales: {
-                xAxes: [{
-                    display: false,
-                    position: 'bottom',
-                }],
-                yAxes: [{
-                    type: 'linear',
-                    display: true,
-                    position: 'right',
-                    ticks: {
-                        max: maxTemperature,
-                        min: 0,
-                        maxTicksLimit: 2,
-                        fontSize: 10,
-                        callback: function(value, index, values) {
-                            return value + 'ºC';
-                        },
-                    }
-                }]
-            }
+
+        Label {
+            id: minLabel
+            anchors.bottom: parent.bottom
+            text: '0ºC'
+            color: UM.Theme.getColor('monitor_text_primary')
+            font.pixelSize: 10 * screenScaleFactor
+            renderType: Text.NativeRendering
         }
     }
-}
\ No newline at end of file
+}
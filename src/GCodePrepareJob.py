@@ -0,0 +1,66 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import hashlib
+from typing import Optional, Tuple
+
+try:
+  # Cura 5.0.0+.
+  from PyQt6.QtCore import QByteArray
+except ImportError:
+  # Cura 4.9.1 or older.
+  from PyQt5.QtCore import QByteArray
+
+from UM.Job import Job
+
+# pylint:disable=relative-beyond-top-level
+from .GCodeWriteFileJob import GCodeWriteFileJob
+from .metrics.Tracing import Trace, begin_span
+from .models.PrintTimeTable import PrintTimeTable
+from .parsers import GcodePreheatSettingsParser
+from .parsers import GcodePrintTimeParser
+
+
+class GCodePrepareJob(Job):
+  """Prepares written g-code for upload on a worker thread.
+
+  Encodes the g-code, parses its preheat temperatures, builds its print time
+  table and hashes it, which takes seconds for big models. Listeners of
+  finished are called on the main thread.
+  """
+
+  def __init__(self, write_job: GCodeWriteFileJob,
+               trace: Optional[Trace] = None) -> None:
+    """Constructor.
+
+    Args:
+      write_job: Finished g-code write job.
+      trace: Records the stages. Can be None.
+    """
+    super().__init__()
+    self._write_job = write_job
+    self._trace = trace
+    self.file_name = write_job.getFileName()
+    self.payload: Optional[QByteArray] = None
+    self.preheat_temperatures: Tuple[Optional[int], Optional[int]] = (
+        None, None)
+    self.print_time_table: Optional[PrintTimeTable] = None
+    # SHA-256 of the g-code, to recognize a model the printer already holds.
+    self.content_hash: Optional[str] = None
+
+  def run(self) -> None:
+    """See base class."""
+    with begin_span(self._trace, 'encode') as span:
+      gcode = self._write_job.get_gcode_output()
+      self.payload = QByteArray(gcode)
+      span.end(bytes_processed=len(gcode))
+    with begin_span(self._trace, 'parse_preheat') as span:
+      self.preheat_temperatures = GcodePreheatSettingsParser.parse(gcode)
+      span.end(bytes_processed=len(gcode))
+    with begin_span(self._trace, 'parse_print_times') as span:
+      self.print_time_table = GcodePrintTimeParser.parse(gcode)
+      span.end(bytes_processed=len(gcode))
+    with begin_span(self._trace, 'hash') as span:
+      self.content_hash = hashlib.sha256(gcode).hexdigest()
+      span.end(bytes_processed=len(gcode))
@@ -3,31 +3,82 @@ Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
 import io
+import threading
 from typing import List, Optional
 
 from UM.FileHandler.FileHandler import FileHandler
 from UM.FileHandler.WriteFileJob import WriteFileJob
 from UM.FileHandler.FileWriter import FileWriter
+from UM.Logger import Logger
 from UM.Scene.SceneNode import SceneNode
 
 # pylint:disable=import-error
 from cura.CuraApplication import CuraApplication
+# pylint:disable=relative-beyond-top-level
+from .network.GCodeStream import GCodeStream
 
 
 class GCodeWriteFileJob(WriteFileJob):
   """Represents a g-code write file job."""
   def __init__(self, file_handler: Optional[FileHandler],
-               nodes: List[SceneNode]) -> None:
+               nodes: List[SceneNode],
+               stream: Optional[GCodeStream] = None) -> None:
+    """Constructor.
+
+    Args:
+      file_handler: Provides the g-code writer.
+      nodes: Scene nodes to write.
+      stream: Hands the g-code to an upload while it is written. By default,
+        the g-code is only kept in memory.
+    """
     # GCodeWriter only supports TextMode.
     super().__init__(file_handler.getWriterByMimeType('text/x-gcode'),
-                     io.StringIO(), nodes,
+                     stream or io.StringIO(), nodes,
                      FileWriter.OutputMode.TextMode)
     job_name = CuraApplication.getInstance().getPrintInformation().jobName
     self.setFileName(f'{job_name}.gcode')
 
+  def start(self) -> None:
+    """See base class. Streamed g-code is written on a dedicated thread.
+
+    The writer blocks while the upload drains the stream, which would hold a
+    worker of Cura's shared job queue for the whole transfer.
+    """
+    if not isinstance(self.getStream(), GCodeStream):
+      super().start()
+      return
+    threading.Thread(target=self._run_and_finish, name='GCodeStreamWriter',
+                     daemon=True).start()
+
+  def _run_and_finish(self) -> None:
+    """Writes the g-code, then notifies listeners of finished like the job
+    queue does."""
+    try:
+      self.run()
+    except Exception as error:  # pylint:disable=broad-except
+      Logger.logException('e', 'Could not write g-code.')
+      self.setError(error)
+    self.finished.emit(self)
+
+  def run(self) -> None:
+    """See base class. Tells the upload when the g-code is complete."""
+    stream = self.getStream()
+    if not isinstance(stream, GCodeStream):
+      super().run()
+      return
+    try:
+      super().run()
+    finally:
+      if self.getResult():
+        stream.finish()
+      else:
+        stream.cancel()  # Writer failed: abort the upload too.
+
   def get_gcode_output(self) -> bytes:
     """Produces a readable g-code output of the model.
 
+    Not available for streamed g-code, which is not kept.
+
     Returns:
       UTF-8 stream.
     """
@@ -3,19 +3,21 @@ Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
 import os
-from typing import List, Optional
+import time
+from typing import Callable, List, Optional, Tuple
 
 USE_QT5 = False
 try:
   # Cura 5.0.0+.
-  from PyQt6.QtCore import pyqtProperty, pyqtSignal, QObject, pyqtSlot
+  from PyQt6.QtCore import pyqtProperty, pyqtSignal, QByteArray, QObject, QTimer, pyqtSlot
 except ImportError:
   # Cura 4.9.1 or older.
-  from PyQt5.QtCore import pyqtProperty, pyqtSignal, QObject, pyqtSlot
+  from PyQt5.QtCore import pyqtProperty, pyqtSignal, QByteArray, QObject, QTimer, pyqtSlot
   USE_QT5 = True
 
 from UM.FileHandler.FileHandler import FileHandler
 from UM.Logger import Logger
+from UM.Resources import Resources
 from UM.Scene.SceneNode import SceneNode
 from UM.i18n import i18nCatalog
 # pylint:disable=import-error
@@ -26,11 +28,13 @@ from cura.PrinterOutput.Models.PrinterOutputModel import PrinterOutputModel
 from cura.PrinterOutput.NetworkedPrinterOutputDevice import NetworkedPrinterOutputDevice, AuthState
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionType, ConnectionState
 # pylint:disable=relative-beyond-top-level
+from .GCodePrepareJob import GCodePrepareJob
 from .GCodeWriteFileJob import GCodeWriteFileJob
 from .MPSM2OutputController import MPSM2OutputController
 from .messages.NetworkErrorMessage import NetworkErrorMessage
 from .messages.PrintJobCancelErrorMessage import PrintJobCancelErrorMessage
 from .messages.PrintJobPauseErrorMessage import PrintJobPauseErrorMessage
+from .messages.PrintJobReprintMessage import PrintJobReprintMessage
 from .messages.PrintJobStartErrorMessage import PrintJobStartErrorMessage
 from .messages.PrintJobUploadBlockedMessage import PrintJobUploadBlockedMessage
 from .messages.PrintJobUploadCancelMessage import PrintJobUploadCancelMessage
@@ -39,11 +43,23 @@ from .messages.PrintJobUploadIsPrintingMessage import PrintJobUploadIsPrintingMe
 from .messages.PrintJobUploadProgressMessage import PrintJobUploadProgressMessage
 from .messages.PrintJobUploadSuccessMessage import PrintJobUploadSuccessMessage
 from .messages.SetTargetTemperatureErrorMessage import SetTargetTemperatureErrorMessage
+from .metrics import Metrics
+from .metrics.Tracing import NULL_SPAN, Trace, begin_span
+from .models.FleetListModel import FleetListModel
 from .models.MPSM2PrintJobOutputModel import MPSM2PrintJobOutputModel
 from .models.MPSM2PrinterStatusModel import MPSM2PrinterStatusModel
+from .models.PrintTimeTable import PrintTimeTable
+from .models.TemperatureHistory import TemperatureHistory
+from .network import UploadScheduler
 from .network.ApiClient import ApiClient
-from .parsers import GcodePreheatSettingsParser
+from .network.EarlyPreheatProfile import EarlyPreheatProfile
+from .network.GCodeStream import GCodeStream
+from .network.UploadRetryPolicy import UploadRetryPolicy
+from .network.UploadSpeedProfile import DEFAULT_SPEED_LEVEL, UploadSpeedProfile
 from .parsers import MPSM2PrinterStatusParser
+from .utils import PrinterPreferences
+from .utils import SampledLogger
+from .utils.StallTracker import StallTracker
 
 MAX_TARGET_HOTEND_TEMPERATURE = MPSM2PrinterStatusModel.MAX_TARGET_HOTEND_TEMPERATURE
 MAX_TARGET_BED_TEMPERATURE = MPSM2PrinterStatusModel.MAX_TARGET_BED_TEMPERATURE
@@ -52,6 +68,68 @@ I18N_CATALOG = i18nCatalog('cura')
 # Monoprice Select Mini V2 printer has a single extruder.
 _NUM_EXTRUDERS = 1
 _QML_DIRECTORY = 'qml_cura4' if USE_QT5 else 'qml'
+# Printer preference: whether the printer receives multi-printer sends.
+BROADCAST_TARGET_PREFERENCE = 'broadcast_target'
+# Printer preference: number of failed uploads, to identify flaky printers.
+_UPLOAD_FAILURES_PREFERENCE = 'upload_failures'
+# Printer preference: upload speed measurements, see UploadSpeedProfile.
+_UPLOAD_SPEED_PREFERENCE = 'upload_speed'
+# Printer preference: early preheating outcomes, see EarlyPreheatProfile.
+_EARLY_PREHEAT_PREFERENCE = 'early_preheat'
+# Printer preference: SHA-256 of the g-code in the printer's cache.gc. Cleared
+# when an upload starts, set when it succeeds.
+_CACHED_GCODE_HASH_PREFERENCE = 'cached_gcode_hash'
+# Whether to send preheat temperatures before the upload instead of after it.
+_PREHEAT_BEFORE_UPLOAD_PREFERENCE_KEY = (
+    'mpsm2networkprinting/preheat_before_upload')
+# Whether to write a Chrome trace of every print submission.
+_TRACE_UPLOADS_PREFERENCE_KEY = 'mpsm2networkprinting/trace_uploads'
+_TRACES_DIRECTORY = 'mpsm2_traces'
+# Whether to upload g-code while it is being written. Needs firmware support
+# for chunked transfer encoding.
+_STREAM_UPLOADS_PREFERENCE_KEY = 'mpsm2networkprinting/stream_uploads'
+# Interval of the timer that detects main thread stalls during a send.
+_STALL_TIMER_INTERVAL_MS = 50
+
+_STATUS_PARSE_FAILURES = Metrics.counter(
+    'mpsm2_status_parse_failures_total',
+    'Printer status responses that could not be parsed.', ['printer'])
+_UPLOAD_SECONDS = Metrics.histogram(
+    'mpsm2_upload_duration_seconds', 'Duration of successful uploads.',
+    ['printer'], buckets=(5, 10, 30, 60, 120, 300, 600, 1200, 1800))
+_UPLOAD_BYTES_PER_SECOND = Metrics.histogram(
+    'mpsm2_upload_bytes_per_second', 'Throughput of successful uploads.',
+    ['printer'],
+    buckets=(1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000))
+_PREHEAT_SECONDS_SAVED = Metrics.histogram(
+    'mpsm2_preheat_seconds_saved',
+    'Heating time that overlapped with an upload.', ['printer'],
+    buckets=(30, 60, 120, 300, 600, 1200))
+_MAIN_THREAD_STALL_SECONDS = Metrics.histogram(
+    'mpsm2_main_thread_stall_seconds',
+    'Longest main thread stall during a send.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+
+def _is_tracing_enabled() -> bool:
+  """Returns whether print submissions are traced."""
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(_TRACE_UPLOADS_PREFERENCE_KEY, False)
+  return bool(preferences.getValue(_TRACE_UPLOADS_PREFERENCE_KEY))
+
+
+def _is_streaming_enabled() -> bool:
+  """Returns whether g-code is uploaded while it is being written."""
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(_STREAM_UPLOADS_PREFERENCE_KEY, False)
+  return bool(preferences.getValue(_STREAM_UPLOADS_PREFERENCE_KEY))
+
+
+def _is_early_preheat_enabled() -> bool:
+  """Returns whether printers preheat while they receive the model."""
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(_PREHEAT_BEFORE_UPLOAD_PREFERENCE_KEY, False)
+  return bool(preferences.getValue(_PREHEAT_BEFORE_UPLOAD_PREFERENCE_KEY))
 
 
 def _build_printer_conf_model() -> PrinterConfigurationModel:
@@ -64,20 +142,6 @@ def _build_printer_conf_model() -> PrinterConfigurationModel:
   return printer_configuration_model
 
 
-def _on_increased_upload_speed_error() -> None:
-  NetworkErrorMessage().show()
-
-
-def _on_increased_upload_speed(response: str) -> None:
-  """Called when a request to increase upload speed completed.
-
-  Args:
-    response: HTTP response to the gcode command request.
-  """
-  if response.upper() != 'OK':
-    _on_increased_upload_speed_error()
-
-
 class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
   """Networked OutputDevice for Monoprice Select Mini V2 printers."""
   NUM_DATA_POINTS = 30
@@ -89,13 +153,19 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
   cancelPrintRequestChanged = pyqtSignal()
   hasTargetHotendInProgressChanged = pyqtSignal()
   hasTargetBedInProgressChanged = pyqtSignal()
+  broadcastTargetChanged = pyqtSignal()
+  # File name, shared payload, preheat temperatures, print time table and
+  # content hash.
+  broadcastRequested = pyqtSignal(str, QByteArray, object, object, object)
 
-  def __init__(self, device_id: str, address: str, parent=None) -> None:
+  def __init__(self, device_id: str, address: str,
+               fleet: Optional[FleetListModel] = None, parent=None) -> None:
     """Constructor.
 
     Args:
       device_id: 'manual:<ip_address>'
       address: IP address, for example '192.168.0.70'
+      fleet: All discovered printers, shown in the monitor stage.
     """
     device_name = f'MPSM V2 {address}'
     mpsm2_properties = {
@@ -119,11 +189,54 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     self._requested_cancel_print = False
     self._requested_hotend_temperature = None  # int
     self._requested_bed_temperature = None  # int
-    self._historical_hotend_temps = []  # List[int]
-    self._historical_bed_temps = []  # List[int]
+    self._hotend_temperature_history = TemperatureHistory(
+        self.NUM_DATA_POINTS, self)
+    self._bed_temperature_history = TemperatureHistory(
+        self.NUM_DATA_POINTS, self)
+    self._fleet = fleet
     self.setName(device_name)
     self._preheat_bed_temperature = None
     self._preheat_hotend_temperature = None
+    # Kept until the upload succeeds, to retry without regenerating G-code.
+    self._upload_file_name = None  # str
+    self._upload_payload = None  # QByteArray
+    self._upload_size = None  # int, bytes. Unknown while streaming.
+    self._upload_print_time_table = None  # PrintTimeTable
+    self._upload_content_hash = None  # str
+    self._reprint_message = None  # PrintJobReprintMessage
+    # Set while g-code is uploaded as it is written, see GCodeStream.
+    self._upload_stream = None  # GCodeStream
+    # Response of a streamed upload that completed before writing did.
+    self._streamed_upload_response = None  # str
+    # Streamed g-code is not kept: retries write it again from these.
+    self._upload_file_handler = None  # FileHandler
+    self._upload_nodes = None  # List[SceneNode]
+    # Job writing or preparing the g-code again for a retry.
+    self._upload_rewrite_job = None  # GCodeWriteFileJob or GCodePrepareJob
+    self._upload_retry_attempt = 0
+    self._is_upload_retry_pending = False
+    self._upload_retry_policy = UploadRetryPolicy()
+    self._upload_retry_timer = QTimer(self)
+    self._upload_retry_timer.setSingleShot(True)
+    self._upload_retry_timer.timeout.connect(self._on_upload_retry_timeout)
+    self._upload_started_at = None  # float, monotonic seconds.
+    self._upload_speed_profile = UploadSpeedProfile(
+        PrinterPreferences.get_value(address, _UPLOAD_SPEED_PREFERENCE))
+    self._upload_speed_level = None  # int, unknown until acknowledged.
+    self._early_preheat_profile = EarlyPreheatProfile(
+        PrinterPreferences.get_value(address, _EARLY_PREHEAT_PREFERENCE))
+    # Set while the printer heats before the upload completes.
+    self._early_preheat_sent_at = None  # float, monotonic seconds.
+    # Stages of the current print submission, if tracing is enabled.
+    self._trace = None  # Trace
+    self._write_span = NULL_SPAN
+    self._upload_span = NULL_SPAN
+    self._post_upload_span = NULL_SPAN
+    # Measures how long the UI freezes during a send.
+    self._stall_tracker = StallTracker(_STALL_TIMER_INTERVAL_MS / 1000)
+    self._stall_timer = QTimer(self)
+    self._stall_timer.setInterval(_STALL_TIMER_INTERVAL_MS)
+    self._stall_timer.timeout.connect(self._stall_tracker.tick)
 
     self._job_upload_message = PrintJobUploadProgressMessage(
         self._on_print_upload_cancelled)
@@ -136,22 +249,27 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     self.setAuthenticationState(AuthState.Authenticated)
     self._load_monitor_tab()
     self._set_ui_elements()
-    self._api_client.increase_upload_speed(
-        _on_increased_upload_speed,
-        _on_increased_upload_speed_error)
+    self._apply_best_upload_speed()
 
   @pyqtProperty(QObject, notify=printerStatusChanged)
   def printer(self) -> PrinterOutputModel:
     """Produces main object for rendering the Printer Monitor tab."""
     return self._printer_output_model
 
-  @pyqtProperty(list, notify=printerStatusChanged)
-  def historical_hotend_temperatures(self) -> list:
-    return self._historical_hotend_temps
+  @pyqtProperty(QObject, constant=True)
+  def hotend_temperature_history(self) -> TemperatureHistory:
+    """Recent hotend temperatures as a list model."""
+    return self._hotend_temperature_history
 
-  @pyqtProperty(list, notify=printerStatusChanged)
-  def historical_bed_temperatures(self) -> list:
-    return self._historical_bed_temps
+  @pyqtProperty(QObject, constant=True)
+  def bed_temperature_history(self) -> TemperatureHistory:
+    """Recent bed temperatures as a list model."""
+    return self._bed_temperature_history
+
+  @pyqtProperty(QObject, constant=True)
+  def fleet(self) -> Optional[FleetListModel]:
+    """All discovered printers as a list model."""
+    return self._fleet
 
   @pyqtProperty(int, constant=True)
   def max_hotend_temperature(self) -> int:
@@ -203,6 +321,23 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     """
     return self._requested_bed_temperature is not None
 
+  @pyqtProperty(bool, notify=broadcastTargetChanged)
+  def is_broadcast_target(self) -> bool:
+    """Returns True if the printer is selected for multi-printer sends."""
+    return bool(PrinterPreferences.get_value(
+        self.address, BROADCAST_TARGET_PREFERENCE, False))
+
+  @pyqtSlot(bool, name='setBroadcastTarget')
+  def set_broadcast_target(self, is_target: bool) -> None:
+    """Selects or deselects the printer for multi-printer sends.
+
+    Args:
+      is_target: True if the printer should receive multi-printer sends.
+    """
+    PrinterPreferences.set_value(
+        self.address, BROADCAST_TARGET_PREFERENCE, is_target)
+    self.broadcastTargetChanged.emit()
+
   @pyqtSlot(str, name='isValidHotendTemperature', result=bool)
   def is_valid_hotend_temperature(self, input_temperature: str) -> bool:
     """Checks if the input hotend temperature is valid.
@@ -241,9 +376,8 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
       self._api_client.set_target_hotend_temperature(
           temperature=int(celsius),
           on_finished=self._on_target_hotend_temperature_finished,
-          on_error=self._on_target_hotend_temperature_error)
-      self._requested_hotend_temperature = int(celsius)
-      self.hasTargetHotendInProgressChanged.emit()
+          on_error=self._on_target_hotend_temperature_error,
+          on_sent=self._on_target_hotend_temperature_sent)
     except ValueError:
       Logger.log('e', 'Invalid target hotend temperature %s.', celsius)
 
@@ -259,9 +393,8 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
       self._api_client.set_target_bed_temperature(
           temperature=int(celsius),
           on_finished=self._on_target_bed_temperature_finished,
-          on_error=self._on_target_bed_temperature_error)
-      self._requested_bed_temperature = int(celsius)
-      self.hasTargetBedInProgressChanged.emit()
+          on_error=self._on_target_bed_temperature_error,
+          on_sent=self._on_target_bed_temperature_sent)
     except ValueError:
       Logger.log('e', 'Invalid target bed temperature %s.', celsius)
 
@@ -312,7 +445,7 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     super().close()
     self.setConnectionState(ConnectionState.Closed)
     device_manager = CuraApplication.getInstance().getOutputDeviceManager()
-    if self.key in device_manager.getOutputDeviceIds():
+    if device_manager.getOutputDevice(self.key) is not None:
       device_manager.removeOutputDevice(self.key)
 
   # pylint:disable=invalid-name
@@ -341,9 +474,23 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
       PrintJobUploadIsPrintingMessage().show()
       return
     self.writeStarted.emit(self)
-    job = GCodeWriteFileJob(file_handler=file_handler, nodes=nodes)
+    self._trace = Trace(self.address) if _is_tracing_enabled() else None
+    self._write_span = begin_span(self._trace, 'write_gcode')
+    self._stall_tracker.start()
+    self._stall_timer.start()
+    stream = None
+    # A stream is only drained while uploading, so it must not be queued.
+    if (_is_streaming_enabled() and not self.is_broadcast_target
+        and UploadScheduler.get_scheduler().has_free_slot(self.address)):
+      stream = GCodeStream()
+    job = GCodeWriteFileJob(file_handler=file_handler, nodes=nodes,
+                            stream=stream)
     job.finished.connect(self._on_print_job_created)
     job.start()
+    if stream:
+      self._stream_print_job(job.getFileName(), stream)
+      self._upload_file_handler = file_handler
+      self._upload_nodes = nodes
 
   def update_printer_status(self, response: str) -> None:
     """Updates printer status.
@@ -358,46 +505,558 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     """Returns True if the printer is uploading a job."""
     return self._is_uploading
 
+  def is_printing(self) -> bool:
+    """Returns True if the printer is printing."""
+    return self._printer_output_model.state == 'printing'
+
+  def upload_print_job(
+      self, file_name: str, payload: QByteArray,
+      preheat_temperatures: Tuple[Optional[int], Optional[int]],
+      print_time_table: Optional[PrintTimeTable] = None,
+      content_hash: Optional[str] = None) -> None:
+    """Uploads a print job to the printer.
+
+    Args:
+      file_name: Name of the file to upload.
+      payload: G-code in bytes. May be shared with uploads to other printers.
+      preheat_temperatures: Preheat bed and hotend temperatures. Both can be
+        None.
+      print_time_table: Slicer's time estimates, for the time left. Can be
+        None.
+      content_hash: SHA-256 of the g-code, remembered once uploaded. Can be
+        None.
+    """
+    self._begin_upload(file_name)
+    self._preheat_bed_temperature, self._preheat_hotend_temperature = (
+        preheat_temperatures)
+    self._upload_payload = payload
+    self._upload_size = payload.size()
+    self._upload_print_time_table = print_time_table
+    self._upload_content_hash = content_hash
+    self._start_upload()
+
+  def _stream_print_job(self, file_name: str, stream: GCodeStream) -> None:
+    """Uploads a print job to the printer while its g-code is written.
+
+    Preheat temperatures, print times and the hash are measured while the
+    g-code is written, and the g-code is dropped once sent. Retries write it
+    again and upload it without streaming.
+
+    Args:
+      file_name: Name of the file to upload.
+      stream: G-code being written.
+    """
+    self._begin_upload(file_name, streamed=True)
+    self._preheat_bed_temperature = None
+    self._preheat_hotend_temperature = None
+    self._upload_stream = stream
+    self._upload_started_at = time.monotonic()
+    UploadScheduler.get_scheduler().request(
+        self.address,
+        lambda: self._api_client.stream_upload_print(
+            file_name, stream, self._on_print_job_upload_completed,
+            self._on_print_job_upload_progress,
+            self._on_print_job_upload_error, self._trace))
+
+  def _begin_upload(self, file_name: str, **span_args) -> None:
+    """Shows the upload in progress.
+
+    Args:
+      file_name: Name of the file to upload.
+      span_args: Extra arguments of the upload span.
+    """
+    self.onPrinterUpload.emit(True)
+    self._is_uploading = True
+    if not self._trace and _is_tracing_enabled():
+      self._trace = Trace(self.address)  # Multi-printer send.
+    self._upload_span = begin_span(self._trace, 'upload', printer=self.address,
+                                   file_name=file_name, **span_args)
+    self._job_upload_message.show()
+    self._upload_file_name = file_name
+    self._upload_retry_attempt = 0
+    # Even a failed upload may overwrite cache.gc.
+    PrinterPreferences.set_value(self.address, _CACHED_GCODE_HASH_PREFERENCE,
+                                 None)
+
   def _on_print_job_created(self, job: GCodeWriteFileJob) -> None:
-    """Called when a print job starts to upload.
+    """Called when the g-code of a print job is written.
+
+    Encoding and parsing run on a worker thread to keep the UI responsive.
 
     Args:
       job: Job that is being uploaded.
     """
     if not job:
       Logger.log('e', 'No active exported job to upload!')
+      self._write_span.end(error='no_job')
+      self._stop_stall_tracker()
+      self._finish_trace()
       return
-    self.onPrinterUpload.emit(True)
-    self._is_uploading = True
-    self._job_upload_message.show()
-    gcode = job.get_gcode_output()
+    stream = job.getStream()
+    if not isinstance(stream, GCodeStream):
+      self._write_span.end()
+      prepare_job = GCodePrepareJob(job, self._trace)
+      prepare_job.finished.connect(self._on_print_job_prepared)
+      prepare_job.start()
+      return
+    if stream is not self._upload_stream:
+      self._write_span.end(error='cancelled')  # Upload cancelled or failed.
+      return
+    if stream.is_cancelled:
+      Logger.log('e', 'Could not write g-code for %s.', self.address)
+      self._write_span.end(error='write_failed')
+      self._api_client.cancel_upload_print()
+      self._fail_upload()
+      return
+    self._write_span.end()
+    self._on_streamed_print_job_written(stream)
+
+  def _on_print_job_prepared(self, job: GCodePrepareJob) -> None:
+    """Called on the main thread when the print job is ready to upload.
+
+    If the printer is selected for multi-printer sends, the job is uploaded to
+    all selected printers from a single shared payload. If the printer already
+    holds the same g-code, the user may print it without uploading.
+
+    Args:
+      job: Job with the encoded g-code and preheat temperatures.
+    """
+    if self.is_broadcast_target:
+      self.broadcastRequested.emit(job.file_name, job.payload,
+                                   job.preheat_temperatures,
+                                   job.print_time_table, job.content_hash)
+      return
+    if job.content_hash and job.content_hash == PrinterPreferences.get_value(
+        self.address, _CACHED_GCODE_HASH_PREFERENCE):
+      self._offer_reprint(job)
+      return
+    self._upload_prepared_job(job)
+
+  def _upload_prepared_job(self, job: GCodePrepareJob) -> None:
+    """Uploads a prepared print job to this printer.
+
+    Args:
+      job: Job with the encoded g-code and preheat temperatures.
+    """
+    self.upload_print_job(job.file_name, job.payload,
+                          job.preheat_temperatures, job.print_time_table,
+                          job.content_hash)
+
+  def _offer_reprint(self, job: GCodePrepareJob) -> None:
+    """Asks the user whether to print the model the printer already holds.
+
+    Args:
+      job: Job with the encoded g-code and preheat temperatures.
+    """
+    Logger.log('d', 'Printer at %s already holds %s.', self.address,
+               job.file_name)
+    self._stop_stall_tracker()
+    self._finish_trace()
+    if self._reprint_message:
+      self._reprint_message.hide()
+    self._reprint_message = PrintJobReprintMessage(
+        on_reprint=lambda: self._reprint(job),
+        on_upload=lambda: self._upload_prepared_job(job),
+        on_dismissed=self._on_reprint_dismissed)
+    self._reprint_message.show()
+
+  def _on_reprint_dismissed(self) -> None:
+    """Called when the user closes the reprint offer without choosing."""
+    self._reprint_message = None
+    self.writeFinished.emit()
+
+  def _reprint(self, job: GCodePrepareJob) -> None:
+    """Prints the cached model in the printer instead of uploading it again.
+
+    Args:
+      job: Job with the encoded g-code and preheat temperatures.
+    """
+    self._reprint_message = None
+    if self._is_uploading or self.is_printing():
+      PrintJobUploadBlockedMessage().show()
+      self.writeFinished.emit()
+      return
+    Logger.log('i', 'Reprinting cache.gc on %s without uploading.',
+               self.address)
+    self._preheat_bed_temperature, self._preheat_hotend_temperature = (
+        job.preheat_temperatures)
+    self._print_job_model.set_print_time_table(job.print_time_table)
+    self._send_preheat_temperatures()
+    self.start_print()
+    self.writeFinished.emit()
+
+  def _on_streamed_print_job_written(self, stream: GCodeStream) -> None:
+    """Called when streamed g-code has been written.
+
+    Completes the upload if the printer already acknowledged it.
+
+    Args:
+      stream: Stream that measured the g-code while it was written.
+    """
+    if not self._is_uploading:
+      return  # Cancelled or failed meanwhile.
     self._preheat_bed_temperature, self._preheat_hotend_temperature = (
-        GcodePreheatSettingsParser.parse(gcode))
-    self._api_client.upload_print(job.getFileName(), gcode,
+        stream.preheat_temperatures)
+    self._upload_size = stream.bytes_written
+    self._upload_print_time_table = stream.print_time_table
+    self._upload_content_hash = stream.content_hash
+    if self._streamed_upload_response is not None:
+      response, self._streamed_upload_response = (
+          self._streamed_upload_response, None)
+      self._on_print_job_upload_completed(response)
+
+  def _rewrite_print_job(self) -> None:
+    """Writes the g-code of a failed streamed upload again, to retry it."""
+    if self._upload_stream:
+      self._upload_stream.cancel()  # Stop writing g-code nobody will upload.
+      self._upload_stream = None
+    Logger.log('d', 'Writing g-code again to retry the upload to %s.',
+               self.address)
+    job = GCodeWriteFileJob(file_handler=self._upload_file_handler,
+                            nodes=self._upload_nodes)
+    job.finished.connect(self._on_print_job_rewritten)
+    self._upload_rewrite_job = job
+    job.start()
+
+  def _on_print_job_rewritten(self, job: GCodeWriteFileJob) -> None:
+    """Called when the g-code of a retry has been written.
+
+    Args:
+      job: Job that wrote the g-code.
+    """
+    if job is not self._upload_rewrite_job:
+      return  # Cancelled meanwhile.
+    prepare_job = GCodePrepareJob(job, self._trace)
+    prepare_job.finished.connect(self._on_rewritten_print_job_prepared)
+    self._upload_rewrite_job = prepare_job
+    prepare_job.start()
+
+  def _on_rewritten_print_job_prepared(self, job: GCodePrepareJob) -> None:
+    """Called on the main thread when the g-code of a retry is ready.
+
+    Args:
+      job: Job with the encoded g-code.
+    """
+    if job is not self._upload_rewrite_job:
+      return  # Cancelled meanwhile.
+    self._upload_rewrite_job = None
+    self._upload_payload = job.payload
+    self._upload_size = job.payload.size()
+    self._start_upload()
+
+  def _start_upload(self) -> None:
+    """Uploads the kept payload to the printer.
+
+    The upload waits while other printers in the same network segment use all
+    upload slots, see UploadScheduler.
+    """
+    self._is_upload_retry_pending = False
+    if self._upload_payload is None:
+      # Streamed g-code is not kept.
+      self._rewrite_print_job()
+      return
+    if not UploadScheduler.get_scheduler().request(self.address,
+                                                   self._send_upload):
+      Logger.log('d', 'Upload to %s waits for other uploads on its network.',
+                 self.address)
+      self._job_upload_message.show_queued()
+
+  def _send_upload(self) -> None:
+    """Sends the kept payload once the network segment has a free slot."""
+    if self._upload_payload is None:
+      return  # Cancelled meanwhile.
+    self._job_upload_message.restart()
+    self._preheat_before_upload()
+    self._upload_started_at = time.monotonic()
+    self._api_client.upload_print(self._upload_file_name, self._upload_payload,
                                   self._on_print_job_upload_completed,
                                   self._on_print_job_upload_progress,
-                                  self._on_print_job_upload_error)
+                                  self._on_print_job_upload_error,
+                                  self._trace)
+
+  def _clear_upload(self) -> None:
+    """Releases the kept payload once the upload is over."""
+    self._upload_retry_timer.stop()
+    self._is_upload_retry_pending = False
+    self._upload_file_name = None
+    self._upload_payload = None
+    self._upload_size = None
+    self._upload_print_time_table = None
+    self._upload_content_hash = None
+    self._early_preheat_sent_at = None
+    if self._upload_stream and not self._upload_stream.is_finished:
+      self._upload_stream.cancel()  # Stop writing g-code nobody will upload.
+    self._upload_stream = None
+    self._streamed_upload_response = None
+    self._upload_file_handler = None
+    self._upload_nodes = None
+    self._upload_rewrite_job = None
+    UploadScheduler.get_scheduler().cancel(self.address)
+
+  def _preheat_before_upload(self) -> None:
+    """Sends preheat temperatures ahead of the upload, if enabled.
+
+    Requests to the printer are serialized, so the commands go out right before
+    the transfer and the printer heats while it receives the model.
+    """
+    self._early_preheat_sent_at = None
+    if (not _is_early_preheat_enabled()
+        or not self._early_preheat_profile.is_tolerated
+        or (self._preheat_bed_temperature is None
+            and self._preheat_hotend_temperature is None)):
+      return
+    self._early_preheat_sent_at = time.monotonic()
+    self._send_preheat_temperatures(
+        on_finished=self._on_early_preheat_finished)
+
+  def _send_preheat_temperatures(
+      self, on_finished: Optional[Callable[[str], None]] = None) -> None:
+    """Sends the preheat temperatures of the print job, if any.
+
+    Args:
+      on_finished: Called with each response. Default handles them as target
+        temperatures set by the user.
+    """
+    if self._preheat_bed_temperature is not None:
+      # Force bed preheating
+      self._api_client.set_target_bed_temperature(
+          temperature=self._preheat_bed_temperature,
+          on_finished=on_finished or self._on_target_bed_temperature_finished,
+          on_error=self._on_target_bed_temperature_error,
+          on_sent=self._on_target_bed_temperature_sent)
+    if self._preheat_hotend_temperature is not None:
+      # Force hotend preheating
+      self._api_client.set_target_hotend_temperature(
+          temperature=self._preheat_hotend_temperature,
+          on_finished=(on_finished
+                       or self._on_target_hotend_temperature_finished),
+          on_error=self._on_target_hotend_temperature_error,
+          on_sent=self._on_target_hotend_temperature_sent)
+
+  def _on_early_preheat_finished(self, response: str) -> None:
+    """Called when a preheat command sent before the upload completed.
+
+    If the firmware rejects it, the printer preheats after uploads from now on.
+
+    Args:
+      response: HTTP response to the target temperature request.
+    """
+    if response.upper() == 'OK' or self._early_preheat_sent_at is None:
+      return
+    Logger.log('w', 'Printer at %s rejected preheating before upload.',
+               self.address)
+    self._early_preheat_sent_at = None  # Preheat after the upload instead.
+    self._early_preheat_profile.mark_rejected()
+    self._store_early_preheat_profile()
+    self._requested_bed_temperature = None
+    self._requested_hotend_temperature = None
+    self.hasTargetBedInProgressChanged.emit()
+    self.hasTargetHotendInProgressChanged.emit()
+
+  def _cool_down_after_early_preheat(self) -> None:
+    """Turns heaters off if they were preheated for an upload that stopped."""
+    if self._early_preheat_sent_at is None:
+      return
+    self._early_preheat_sent_at = None
+    if self._preheat_bed_temperature is not None:
+      self._api_client.set_target_bed_temperature(
+          temperature=0,
+          on_finished=self._on_target_bed_temperature_finished,
+          on_error=self._on_target_bed_temperature_error,
+          on_sent=self._on_target_bed_temperature_sent)
+    if self._preheat_hotend_temperature is not None:
+      self._api_client.set_target_hotend_temperature(
+          temperature=0,
+          on_finished=self._on_target_hotend_temperature_finished,
+          on_error=self._on_target_hotend_temperature_error,
+          on_sent=self._on_target_hotend_temperature_sent)
+
+  def _record_early_preheat_success(self) -> None:
+    """Records how much heating time overlapped with the upload.
+
+    The printer cannot be polled while it receives the model, so the whole
+    transfer counts as heating time. This is an upper bound if the printer
+    reached its target temperatures before the upload completed.
+    """
+    secs_saved = time.monotonic() - self._early_preheat_sent_at
+    self._early_preheat_profile.record_upload(success=True,
+                                              secs_saved=secs_saved)
+    self._store_early_preheat_profile()
+    _PREHEAT_SECONDS_SAVED.labels(self.address).observe(secs_saved)
+    begin_span(self._trace, 'early_preheat').end(
+        secs_saved=round(secs_saved, 1))
+    Logger.log('i', 'Preheating %s before upload saved up to %.0fs '
+               '(%.0fs over %d jobs).', self.address, secs_saved,
+               self._early_preheat_profile.secs_saved,
+               self._early_preheat_profile.jobs)
+
+  def _store_early_preheat_profile(self) -> None:
+    """Stores early preheating outcomes in Cura user's preferences."""
+    PrinterPreferences.set_value(self.address, _EARLY_PREHEAT_PREFERENCE,
+                                 self._early_preheat_profile.to_dict())
 
   def _on_print_upload_cancelled(self) -> None:
     """Called when the user cancels the print upload."""
     self._is_uploading = False
+    self._cool_down_after_early_preheat()
+    self._clear_upload()
     self._job_upload_message.hide()
     self._api_client.cancel_upload_print()
     self._api_client.cancel_print()  # Force cancel.
+    self._upload_span.end(error='cancelled')
+    self._stop_stall_tracker()
+    self._finish_trace()
     PrintJobUploadCancelMessage().show()
     self.writeFinished.emit()
     self.onPrinterUpload.emit(False)
 
   def _on_print_job_upload_error(self) -> None:
-    """Called if there was an error uploading the model."""
-    if self._is_uploading:
-      self._is_uploading = False
-      self._job_upload_message.hide()
-      self._api_client.cancel_upload_print()
-      self._api_client.cancel_print()  # Force cancel.
-      PrintJobUploadErrorMessage().show()
-      self.writeError.emit()
-      self.onPrinterUpload.emit(False)
+    """Called if there was an error uploading the model.
+
+    The upload is retried with backoff while attempts are left.
+    """
+    if not self._is_uploading or self._is_upload_retry_pending:
+      return
+    self._api_client.cancel_upload_print()
+    self._api_client.cancel_print()  # Force cancel.
+    self._record_upload_failure()
+    self._schedule_upload_retry()
+
+  def _schedule_upload_retry(self) -> None:
+    """Schedules the next upload attempt or gives up."""
+    if not self._upload_retry_policy.can_retry(self._upload_retry_attempt):
+      self._fail_upload()
+      return
+    delay_secs = self._upload_retry_policy.get_delay_secs(
+        self._upload_retry_attempt)
+    self._upload_retry_attempt += 1
+    self._is_upload_retry_pending = True
+    Logger.log('d', 'Retrying upload to %s in %ds (retry %d of %d).',
+               self.address, delay_secs, self._upload_retry_attempt,
+               self._upload_retry_policy.max_attempts)
+    self._job_upload_message.show_retry(int(delay_secs))
+    self._upload_retry_timer.start(int(delay_secs * 1000))
+
+  def _on_upload_retry_timeout(self) -> None:
+    """Checks that the printer is reachable and idle before retrying."""
+    if not self._is_uploading:
+      return
+    self._api_client.get_printer_status(self._on_upload_retry_status,
+                                        self._on_upload_retry_status_error)
+
+  def _on_upload_retry_status(self, response: str) -> None:
+    """Called when the printer status before an upload retry is received.
+
+    Args:
+      response: HTTP body response to the printer status request.
+    """
+    if not self._is_uploading:
+      return  # Cancelled while waiting.
+    printer_status_model = MPSM2PrinterStatusParser.parse(response)
+    if printer_status_model is None:
+      self._on_upload_retry_status_error()
+      return
+    if printer_status_model.state != MPSM2PrinterStatusModel.State.IDLE:
+      Logger.log('w', 'Printer at %s is busy. Not retrying upload.',
+                 self.address)
+      self._fail_upload()
+      return
+    self._job_upload_message.restart()
+    self._start_upload()
+
+  def _on_upload_retry_status_error(self) -> None:
+    """Called if the printer is unreachable before an upload retry."""
+    if not self._is_uploading:
+      return
+    Logger.log('w', 'Printer at %s is unreachable.', self.address)
+    self._schedule_upload_retry()
+
+  def _fail_upload(self) -> None:
+    """Gives up uploading the model."""
+    self._is_uploading = False
+    self._upload_span.end(error='failed', retries=self._upload_retry_attempt)
+    self._stop_stall_tracker()
+    self._finish_trace()
+    self._cool_down_after_early_preheat()
+    self._clear_upload()
+    self._job_upload_message.hide()
+    PrintJobUploadErrorMessage().show()
+    self.writeError.emit()
+    self.onPrinterUpload.emit(False)
+
+  def _record_upload_failure(self) -> None:
+    """Counts failed uploads per printer to identify flaky printers."""
+    failures = PrinterPreferences.get_value(
+        self.address, _UPLOAD_FAILURES_PREFERENCE, 0) + 1
+    PrinterPreferences.set_value(
+        self.address, _UPLOAD_FAILURES_PREFERENCE, failures)
+    Logger.log('w', 'Upload to %s failed. Failed uploads so far: %d.',
+               self.address, failures)
+    self._upload_speed_profile.record_upload(
+        self._upload_speed_level, 0, 0, success=False)
+    UploadScheduler.get_scheduler().finish(self.address, 0, success=False)
+    self._store_upload_speed_profile()
+    if self._early_preheat_sent_at is not None:
+      self._early_preheat_profile.record_upload(success=False)
+      self._store_early_preheat_profile()
+
+  def _record_upload_success(self) -> None:
+    """Measures upload throughput at the current upload speed level."""
+    upload_secs = time.monotonic() - self._upload_started_at
+    upload_bytes = self._upload_size
+    Logger.log('d', 'Uploaded %d bytes to %s in %.1fs at speed level %s.',
+               upload_bytes, self.address, upload_secs,
+               self._upload_speed_level)
+    self._upload_speed_profile.record_upload(
+        self._upload_speed_level, upload_bytes, upload_secs, success=True)
+    UploadScheduler.get_scheduler().finish(self.address, upload_bytes,
+                                           success=True)
+    _UPLOAD_SECONDS.labels(self.address).observe(upload_secs)
+    if upload_secs > 0:
+      _UPLOAD_BYTES_PER_SECOND.labels(self.address).observe(
+          upload_bytes / upload_secs)
+    self._store_upload_speed_profile()
+
+  def _store_upload_speed_profile(self) -> None:
+    """Stores upload speed measurements in Cura user's preferences."""
+    PrinterPreferences.set_value(self.address, _UPLOAD_SPEED_PREFERENCE,
+                                 self._upload_speed_profile.to_dict())
+
+  def _apply_best_upload_speed(self) -> None:
+    """Tells the printer the fastest reliable upload speed level.
+
+    No request is sent if the printer already uses that level.
+    """
+    level = self._upload_speed_profile.get_best_level()
+    if level == self._upload_speed_level:
+      return
+    self._api_client.set_upload_speed(
+        level,
+        on_finished=lambda response: self._on_upload_speed_set(level, response),
+        on_error=self._on_upload_speed_error)
+
+  def _on_upload_speed_set(self, level: int, response: str) -> None:
+    """Called when a request to set the upload speed level completed.
+
+    Args:
+      level: Requested upload speed level.
+      response: HTTP response to the gcode command request.
+    """
+    if response.upper() == 'OK':
+      self._upload_speed_level = level
+      return
+    Logger.log('w', 'Printer at %s does not support upload speed level %d.',
+               self.address, level)
+    self._upload_speed_profile.mark_unsupported(level)
+    self._store_upload_speed_profile()
+    if level == DEFAULT_SPEED_LEVEL:
+      self._upload_speed_level = DEFAULT_SPEED_LEVEL  # Nothing else to try.
+      return
+    self._apply_best_upload_speed()
+
+  def _on_upload_speed_error(self) -> None:
+    """Called if there was an error setting the upload speed level."""
+    NetworkErrorMessage().show()
 
   def _on_print_job_upload_completed(self, response: str) -> None:
     """Called when the print job upload is completed.
@@ -405,28 +1064,70 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     Args:
       response: HTTP body response from upload request.
     """
+    if response.upper() == 'OK' and self._upload_size is None:
+      # Streamed upload: complete it once the g-code is written.
+      self._streamed_upload_response = response
+      return
     if response.upper() == 'OK':
       self._is_uploading = False
+      self._upload_span.end(bytes_processed=self._upload_size,
+                            retries=self._upload_retry_attempt)
+      self._post_upload_span = begin_span(self._trace, 'post_upload_commands')
+      self._stop_stall_tracker()
+      self._print_job_model.set_print_time_table(
+          self._upload_print_time_table)
+      self._record_upload_success()
+      PrinterPreferences.set_value(self.address,
+                                   _CACHED_GCODE_HASH_PREFERENCE,
+                                   self._upload_content_hash)
+      if self._early_preheat_sent_at is None:
+        self._send_preheat_temperatures()
+      else:
+        self._record_early_preheat_success()
+      self._clear_upload()
+      self._apply_best_upload_speed()
       self._job_upload_message.hide()
       PrintJobUploadSuccessMessage().show()
-      if self._preheat_bed_temperature is not None:
-        # Force bed preheating
-        self._api_client.set_target_bed_temperature(
-            temperature=self._preheat_bed_temperature,
-            on_finished=self._on_target_bed_temperature_finished,
-            on_error=self._on_target_bed_temperature_error)
       if self._preheat_hotend_temperature is not None:
-        # Force hotend preheating
-        self._api_client.set_target_hotend_temperature(
-            temperature=self._preheat_hotend_temperature,
-            on_finished=self._on_target_hotend_temperature_finished,
-            on_error=self._on_target_hotend_temperature_error)
         # Force start. Sometimes the printer does not start automatically.
-        self._api_client.start_print()
+        self._api_client.start_print(on_finished=self._finish_trace,
+                                     on_error=self._finish_trace)
+      else:
+        self._finish_trace()
       self.writeFinished.emit()
       self.onPrinterUpload.emit(False)
     else:
       Logger.log('e', 'Could not upload print.')
+      self._on_print_job_upload_error()
+
+  def _stop_stall_tracker(self) -> None:
+    """Reports the longest main thread stall of the send, if measured."""
+    if not self._stall_timer.isActive():
+      return  # Send started from another printer.
+    self._stall_timer.stop()
+    longest_stall_secs = self._stall_tracker.stop()
+    _MAIN_THREAD_STALL_SECONDS.observe(longest_stall_secs)
+    begin_span(self._trace, 'main_thread_stall').end(
+        longest_stall_secs=round(longest_stall_secs, 3))
+    Logger.log('d', 'Longest main thread stall during send: %.2fs.',
+               longest_stall_secs)
+
+  def _finish_trace(self, *_) -> None:
+    """Writes the trace of the current print submission, if any."""
+    self._post_upload_span.end()
+    self._post_upload_span = NULL_SPAN
+    trace, self._trace = self._trace, None
+    if not trace:
+      return
+    trace.finish()
+    path = os.path.join(
+        Resources.getDataStoragePath(), _TRACES_DIRECTORY,
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{self.address}.json')
+    try:
+      trace.write(path)
+      Logger.log('d', 'Wrote print submission trace to %s.', path)
+    except OSError as error:
+      Logger.log('w', 'Could not write trace to %s: %s', path, error)
 
   def _on_print_job_upload_progress(self, bytes_sent: int,
                                     bytes_total: int) -> None:
@@ -493,6 +1194,15 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     PrintJobCancelErrorMessage().show()
     self.cancelPrintRequestChanged.emit()
 
+  def _on_target_hotend_temperature_sent(self, temperature: int) -> None:
+    """Called when a target hotend temperature request is sent.
+
+    Args:
+      temperature: Target hotend temperature sent to the printer.
+    """
+    self._requested_hotend_temperature = temperature
+    self.hasTargetHotendInProgressChanged.emit()
+
   def _on_target_hotend_temperature_finished(self, response: str) -> None:
     """Called when a request to set target hotend temperature completed.
 
@@ -504,10 +1214,19 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
   def _on_target_hotend_temperature_error(self) -> None:
     """Called if there was an error setting target hotend temperature."""
-    self._requested_hotend_temperature = False
+    self._requested_hotend_temperature = None
     SetTargetTemperatureErrorMessage().show()
     self.hasTargetHotendInProgressChanged.emit()
 
+  def _on_target_bed_temperature_sent(self, temperature: int) -> None:
+    """Called when a target bed temperature request is sent.
+
+    Args:
+      temperature: Target bed temperature sent to the printer.
+    """
+    self._requested_bed_temperature = temperature
+    self.hasTargetBedInProgressChanged.emit()
+
   def _on_target_bed_temperature_finished(self, response: str) -> None:
     """Called when a request to set target bed temperature completed.
 
@@ -519,7 +1238,7 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
   def _on_target_bed_temperature_error(self) -> None:
     """Called if there was an error setting target bed temperature."""
-    self._requested_bed_temperature = False
+    self._requested_bed_temperature = None
     SetTargetTemperatureErrorMessage().show()
     self.hasTargetBedInProgressChanged.emit()
 
@@ -571,6 +1290,8 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     printer_status_model = MPSM2PrinterStatusParser.parse(response)
     if printer_status_model:
       self._update_printer_output_model(printer_status_model)
+    else:
+      _STATUS_PARSE_FAILURES.labels(self.address).inc()
 
   def _update_printer_output_model(
       self,
@@ -603,7 +1324,8 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         self._requested_pause_print = False  # Fulfilled.
         self.pausePrintRequestChanged.emit()
     else:
-      Logger.log('e', 'Unknown printer status.')
+      SampledLogger.log('e', 'unknown_status', self.address,
+                        'Unknown printer status.')
       NetworkErrorMessage().show()
 
   def _update_model_temperatures(
@@ -639,9 +1361,5 @@ class MPSM2NetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
       hotend_temperature: Current hotend temperature in Celsius.
       bed_temperature: Current bed temperature in Celsius.
     """
-    self._historical_hotend_temps.append(hotend_temperature)
-    if len(self._historical_hotend_temps) > self.NUM_DATA_POINTS:
-      self._historical_hotend_temps.pop(0)
-    self._historical_bed_temps.append(bed_temperature)
-    if len(self._historical_bed_temps) > self.NUM_DATA_POINTS:
-      self._historical_bed_temps.pop(0)
+    self._hotend_temperature_history.append(hotend_temperature)
+    self._bed_temperature_history.append(bed_temperature)
@@ -13,6 +13,7 @@ from cura.CuraApplication import CuraApplication
 
 # pylint:disable=relative-beyond-top-level
 from .network.DeviceManager import DeviceManager
+from .ui import TemperaturePlot
 
 
 class MPSM2OutputDevicePlugin(OutputDevicePlugin):
@@ -25,6 +26,7 @@ class MPSM2OutputDevicePlugin(OutputDevicePlugin):
 
   def __init__(self) -> None:
     super().__init__()
+    TemperaturePlot.register_qml_types()
     self._device_manager = DeviceManager()
     (self._device_manager.discoveredDevicesChanged
      .connect(self.discoveredDevicesChanged))
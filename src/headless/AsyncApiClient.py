@@ -0,0 +1,188 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import asyncio
+import contextlib
+import uuid
+from typing import Callable, Optional, Tuple
+
+# pylint:disable=relative-beyond-top-level
+from ..models.MPSM2PrinterStatusModel import MPSM2PrinterStatusModel
+from ..parsers import MPSM2PrinterStatusParser
+
+MAX_TARGET_HOTEND_TEMPERATURE = (
+    MPSM2PrinterStatusModel.MAX_TARGET_HOTEND_TEMPERATURE)
+MAX_TARGET_BED_TEMPERATURE = MPSM2PrinterStatusModel.MAX_TARGET_BED_TEMPERATURE
+
+DEFAULT_TIMEOUT_SECS = 5
+# Upload is written in chunks so that progress can be reported.
+_UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class ApiError(Exception):
+  """Raised if the printer does not respond or rejects a request."""
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+  """Splits 'host[:port]' into host and port."""
+  host, _, port = address.partition(':')
+  return host, int(port) if port else 80
+
+
+class AsyncApiClient:
+  """Monoprice Select Mini REST API client for asyncio, without Cura.
+
+  Mirrors ApiClient. Requests to one printer are sent one at a time because
+  the firmware handles a single connection.
+  """
+
+  def __init__(self, address: str,
+               timeout_secs: float = DEFAULT_TIMEOUT_SECS) -> None:
+    """Constructor.
+
+    Args:
+      address: Printer's IP address, optionally with ':port'.
+      timeout_secs: Deadline of each request, except uploads which only fail
+        if no progress is made for this long.
+    """
+    self.address = address
+    self._host, self._port = _parse_address(address)
+    self._timeout_secs = timeout_secs
+    self._lock = asyncio.Lock()
+
+  async def get_printer_status(self) -> MPSM2PrinterStatusModel:
+    """Returns the printer status.
+
+    Raises:
+      ApiError: if the printer does not respond or the status is invalid.
+    """
+    response = await self._get('/inquiry')
+    model = MPSM2PrinterStatusParser.parse(response)
+    if model is None:
+      raise ApiError(f'Invalid status response: {response!r}.')
+    return model
+
+  async def start_print(self) -> str:
+    """Starts printing the cached model."""
+    return await self._get('/set?cmd={P:M}')
+
+  async def resume_print(self) -> str:
+    """Resumes the print job."""
+    return await self._get('/set?cmd={P:R}')
+
+  async def pause_print(self) -> str:
+    """Pauses the print job."""
+    return await self._get('/set?cmd={P:P}')
+
+  async def cancel_print(self) -> str:
+    """Cancels the print job."""
+    return await self._get('/set?cmd={P:X}')
+
+  async def set_target_hotend_temperature(self, temperature: int) -> str:
+    """Tells the printer the target hotend temperature.
+
+    Raises:
+      ValueError: if the temperature is out of range.
+    """
+    if temperature < 0 or temperature > MAX_TARGET_HOTEND_TEMPERATURE:
+      raise ValueError(f'Invalid target hotend temperature: {temperature}.')
+    return await self._get(f'/set?cmd={{C:T{temperature:04d}}}')
+
+  async def set_target_bed_temperature(self, temperature: int) -> str:
+    """Tells the printer the target bed temperature.
+
+    Raises:
+      ValueError: if the temperature is out of range.
+    """
+    if temperature < 0 or temperature > MAX_TARGET_BED_TEMPERATURE:
+      raise ValueError(f'Invalid target bed temperature: {temperature}.')
+    return await self._get(f'/set?cmd={{C:P{temperature:03d}}}')
+
+  async def upload_print(
+      self, filename: str, payload: bytes,
+      on_progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """Uploads a file with a POST multipart/form-data request.
+
+    Args:
+      filename: Name of the file to upload.
+      payload: Content in bytes.
+      on_progress: Called with bytes sent and total bytes.
+
+    Raises:
+      ApiError: if the upload fails or the printer does not answer 'OK'.
+    """
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; '
+            f'filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    headers = (f'Content-Type: multipart/form-data; boundary={boundary}\r\n'
+               f'Content-Length: {len(head) + len(payload) + len(tail)}\r\n')
+    view = memoryview(payload)
+
+    async def write_body(writer: asyncio.StreamWriter) -> None:
+      writer.write(head)
+      for start in range(0, len(view), _UPLOAD_CHUNK_BYTES):
+        writer.write(view[start:start + _UPLOAD_CHUNK_BYTES])
+        await asyncio.wait_for(writer.drain(), self._timeout_secs)
+        if on_progress:
+          on_progress(min(start + _UPLOAD_CHUNK_BYTES, len(view)), len(view))
+      writer.write(tail)
+      await asyncio.wait_for(writer.drain(), self._timeout_secs)
+
+    response = await self._request('POST', '/upload', headers, write_body)
+    if response.strip().upper() != 'OK':
+      raise ApiError(f'Upload rejected: {response!r}.')
+    return response
+
+  async def _get(self, path: str) -> str:
+    """Sends a GET request within the deadline and returns the body."""
+    try:
+      return await asyncio.wait_for(self._request('GET', path),
+                                    self._timeout_secs)
+    except asyncio.TimeoutError as error:
+      raise ApiError(f'{self.address}{path} did not respond within '
+                     f'{self._timeout_secs}s.') from error
+
+  async def _request(self, method: str, path: str, headers: str = '',
+                     write_body: Optional[Callable] = None) -> str:
+    """Sends an HTTP request and returns the body.
+
+    Args:
+      method: 'GET' or 'POST'.
+      path: HTTP relative path.
+      headers: Additional headers, each ending with CRLF.
+      write_body: Coroutine function writing the body to the stream.
+    """
+    async with self._lock:
+      try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port),
+            self._timeout_secs)
+      except (OSError, asyncio.TimeoutError) as error:
+        raise ApiError(f'Could not connect to {self.address}.') from error
+      try:
+        writer.write((f'{method} {path} HTTP/1.1\r\n'
+                      f'Host: {self._host}\r\n'
+                      f'Connection: close\r\n{headers}\r\n').encode('utf-8'))
+        if write_body:
+          await write_body(writer)
+        await asyncio.wait_for(writer.drain(), self._timeout_secs)
+        response = await asyncio.wait_for(reader.read(), self._timeout_secs)
+      except (OSError, asyncio.TimeoutError) as error:
+        # Unsent data would otherwise keep the connection open.
+        writer.transport.abort()
+        raise ApiError(f'{method} {self.address}{path} failed.') from error
+      finally:
+        writer.close()
+        with contextlib.suppress(OSError):
+          await writer.wait_closed()
+    status_line, _, rest = response.partition(b'\r\n')
+    _, _, body = rest.partition(b'\r\n\r\n')
+    parts = status_line.split(b' ', 2)
+    if len(parts) < 2 or parts[1] != b'200':
+      raise ApiError(f'{method} {self.address}{path} returned '
+                     f'{status_line.decode("latin-1")!r}.')
+    return body.decode('utf-8', errors='replace')
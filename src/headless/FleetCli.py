@@ -0,0 +1,147 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+
+Queries or uploads to many printers concurrently, without Cura.
+
+Usage, from the plugin directory:
+  python -m src.headless.FleetCli status 192.168.0.70 192.168.0.71
+  python -m src.headless.FleetCli --addresses-file fleet.txt upload model.gcode
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Awaitable, Callable, List, Optional, TextIO, Tuple
+
+# pylint:disable=relative-beyond-top-level
+from .AsyncApiClient import ApiError, AsyncApiClient, DEFAULT_TIMEOUT_SECS
+
+DEFAULT_CONCURRENCY = 64
+
+# Runs a command on one printer and returns a short description of the result.
+Command = Callable[[AsyncApiClient], Awaitable[str]]
+
+
+async def _status(client: AsyncApiClient) -> str:
+  model = await client.get_printer_status()
+  return (f'{model.state.name.lower()} '
+          f'hotend={model.hotend_temperature}/'
+          f'{model.target_hotend_temperature} '
+          f'bed={model.bed_temperature}/{model.target_bed_temperature} '
+          f'progress={model.progress}%')
+
+
+def _build_command(args: argparse.Namespace) -> Command:
+  """Returns the command to run on each printer."""
+  if args.command == 'status':
+    return _status
+  if args.command in ('start', 'pause', 'resume', 'cancel'):
+    method_name = f'{args.command}_print'
+    return lambda client: getattr(client, method_name)()
+  if args.command == 'hotend':
+    return lambda client: client.set_target_hotend_temperature(
+        args.temperature)
+  if args.command == 'bed':
+    return lambda client: client.set_target_bed_temperature(args.temperature)
+  # Upload: all printers share the same bytes.
+  with open(args.file, 'rb') as gcode_file:
+    payload = gcode_file.read()
+  filename = os.path.basename(args.file)
+  return lambda client: client.upload_print(filename, payload)
+
+
+async def run_on_fleet(
+    addresses: List[str], command: Command,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    timeout_secs: float = DEFAULT_TIMEOUT_SECS
+) -> List[Tuple[str, bool, float, str]]:
+  """Runs a command on all printers concurrently.
+
+  Args:
+    addresses: Printers' IP addresses, optionally with ':port'.
+    command: Command to run on each printer.
+    concurrency: Maximum printers contacted at the same time.
+    timeout_secs: Deadline of each request.
+
+  Returns:
+    Per printer, in input order: address, success, elapsed seconds and result
+    or error description.
+  """
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def run(address: str) -> Tuple[str, bool, float, str]:
+    async with semaphore:
+      started_at = time.monotonic()
+      try:
+        result = await command(AsyncApiClient(address, timeout_secs))
+        return address, True, time.monotonic() - started_at, result.strip()
+      except (ApiError, ValueError) as error:
+        return address, False, time.monotonic() - started_at, str(error)
+
+  return await asyncio.gather(*(run(address) for address in addresses))
+
+
+def _read_addresses(args: argparse.Namespace) -> List[str]:
+  addresses = list(args.addresses)
+  if args.addresses_file:
+    with open(args.addresses_file, encoding='utf-8') as addresses_file:
+      addresses.extend(line.strip() for line in addresses_file
+                       if line.strip() and not line.startswith('#'))
+  return addresses
+
+
+def _build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(
+      description='Monoprice Select Mini V2 fleet operations.')
+  parser.add_argument('--addresses-file',
+                      help='File with one printer address per line.')
+  parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                      help='Maximum printers contacted at the same time.')
+  parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECS,
+                      help='Request deadline in seconds.')
+  commands = parser.add_subparsers(dest='command', required=True)
+  for name, description in (('status', 'Print printer status.'),
+                            ('start', 'Start printing the cached model.'),
+                            ('pause', 'Pause the print job.'),
+                            ('resume', 'Resume the print job.'),
+                            ('cancel', 'Cancel the print job.')):
+    commands.add_parser(name, help=description).add_argument(
+        'addresses', nargs='*')
+  for name in ('hotend', 'bed'):
+    command = commands.add_parser(
+        name, help=f'Set the target {name} temperature.')
+    command.add_argument('temperature', type=int)
+    command.add_argument('addresses', nargs='*')
+  upload = commands.add_parser('upload', help='Upload a g-code file.')
+  upload.add_argument('file')
+  upload.add_argument('addresses', nargs='*')
+  return parser
+
+
+def main(argv: Optional[List[str]] = None, output: TextIO = sys.stdout) -> int:
+  """Runs the CLI.
+
+  Returns:
+    Exit code: 0 if the command succeeded on all printers.
+  """
+  args = _build_parser().parse_args(argv)
+  addresses = _read_addresses(args)
+  if not addresses:
+    print('No printer addresses given.', file=output)
+    return 2
+  started_at = time.monotonic()
+  results = asyncio.run(run_on_fleet(addresses, _build_command(args),
+                                     args.concurrency, args.timeout))
+  for address, success, elapsed_secs, result in results:
+    print(f'{address}\t{"OK" if success else "FAIL"}\t'
+          f'{elapsed_secs * 1000:.0f}ms\t{result}', file=output)
+  failures = sum(1 for _, success, _, _ in results if not success)
+  print(f'{len(results) - failures}/{len(results)} printers succeeded in '
+        f'{time.monotonic() - started_at:.2f}s.', file=output)
+  return 1 if failures else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
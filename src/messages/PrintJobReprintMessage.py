@@ -0,0 +1,66 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Callable
+
+from UM import i18nCatalog
+from UM.Message import Message
+
+I18N_CATALOG = i18nCatalog('cura')
+
+
+class PrintJobReprintMessage(Message):
+  """Message displayed when the printer already holds the model to print."""
+
+  def __init__(self, on_reprint: Callable, on_upload: Callable,
+               on_dismissed: Callable) -> None:
+    """Constructor.
+
+    Args:
+      on_reprint: Called when user prints the model the printer holds.
+      on_upload: Called when user uploads the model anyway.
+      on_dismissed: Called when the message is closed without an action.
+    """
+    super().__init__(
+        title=I18N_CATALOG.i18nc('@info:title', 'Model already on printer'),
+        text=I18N_CATALOG.i18nc(
+            '@info:status',
+            'The printer holds this exact model from the last upload. '
+            'Print it again without uploading?'),
+        lifetime=0)
+    self._on_reprint = on_reprint
+    self._on_upload = on_upload
+    self._on_dismissed = on_dismissed
+    self._is_answered = False
+    self.addAction('reprint', I18N_CATALOG.i18nc('@action:button', 'Print'),
+                   '',
+                   I18N_CATALOG.i18nc('@action',
+                                      'Prints the model on the printer.'))
+    self.addAction('upload', I18N_CATALOG.i18nc('@action:button', 'Upload'),
+                   '',
+                   I18N_CATALOG.i18nc('@action', 'Uploads the model again.'),
+                   button_style=Message.ActionButtonStyle.SECONDARY)
+    self.actionTriggered.connect(self._on_action_triggered)
+    self.inactivated.connect(self._on_inactivated)
+
+  def _on_action_triggered(self, message: str, action: str) -> None:
+    """Called when an action from user was triggered.
+
+    Args:
+      message: Message (ignored).
+      action: Action triggered.
+    """
+    self._is_answered = True
+    self.hide()
+    if action == 'reprint':
+      self._on_reprint()
+    elif action == 'upload':
+      self._on_upload()
+
+  def _on_inactivated(self) -> None:
+    """Called when the message is hidden, also by its close button."""
+    if self._is_answered:
+      return
+    self._is_answered = True
+    self._on_dismissed()
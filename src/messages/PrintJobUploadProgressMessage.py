@@ -83,6 +83,29 @@ class PrintJobUploadProgressMessage(Message):
             TimeUtils.get_human_readable_countdown(
                 seconds=int(remaining_millis / 1000)))
 
+  def restart(self) -> None:
+    """Resets the progress bar for a new upload attempt."""
+    self.setProgress(0)
+    self._reset_calculation_time()
+
+  def show_retry(self, seconds: int) -> None:
+    """Informs the user that the upload failed and will be retried.
+
+    Args:
+      seconds: Time until the next upload attempt.
+    """
+    self._reset_calculation_time()
+    self.setText(I18N_CATALOG.i18nc(
+        '@info:status',
+        'Connection lost. Retrying in {0} seconds...').format(seconds))
+
+  def show_queued(self) -> None:
+    """Informs the user that the upload waits for other uploads."""
+    self._reset_calculation_time()
+    self.setText(I18N_CATALOG.i18nc(
+        '@info:status',
+        'Waiting for other printers on the same network...'))
+
   def _reset_calculation_time(self) -> None:
     """Resets the estimated calculation time."""
     self._elapsed_upload_time_millis = 0
@@ -0,0 +1,239 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import array
+import bisect
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Default buckets for latencies, in seconds.
+LATENCY_BUCKETS_SECS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(label_names: Sequence[str],
+                   label_values: Sequence[str],
+                   extra: str = '') -> str:
+  """Formats labels in Prometheus text format, e.g. '{printer="1.2.3.4"}'."""
+  pairs = [f'{name}="{_escape(value)}"'
+           for name, value in zip(label_names, label_values)]
+  if extra:
+    pairs.append(extra)
+  return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+  return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+          .replace('"', '\\"'))
+
+
+def _format_number(value: float) -> str:
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+  """Counter of one label combination."""
+  __slots__ = ('value',)
+
+  def __init__(self) -> None:
+    self.value = 0
+
+  def inc(self, amount: float = 1) -> None:
+    """Increments the counter."""
+    self.value += amount
+
+
+class _GaugeChild:
+  """Gauge of one label combination."""
+  __slots__ = ('value', 'function')
+
+  def __init__(self) -> None:
+    self.value = 0
+    self.function: Optional[Callable[[], float]] = None
+
+  def set(self, value: float) -> None:
+    """Sets the gauge value."""
+    self.value = value
+
+  def set_function(self, function: Callable[[], float]) -> None:
+    """Reads the gauge value from a function at collection time."""
+    self.function = function
+
+  def get(self) -> float:
+    return self.function() if self.function else self.value
+
+
+class _HistogramChild:
+  """Histogram of one label combination.
+
+  Bucket counters are allocated once, so observing a value only increments
+  an array element.
+  """
+  __slots__ = ('_upper_bounds', 'counts', 'sum')
+
+  def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+    self._upper_bounds = upper_bounds
+    # Last bucket is +Inf.
+    self.counts = array.array('Q', bytes(8 * (len(upper_bounds) + 1)))
+    self.sum = 0.0
+
+  def observe(self, value: float) -> None:
+    """Records a value."""
+    self.counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+    self.sum += value
+
+
+class _Metric:
+  """Metric with optional labels. Children are created once per labels."""
+  metric_type = ''
+
+  def __init__(self, name: str, documentation: str,
+               label_names: Sequence[str] = ()) -> None:
+    self.name = name
+    self.documentation = documentation
+    self.label_names = tuple(label_names)
+    self._children: Dict[Tuple[str, ...], object] = {}
+    self._lock = threading.Lock()
+
+  def labels(self, *label_values: str):
+    """Returns the child for the given label values.
+
+    Callers on hot paths should keep the child instead of looking it up for
+    each sample.
+    """
+    if len(label_values) != len(self.label_names):
+      raise ValueError(f'Expected labels {self.label_names} for {self.name}.')
+    key = tuple(str(value) for value in label_values)
+    child = self._children.get(key)
+    if child is None:
+      with self._lock:
+        child = self._children.setdefault(key, self._new_child())
+    return child
+
+  def remove(self, *label_values: str) -> None:
+    """Forgets the child for the given label values."""
+    with self._lock:
+      self._children.pop(tuple(str(value) for value in label_values), None)
+
+  def _new_child(self):
+    raise NotImplementedError
+
+  def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+    with self._lock:
+      return list(self._children.items())
+
+  def collect(self) -> Iterator[str]:
+    """Yields lines in Prometheus text format."""
+    yield f'# HELP {self.name} {self.documentation}'
+    yield f'# TYPE {self.name} {self.metric_type}'
+    yield from self._collect_samples()
+
+  def _collect_samples(self) -> Iterator[str]:
+    raise NotImplementedError
+
+
+class Counter(_Metric):
+  """Monotonically increasing value."""
+  metric_type = 'counter'
+
+  def _new_child(self) -> _CounterChild:
+    return _CounterChild()
+
+  def _collect_samples(self) -> Iterator[str]:
+    for label_values, child in self._items():
+      labels = _format_labels(self.label_names, label_values)
+      yield f'{self.name}{labels} {_format_number(child.value)}'
+
+
+class Gauge(_Metric):
+  """Value that goes up and down."""
+  metric_type = 'gauge'
+
+  def _new_child(self) -> _GaugeChild:
+    return _GaugeChild()
+
+  def _collect_samples(self) -> Iterator[str]:
+    for label_values, child in self._items():
+      labels = _format_labels(self.label_names, label_values)
+      yield f'{self.name}{labels} {_format_number(child.get())}'
+
+
+class Histogram(_Metric):
+  """Distribution of values in pre-allocated buckets."""
+  metric_type = 'histogram'
+
+  def __init__(self, name: str, documentation: str,
+               label_names: Sequence[str] = (),
+               buckets: Sequence[float] = LATENCY_BUCKETS_SECS) -> None:
+    super().__init__(name, documentation, label_names)
+    self.upper_bounds = tuple(sorted(buckets))
+
+  def _new_child(self) -> _HistogramChild:
+    return _HistogramChild(self.upper_bounds)
+
+  def _collect_samples(self) -> Iterator[str]:
+    for label_values, child in self._items():
+      cumulative = 0
+      for upper_bound, count in zip(self.upper_bounds + (float('inf'),),
+                                    child.counts):
+        cumulative += count
+        labels = _format_labels(self.label_names, label_values,
+                                f'le="{_format_number(upper_bound)}"')
+        yield f'{self.name}_bucket{labels} {cumulative}'
+      labels = _format_labels(self.label_names, label_values)
+      yield f'{self.name}_sum{labels} {_format_number(child.sum)}'
+      yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+  """Collection of metrics exported together."""
+
+  def __init__(self) -> None:
+    self._metrics: Dict[str, _Metric] = {}
+    self._lock = threading.Lock()
+
+  def register(self, metric: _Metric) -> _Metric:
+    """Adds a metric. Returns the existing one if the name is taken."""
+    with self._lock:
+      existing = self._metrics.get(metric.name)
+      if existing is not None:
+        # pylint:disable=unidiomatic-typecheck
+        if type(existing) is not type(metric):
+          raise ValueError(f'Metric {metric.name} already has another type.')
+        return existing
+      self._metrics[metric.name] = metric
+      return metric
+
+  def render(self) -> str:
+    """Returns all metrics in Prometheus text format."""
+    with self._lock:
+      metrics = list(self._metrics.values())
+    lines = []
+    for metric in metrics:
+      lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str,
+            label_names: Sequence[str] = ()) -> Counter:
+  """Returns a counter registered in the default registry."""
+  return REGISTRY.register(Counter(name, documentation, label_names))
+
+
+def gauge(name: str, documentation: str,
+          label_names: Sequence[str] = ()) -> Gauge:
+  """Returns a gauge registered in the default registry."""
+  return REGISTRY.register(Gauge(name, documentation, label_names))
+
+
+def histogram(name: str, documentation: str,
+              label_names: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS_SECS) -> Histogram:
+  """Returns a histogram registered in the default registry."""
+  return REGISTRY.register(
+      Histogram(name, documentation, label_names, buckets))
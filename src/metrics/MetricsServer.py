@@ -0,0 +1,73 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .Metrics import REGISTRY, Registry
+
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer:
+  """Serves metrics in Prometheus text format on localhost."""
+
+  def __init__(self, port: int, registry: Registry = REGISTRY) -> None:
+    """Constructor.
+
+    Args:
+      port: TCP port on 127.0.0.1. 0 picks a free port.
+      registry: Metrics to export.
+    """
+    self._port = port
+    self._registry = registry
+    self._server: Optional[ThreadingHTTPServer] = None
+    self._thread: Optional[threading.Thread] = None
+
+  @property
+  def port(self) -> int:
+    """Port the server listens on."""
+    return self._server.server_address[1] if self._server else self._port
+
+  def start(self) -> None:
+    """Starts serving on a background thread."""
+    if self._server:
+      return
+    registry = self._registry
+
+    class Handler(BaseHTTPRequestHandler):
+      """Handles GET /metrics."""
+
+      # pylint:disable=invalid-name
+      def do_GET(self) -> None:
+        if self.path != '/metrics':
+          self.send_error(404)
+          return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', _CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      # pylint:disable=redefined-builtin
+      def log_message(self, format, *args) -> None:
+        pass  # Keep cura.log quiet.
+
+    self._server = ThreadingHTTPServer(('127.0.0.1', self._port), Handler)
+    self._server.daemon_threads = True
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    name='MPSM2MetricsServer', daemon=True)
+    self._thread.start()
+
+  def stop(self) -> None:
+    """Stops serving."""
+    if not self._server:
+      return
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+    self._server = None
+    self._thread = None
@@ -0,0 +1,206 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+# Traces measuring memory. tracemalloc is global: the first one starts it, the
+# last one stops it, so overlapping traces do not stop it for each other.
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+# Whether tracemalloc was started here, rather than by someone else.
+_started_tracemalloc = False
+
+
+def _acquire_tracemalloc() -> None:
+  """Starts tracemalloc unless it is running already."""
+  # pylint:disable=global-statement
+  global _tracemalloc_users, _started_tracemalloc
+  with _tracemalloc_lock:
+    if not _tracemalloc_users and not tracemalloc.is_tracing():
+      tracemalloc.start()
+      _started_tracemalloc = True
+    _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+  """Stops tracemalloc when its last user is done, if it was started here."""
+  # pylint:disable=global-statement
+  global _tracemalloc_users, _started_tracemalloc
+  with _tracemalloc_lock:
+    _tracemalloc_users -= 1
+    if not _tracemalloc_users and _started_tracemalloc:
+      tracemalloc.stop()
+      _started_tracemalloc = False
+
+
+class Span:
+  """Stage of a trace. Ends explicitly or when used as a context manager."""
+
+  def __init__(self, trace: 'Trace', name: str, args: Dict[str, Any]) -> None:
+    self._trace = trace
+    self.name = name
+    self.args = args
+    self.thread_id = threading.get_ident()
+    self.started_at = trace.now()
+    self.ended_at: Optional[float] = None
+    trace.reset_peak_memory()
+
+  def end(self, bytes_processed: Optional[int] = None, **args) -> None:
+    """Ends the span. Ending twice has no effect.
+
+    Args:
+      bytes_processed: Bytes handled by the stage, if known.
+      args: Additional values to record.
+    """
+    if self.ended_at is not None:
+      return
+    self.ended_at = self._trace.now()
+    if bytes_processed is not None:
+      self.args['bytes'] = bytes_processed
+    peak_bytes = self._trace.get_peak_memory()
+    if peak_bytes is not None:
+      self.args['peak_memory_bytes'] = peak_bytes
+    self.args.update(args)
+    self._trace.add(self)
+
+  def __enter__(self) -> 'Span':
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    if exc_type:
+      self.end(error=exc_type.__name__)
+    else:
+      self.end()
+
+
+class Trace:
+  """Records the stages of one print submission.
+
+  Peak memory is measured with tracemalloc since the last span began, so it
+  is approximate when spans overlap. tracemalloc slows down allocations, which
+  is why traces are opt-in.
+  """
+
+  def __init__(self, name: str, track_memory: bool = True,
+               clock: Callable[[], float] = time.perf_counter) -> None:
+    """Constructor.
+
+    Args:
+      name: Name of the trace, e.g. the file being uploaded.
+      track_memory: Whether to record peak memory per span.
+      clock: Clock in seconds.
+    """
+    self.name = name
+    self._clock = clock
+    self._started_at = clock()
+    self._lock = threading.Lock()
+    self._spans: List[Span] = []
+    self._track_memory = track_memory
+    if track_memory:
+      _acquire_tracemalloc()
+
+  def now(self) -> float:
+    """Returns seconds since the trace started."""
+    return self._clock() - self._started_at
+
+  def begin(self, name: str, **args) -> Span:
+    """Begins a span.
+
+    Args:
+      name: Stage name.
+      args: Values to record, e.g. the printer address.
+    """
+    return Span(self, name, dict(args))
+
+  def add(self, span: Span) -> None:
+    """Records an ended span."""
+    with self._lock:
+      self._spans.append(span)
+
+  @property
+  def spans(self) -> List[Span]:
+    """Ended spans in order of ending."""
+    with self._lock:
+      return list(self._spans)
+
+  def reset_peak_memory(self) -> None:
+    if (self._track_memory and tracemalloc.is_tracing()
+        and hasattr(tracemalloc, 'reset_peak')):  # Python 3.9+.
+      tracemalloc.reset_peak()
+
+  def get_peak_memory(self) -> Optional[int]:
+    if not self._track_memory or not tracemalloc.is_tracing():
+      return None
+    return tracemalloc.get_traced_memory()[1]
+
+  def finish(self) -> None:
+    """Stops measuring memory. Finishing twice has no effect."""
+    if self._track_memory:
+      self._track_memory = False
+      _release_tracemalloc()
+
+  def to_chrome_trace(self) -> Dict[str, Any]:
+    """Returns the trace in Chrome trace event format.
+
+    The result can be opened in chrome://tracing or ui.perfetto.dev.
+    """
+    events = [{
+        'name': 'process_name',
+        'ph': 'M',
+        'pid': 1,
+        'args': {'name': self.name},
+    }]
+    for span in sorted(self.spans, key=lambda span: span.started_at):
+      events.append({
+          'name': span.name,
+          'ph': 'X',
+          'pid': 1,
+          'tid': span.thread_id,
+          'ts': round(span.started_at * 1e6),
+          'dur': round((span.ended_at - span.started_at) * 1e6),
+          'args': span.args,
+      })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def write(self, path: str) -> None:
+    """Writes the trace to a JSON file, creating the directory if needed.
+
+    Args:
+      path: Output file path.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as trace_file:
+      json.dump(self.to_chrome_trace(), trace_file)
+
+
+class _NullSpan:
+  """Span of a disabled trace. Records nothing."""
+
+  def end(self, bytes_processed: Optional[int] = None, **args) -> None:
+    pass
+
+  def __enter__(self) -> '_NullSpan':
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def begin_span(trace: Optional[Trace], name: str, **args):
+  """Begins a span, or returns a span that records nothing if trace is None.
+
+  Args:
+    trace: Trace of the submission. None if tracing is disabled.
+    name: Stage name.
+    args: Values to record.
+  """
+  return trace.begin(name, **args) if trace else NULL_SPAN
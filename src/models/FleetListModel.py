@@ -0,0 +1,115 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Any, Dict, Iterable, List
+
+try:
+  # Cura 5.0.0+.
+  from PyQt6.QtCore import pyqtProperty, pyqtSignal, QAbstractListModel, QByteArray, QModelIndex, Qt
+  _DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+  _USER_ROLE = Qt.ItemDataRole.UserRole
+except ImportError:
+  # Cura 4.9.1 or older.
+  from PyQt5.QtCore import pyqtProperty, pyqtSignal, QAbstractListModel, QByteArray, QModelIndex, Qt
+  _DISPLAY_ROLE = Qt.DisplayRole
+  _USER_ROLE = Qt.UserRole
+
+DEVICE_ROLE = _USER_ROLE + 1
+ADDRESS_ROLE = _USER_ROLE + 2
+
+
+class FleetListModel(QAbstractListModel):
+  """Discovered printers, ordered by IP address.
+
+  Rows hold the output devices themselves. Views bind to each device's
+  properties, so status updates reach the visible delegates only and never
+  reset the model. Adding or removing printers changes the affected rows
+  only, keeping the scroll position of the view.
+  """
+  countChanged = pyqtSignal()
+
+  def __init__(self, parent=None) -> None:
+    """Constructor.
+
+    Args:
+      parent: Qt parent.
+    """
+    super().__init__(parent)
+    self._devices: List[Any] = []
+
+  @pyqtProperty(int, notify=countChanged)
+  def count(self) -> int:
+    """Number of printers."""
+    return len(self._devices)
+
+  def set_devices(self, devices: Iterable[Any]) -> None:
+    """Replaces the printers, notifying views of removed and added rows only.
+
+    Args:
+      devices: Output devices with an address attribute.
+    """
+    by_address: Dict[str, Any] = {device.address: device for device in devices}
+    old_count = len(self._devices)
+    # Backwards, so that the rows still to visit keep their index.
+    for row in reversed(range(len(self._devices))):
+      device = self._devices[row]
+      if by_address.get(device.address) is not device:
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._devices[row]
+        self.endRemoveRows()
+    known = {device.address for device in self._devices}
+    for address in sorted(by_address.keys() - known, key=_sort_key):
+      row = self._find_insert_row(address)
+      self.beginInsertRows(QModelIndex(), row, row)
+      self._devices.insert(row, by_address[address])
+      self.endInsertRows()
+    if len(self._devices) != old_count:
+      self.countChanged.emit()
+
+  # pylint:disable=invalid-name
+  def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+    """See base class."""
+    return 0 if parent.isValid() else len(self._devices)
+
+  def data(self, index: QModelIndex, role: int = _DISPLAY_ROLE) -> Any:
+    """See base class."""
+    if not index.isValid() or not 0 <= index.row() < len(self._devices):
+      return None
+    device = self._devices[index.row()]
+    if role == DEVICE_ROLE:
+      return device
+    if role in (_DISPLAY_ROLE, ADDRESS_ROLE):
+      return device.address
+    return None
+
+  def roleNames(self) -> Dict[int, QByteArray]:
+    """See base class."""
+    return {DEVICE_ROLE: QByteArray(b'device'),
+            ADDRESS_ROLE: QByteArray(b'address')}
+
+  def _find_insert_row(self, address: str) -> int:
+    """Returns the row that keeps the printers ordered by address.
+
+    Args:
+      address: IP address of the new printer.
+    """
+    low, high = 0, len(self._devices)
+    key = _sort_key(address)
+    while low < high:
+      middle = (low + high) // 2
+      if _sort_key(self._devices[middle].address) < key:
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+
+def _sort_key(address: str) -> List[Any]:
+  """Orders IP addresses numerically, e.g. 192.168.0.9 before 192.168.0.10.
+
+  Args:
+    address: IP address or host name.
+  """
+  return [(0, int(part), '') if part.isdigit() else (1, 0, part)
+          for part in address.split('.')]
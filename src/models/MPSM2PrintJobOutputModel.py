@@ -16,12 +16,16 @@ except ImportError:
 from cura.PrinterOutput import PrinterOutputController
 from cura.PrinterOutput.Models.PrintJobOutputModel import PrintJobOutputModel
 # pylint:disable=relative-beyond-top-level
+from .PrintTimeTable import PrintTimeTable
 from ..utils import TimeUtils
 
 _POLL_INTERVAL_MILLIS = 100
 _MIN_PERCENT_POINTS = 2  # Minimum points to calculate estimated time left.
 # Arbitrary maximum.
 _MAX_REMAINING_TIME_SECS = int(timedelta(days=1).total_seconds())
+# Bounds of the printer's speed relative to the slicer's estimate.
+_MIN_SPEED_RATIO = 0.25
+_MAX_SPEED_RATIO = 4
 
 
 class MPSM2PrintJobOutputModel(PrintJobOutputModel):
@@ -40,6 +44,10 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
     self._elapsed_percentage_points = None  # type: Optional[int]
     # Estimated printing time left, in seconds.
     self._remaining_print_time_secs = _MAX_REMAINING_TIME_SECS
+    # Slicer's time estimates of the job, if the g-code has time markers.
+    self._print_time_table = None  # type: Optional[PrintTimeTable]
+    # Progress when the stopwatch started.
+    self._stopwatch_start_progress = None  # type: Optional[int]
     self._stopwatch = QTimer(self)
     self._stopwatch.timeout.connect(self._tick)
     self._reset()
@@ -65,11 +73,25 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
     """
     if self._elapsed_percentage_points is None:
       return ''
-    if self._elapsed_percentage_points < _MIN_PERCENT_POINTS:
+    if (self._print_time_table is None
+        and self._elapsed_percentage_points < _MIN_PERCENT_POINTS):
       return ''
     return TimeUtils.get_human_readable_countdown(
         seconds=self._remaining_print_time_secs)
 
+  def set_print_time_table(self, table: Optional[PrintTimeTable]) -> None:
+    """Sets the slicer's time estimates of the job on the printer.
+
+    With estimates, time left is known from the first percent point and
+    follows the slicer's per-layer times instead of a linear extrapolation.
+    They are forgotten once the job ends, so that later jobs, e.g. started
+    from the printer, do not use them.
+
+    Args:
+      table: Time estimates. None if unknown.
+    """
+    self._print_time_table = table
+
   def update_progress(self, progress: int) -> None:
     """Updates job progress and calculates estimated printing time left.
 
@@ -79,6 +101,8 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
     if progress < 0 or progress > 100:
       raise ValueError(f'Invalid printing progress: {progress}.')
     if progress == 0:
+      if self._progress > 0:
+        self._print_time_table = None  # Job is over.
       self._reset()
     elif self._progress != progress:
       if self._elapsed_percentage_points is None:
@@ -88,10 +112,14 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
         self._elapsed_percentage_points += 1
         if not self._stopwatch.isActive():
           # New percent point seen. Start measuring.
+          self._stopwatch_start_progress = progress
           self._stopwatch.start(_POLL_INTERVAL_MILLIS)
       else:
         self._remaining_print_time_secs = self._calculate_remaining_print_time()
         self._elapsed_percentage_points += 1
+      if self._print_time_table:
+        self._remaining_print_time_secs = (
+            self._calculate_remaining_print_time_from_table(progress))
     self._progress = progress
 
   def _reset(self) -> None:
@@ -99,6 +127,7 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
     self._elapsed_print_time_millis = 0
     self._elapsed_percentage_points = None
     self._remaining_print_time_secs = _MAX_REMAINING_TIME_SECS
+    self._stopwatch_start_progress = None
     if self._stopwatch.isActive():
       self._stopwatch.stop()
 
@@ -114,6 +143,30 @@ class MPSM2PrintJobOutputModel(PrintJobOutputModel):
                * self._elapsed_print_time_millis
                / self._elapsed_percentage_points / 1000)
 
+  def _calculate_remaining_print_time_from_table(self, progress: int) -> int:
+    """Calculates remaining print time from the slicer's estimates.
+
+    The estimate is scaled by how fast the printer has been compared to the
+    slicer since the stopwatch started.
+
+    Args:
+      progress: Job progress from 0 to 100.
+
+    Returns
+      Remaining print time in seconds.
+    """
+    table = self._print_time_table
+    remaining_secs = table.get_remaining_secs(progress)
+    if (self._stopwatch_start_progress is not None
+        and self._elapsed_print_time_millis > 0):
+      estimated_secs = (table.get_elapsed_secs(progress)
+                        - table.get_elapsed_secs(self._stopwatch_start_progress))
+      if estimated_secs > 0:
+        speed_ratio = self._elapsed_print_time_millis / 1000 / estimated_secs
+        remaining_secs *= min(max(speed_ratio, _MIN_SPEED_RATIO),
+                              _MAX_SPEED_RATIO)
+    return int(min(remaining_secs, _MAX_REMAINING_TIME_SECS))
+
   def _tick(self) -> None:
     """Updates stopwatch."""
     self._elapsed_print_time_millis += _POLL_INTERVAL_MILLIS
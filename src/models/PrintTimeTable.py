@@ -0,0 +1,69 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import array
+import bisect
+from typing import Sequence
+
+
+class PrintTimeTable:
+  """Maps positions in a g-code file to the slicer's estimated elapsed time.
+
+  Printers report progress as a percentage of the file, which is a poor
+  measure of time: first layers are slow, top layers are fast. The table
+  translates progress into estimated elapsed time in O(log n).
+  """
+
+  def __init__(self, offsets: Sequence[int], elapsed_secs: Sequence[float],
+               total_bytes: int, total_secs: float) -> None:
+    """Constructor.
+
+    Args:
+      offsets: Byte offsets of time markers, ascending.
+      elapsed_secs: Estimated elapsed seconds at each offset, ascending.
+      total_bytes: Size of the g-code file.
+      total_secs: Estimated total print time in seconds.
+
+    Raises:
+      ValueError: if offsets and elapsed times differ in length.
+    """
+    if len(offsets) != len(elapsed_secs):
+      raise ValueError('Offsets and elapsed times differ in length.')
+    if total_bytes <= 0:
+      raise ValueError(f'Invalid g-code size: {total_bytes}.')
+    # Start and end of the file are implicit markers.
+    self._offsets = array.array('q', [0, *offsets, total_bytes])
+    self._elapsed_secs = array.array('d', [0, *elapsed_secs, total_secs])
+    self.total_bytes = total_bytes
+    self.total_secs = total_secs
+
+  def __len__(self) -> int:
+    return len(self._offsets) - 2
+
+  def get_elapsed_secs(self, progress: float) -> float:
+    """Returns the estimated elapsed time at a progress percentage.
+
+    Args:
+      progress: Progress through the file, from 0 to 100.
+    """
+    position = self.total_bytes * min(max(progress, 0), 100) / 100
+    index = bisect.bisect_right(self._offsets, position)
+    if index >= len(self._offsets):
+      return self.total_secs
+    start_offset = self._offsets[index - 1]
+    end_offset = self._offsets[index]
+    start_secs = self._elapsed_secs[index - 1]
+    end_secs = self._elapsed_secs[index]
+    if end_offset == start_offset:
+      return end_secs
+    fraction = (position - start_offset) / (end_offset - start_offset)
+    return start_secs + fraction * (end_secs - start_secs)
+
+  def get_remaining_secs(self, progress: float) -> float:
+    """Returns the estimated remaining time at a progress percentage.
+
+    Args:
+      progress: Progress through the file, from 0 to 100.
+    """
+    return max(self.total_secs - self.get_elapsed_secs(progress), 0)
@@ -0,0 +1,88 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from collections import deque
+from typing import Any, Deque, Dict
+
+try:
+  # Cura 5.0.0+.
+  from PyQt6.QtCore import pyqtProperty, pyqtSignal, QAbstractListModel, QByteArray, QModelIndex, Qt
+  _DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+  _USER_ROLE = Qt.ItemDataRole.UserRole
+except ImportError:
+  # Cura 4.9.1 or older.
+  from PyQt5.QtCore import pyqtProperty, pyqtSignal, QAbstractListModel, QByteArray, QModelIndex, Qt
+  _DISPLAY_ROLE = Qt.DisplayRole
+  _USER_ROLE = Qt.UserRole
+
+TEMPERATURE_ROLE = _USER_ROLE + 1
+
+
+class TemperatureHistory(QAbstractListModel):
+  """Most recent temperatures of a heater, oldest first.
+
+  Each new sample is delivered to views as one row insertion, plus one row
+  removal once the history is full, regardless of the history length. Plots
+  may also read the samples directly from Python, see TemperaturePlot.
+  """
+  countChanged = pyqtSignal()
+
+  def __init__(self, capacity: int, parent=None) -> None:
+    """Constructor.
+
+    Args:
+      capacity: Maximum number of samples kept.
+      parent: Qt parent.
+    """
+    super().__init__(parent)
+    self._samples: Deque[float] = deque(maxlen=capacity)
+
+  @property
+  def samples(self) -> Deque[float]:
+    """Samples, oldest first. Must not be modified."""
+    return self._samples
+
+  @property
+  def capacity(self) -> int:
+    """Maximum number of samples kept."""
+    return self._samples.maxlen
+
+  @pyqtProperty(int, notify=countChanged)
+  def count(self) -> int:
+    """Number of samples."""
+    return len(self._samples)
+
+  def append(self, temperature: float) -> None:
+    """Adds the newest sample, dropping the oldest if full.
+
+    Args:
+      temperature: Temperature in Celsius.
+    """
+    is_full = len(self._samples) == self._samples.maxlen
+    if is_full:
+      self.beginRemoveRows(QModelIndex(), 0, 0)
+      self._samples.popleft()
+      self.endRemoveRows()
+    row = len(self._samples)
+    self.beginInsertRows(QModelIndex(), row, row)
+    self._samples.append(temperature)
+    self.endInsertRows()
+    if not is_full:
+      self.countChanged.emit()
+
+  # pylint:disable=invalid-name
+  def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+    """See base class."""
+    return 0 if parent.isValid() else len(self._samples)
+
+  def data(self, index: QModelIndex, role: int = _DISPLAY_ROLE) -> Any:
+    """See base class."""
+    if (not index.isValid() or not 0 <= index.row() < len(self._samples)
+        or role not in (_DISPLAY_ROLE, TEMPERATURE_ROLE)):
+      return None
+    return self._samples[index.row()]
+
+  def roleNames(self) -> Dict[int, QByteArray]:
+    """See base class."""
+    return {TEMPERATURE_ROLE: QByteArray(b'temperature')}
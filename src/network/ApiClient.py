@@ -2,28 +2,68 @@
 Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
-from typing import Callable, List, Optional
+import time
+from typing import Callable, Optional
 
 USE_QT5 = False
 try:
   # Cura 5.0.0+.
-  from PyQt6.QtCore import QUrl
+  from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QTimer, QUrl
   from PyQt6.QtNetwork import QNetworkReply, QHttpPart, QNetworkRequest, QHttpMultiPart, QNetworkAccessManager
   QNetworkAccessManagerOperations = QNetworkAccessManager.Operation
+  READ_ONLY_MODE = QIODevice.OpenModeFlag.ReadOnly
 except ImportError:
   # Cura 4.9.1 or older.
-  from PyQt5.QtCore import QUrl
+  from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QTimer, QUrl
   from PyQt5.QtNetwork import QNetworkReply, QHttpPart, QNetworkRequest, QHttpMultiPart, QNetworkAccessManager
   QNetworkAccessManagerOperations = QNetworkAccessManager
+  READ_ONLY_MODE = QIODevice.ReadOnly
   USE_QT5 = True
 
 from UM.Logger import Logger
 
+from . import RequestArbiter
+from . import UploadScheduler
+from .CommandCoalescer import CommandCoalescer
+from .GCodeStream import GCodeStream
+from .ReplyRegistry import ReplyRegistry
+from .RequestArbiter import Priority
+from .StreamingUploader import StreamingUploader
+from ..metrics import Metrics
+from ..metrics.Tracing import Trace, begin_span
 from ..models.MPSM2PrinterStatusModel import MPSM2PrinterStatusModel
+from ..utils import SampledLogger
 
 MAX_TARGET_HOTEND_TEMPERATURE = MPSM2PrinterStatusModel.MAX_TARGET_HOTEND_TEMPERATURE
 MAX_TARGET_BED_TEMPERATURE = MPSM2PrinterStatusModel.MAX_TARGET_BED_TEMPERATURE
 
+# An upload is aborted if no progress is made for this many deadlines.
+_UPLOAD_STALL_DEADLINES = 10
+_MIN_UPLOAD_STALL_SECS = 30
+# Status queries are sent every few seconds, so their log messages are
+# sampled. Commands are always logged.
+_STATUS_PATH = '/inquiry'
+
+_COMMAND_LATENCY_SECONDS = Metrics.histogram(
+    'mpsm2_command_latency_seconds',
+    'Time from sending a request until its response.', ['printer', 'command'])
+
+_shared_network_manager: Optional[QNetworkAccessManager] = None
+
+
+def _get_network_manager() -> QNetworkAccessManager:
+  """Returns the network manager shared by all API clients.
+
+  A single manager keeps one connection cache, DNS cache and set of network
+  threads for the whole fleet, and keeps connections warm between commands.
+  Each printer's RequestArbiter already limits traffic to one request at a
+  time, which matches the printers' single-connection firmware.
+  """
+  global _shared_network_manager  # pylint:disable=global-statement
+  if _shared_network_manager is None:
+    _shared_network_manager = QNetworkAccessManager()
+  return _shared_network_manager
+
 
 def _parse_reply(reply: QNetworkReply) -> str:
   """Parses the HTTP body response into string.
@@ -38,8 +78,45 @@ def _parse_reply(reply: QNetworkReply) -> str:
     return err
 
 
+def _has_error(reply: QNetworkReply) -> bool:
+  """Returns True if the request failed or got no HTTP response.
+
+  Args:
+    reply: HTTP response.
+  """
+  if USE_QT5:
+    http_status_code_attribute = QNetworkRequest.HttpStatusCodeAttribute
+    has_error = reply.error() > 0
+  else:
+    http_status_code_attribute = QNetworkRequest.Attribute.HttpStatusCodeAttribute
+    has_error = reply.error() != QNetworkReply.NetworkError.NoError
+  return reply.attribute(http_status_code_attribute) is None or has_error
+
+
+def _then(callback: Optional[Callable], done: Callable[[], None]) -> Callable:
+  """Returns a callback that calls done() after the given callback.
+
+  Args:
+    callback: Original callback. Can be None.
+    done: Called afterwards, even if the callback raises.
+  """
+
+  def chained(*args) -> None:
+    try:
+      if callback:
+        callback(*args)
+    finally:
+      done()
+
+  return chained
+
+
 class ApiClient:
-  """Monoprice Select Mini REST API client."""
+  """Monoprice Select Mini REST API client.
+
+  All requests to a printer, including heartbeat polls, go through the
+  printer's RequestArbiter so that only one is in flight at a time.
+  """
 
   def __init__(self, ip_address: str) -> None:
     """Constructor.
@@ -48,16 +125,23 @@ class ApiClient:
       ip_address: Printer's IP address.
     """
     super().__init__()
-    self._network_manager = QNetworkAccessManager()
+    self._network_manager = _get_network_manager()
     self._ip_address = ip_address
     self._upload_model_reply = None
-    # Prevent auto-removing running callbacks by the Python garbage collector.
-    self._anti_gc_callbacks: List[Callable[[], None]] = []
+    self._streaming_uploader = None  # StreamingUploader
+    self._upload_ticket = None
+    self._arbiter = RequestArbiter.get_arbiter(ip_address)
+    # Keeps callbacks alive and deletes replies once they finish.
+    self._replies = ReplyRegistry()
+    # Firmware handles one request at a time: coalesce temperature commands.
+    self._temperature_commands = CommandCoalescer()
 
   def _register_callback(self, reply: QNetworkReply, on_finished: Callable,
                          on_error: Optional[Callable]) -> None:
     """Adds a callback to an HTTP request.
 
+    The reply is deleted once it finishes, so it must not be used afterwards.
+
     Args:
       reply: HTTP response.
       on_finished: Callback after request completes.
@@ -66,22 +150,82 @@ class ApiClient:
 
     def parse() -> None:
       """Parses the HTTP response."""
-      self._anti_gc_callbacks.remove(parse)
-      if USE_QT5:
-        http_status_code_attribute = QNetworkRequest.HttpStatusCodeAttribute
-        has_error = reply.error() > 0
-      else:
-        http_status_code_attribute = QNetworkRequest.Attribute.HttpStatusCodeAttribute
-        has_error = reply.error() != QNetworkReply.NetworkError.NoError
-      if reply.attribute(http_status_code_attribute) is None or has_error:
-        Logger.log('e', 'No response received from printer.')
+      if _has_error(reply):
+        SampledLogger.log('e', 'no_response', self._ip_address,
+                          'No response received from printer at %s.',
+                          self._ip_address)
         if on_error:
           on_error()
         return
       on_finished(_parse_reply(reply))
 
-    self._anti_gc_callbacks.append(parse)
-    reply.finished.connect(parse)
+    self._replies.add(reply, parse)
+
+  def _set_deadline(self, reply: QNetworkReply, path: str,
+                    command: str) -> None:
+    """Aborts the request if it takes longer than the printer usually does.
+
+    The deadline comes from the printer's measured round-trip time. Requests
+    that finish in time update the measurement.
+
+    Args:
+      reply: HTTP response.
+      path: HTTP relative path, for logging.
+      command: API client method, for metrics.
+    """
+    rtt_estimator = self._arbiter.rtt_estimator
+    timeout_secs = rtt_estimator.timeout_secs
+    started_at = time.monotonic()
+    deadline = QTimer(reply)
+    deadline.setSingleShot(True)
+
+    def on_deadline() -> None:
+      SampledLogger.log('w', 'slow_request', self._ip_address,
+                        'Slow request: %s%s did not respond within %.1fs. '
+                        'Aborting.', self._ip_address, path, timeout_secs)
+      rtt_estimator.on_timeout()
+      reply.abort()
+
+    def on_finished() -> None:
+      if not deadline.isActive():
+        return  # Timed out.
+      deadline.stop()
+      if not _has_error(reply):
+        latency_secs = time.monotonic() - started_at
+        rtt_estimator.add_sample(latency_secs)
+        _COMMAND_LATENCY_SECONDS.labels(self._ip_address,
+                                        command).observe(latency_secs)
+
+    deadline.timeout.connect(on_deadline)
+    reply.finished.connect(on_finished)
+    deadline.start(int(timeout_secs * 1000))
+
+  def _get_upload_stall_timeout_secs(self) -> float:
+    """Returns how long an upload can make no progress before aborting."""
+    return max(
+        _UPLOAD_STALL_DEADLINES * self._arbiter.rtt_estimator.timeout_secs,
+        _MIN_UPLOAD_STALL_SECS)
+
+  def _set_upload_stall_deadline(self, reply: QNetworkReply) -> None:
+    """Aborts the upload if it makes no progress for too long.
+
+    Args:
+      reply: HTTP response of the upload request.
+    """
+    timeout_secs = self._get_upload_stall_timeout_secs()
+    deadline = QTimer(reply)
+    deadline.setSingleShot(True)
+    deadline.setInterval(int(timeout_secs * 1000))
+
+    def on_deadline() -> None:
+      Logger.log('w', 'Slow request: upload to %s made no progress for %.1fs. '
+                 'Aborting.', self._ip_address, timeout_secs)
+      reply.abort()
+
+    deadline.timeout.connect(on_deadline)
+    reply.uploadProgress.connect(lambda *_: deadline.start())
+    reply.finished.connect(deadline.stop)
+    deadline.start()
 
   def get_printer_status(self, on_finished: Callable,
                          on_error: Callable) -> None:
@@ -93,23 +237,23 @@ class ApiClient:
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
     """
-    reply = self._network_manager.get(self._create_empty_request('/inquiry'))
-    self._register_callback(reply, on_finished, on_error)
+    self._get('get_printer_status', _STATUS_PATH, Priority.COMMAND,
+              on_finished, on_error)
 
-  def increase_upload_speed(
-      self, on_finished: Callable, on_error: Callable) -> None:
-    """Tells the printer to increase the upload speed to 91 Kbps.
+  def set_upload_speed(self, level: int, on_finished: Callable,
+                       on_error: Callable) -> None:
+    """Tells the printer which upload speed level to use.
 
     Args:
+      level: Speed level, see UploadSpeedProfile.SPEED_LEVELS.
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
     """
     # Default upload speed is 39 Kbps (level 2).
     # Monoprice Select Mini V2 supports 91 Kbps (level 4).
     # Source: https://github.com/nokemono42/MP-Select-Mini-Web
-    reply = self._network_manager.get(
-        self._create_empty_request('/set?code=M563%20S4'))
-    self._register_callback(reply, on_finished, on_error)
+    self._get('set_upload_speed', f'/set?code=M563%20S{level}',
+              Priority.COMMAND, on_finished, on_error)
 
   def start_print(self, on_finished: Optional[Callable] = None,
                   on_error=None) -> None:
@@ -119,10 +263,8 @@ class ApiClient:
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
     """
-    reply = self._network_manager.get(
-        self._create_empty_request('/set?cmd={P:M}'))
-    if on_finished:
-      self._register_callback(reply, on_finished, on_error)
+    self._get('start_print', '/set?cmd={P:M}', Priority.COMMAND,
+              on_finished, on_error)
 
   def resume_print(self, on_finished: Callable, on_error=None) -> None:
     """Tells the printer to resume a paused print.
@@ -133,9 +275,8 @@ class ApiClient:
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
     """
-    reply = self._network_manager.get(
-        self._create_empty_request('/set?cmd={P:R}'))
-    self._register_callback(reply, on_finished, on_error)
+    self._get('resume_print', '/set?cmd={P:R}', Priority.CONTROL,
+              on_finished, on_error)
 
   def pause_print(self, on_finished: Callable, on_error: Callable) -> None:
     """Tells the printer to pause the print.
@@ -146,9 +287,8 @@ class ApiClient:
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
     """
-    reply = self._network_manager.get(
-        self._create_empty_request('/set?cmd={P:P}'))
-    self._register_callback(reply, on_finished, on_error)
+    self._get('pause_print', '/set?cmd={P:P}', Priority.CONTROL,
+              on_finished, on_error)
 
   def cancel_print(self, on_finished: Optional[Callable] = None,
                    on_error=None) -> None:
@@ -160,22 +300,48 @@ class ApiClient:
       on_finished: callback after request completes.
       on_error: callback if the request fails.
     """
-    reply = self._network_manager.get(
-        self._create_empty_request('/set?cmd={P:X}'))
-    if on_finished:
-      self._register_callback(reply, on_finished, on_error)
+    self._get('cancel_print', '/set?cmd={P:X}', Priority.CONTROL,
+              on_finished, on_error)
 
-  def upload_print(self, filename: str, payload: bytes, on_finished: Callable,
-                   on_progress: Callable, on_error: Callable) -> None:
+  def upload_print(self, filename: str, payload: QByteArray,
+                   on_finished: Callable, on_progress: Callable,
+                   on_error: Callable, trace: Optional[Trace] = None) -> None:
     """Uploads a file to the printer with a POST multipart/form-data request.
 
+    The payload is read through a read-only buffer, so the same QByteArray can
+    be uploaded to several printers at once without copying it.
+
     Args:
       filename: Name of the file to upload
-      payload: Content in bytes
+      payload: Content in bytes. Shared with other uploads, never modified.
       on_finished: Callback after request completes.
       on_progress: Callback while file uploads.
       on_error: Callback if the request fails.
+      trace: Records request assembly and transfer. Can be None.
     """
+    self._upload_ticket = self._arbiter.submit(
+        Priority.UPLOAD,
+        lambda done: self._post_upload(filename, payload, on_finished,
+                                       on_progress, on_error, done, trace))
+
+  def _post_upload(self, filename: str, payload: QByteArray,
+                   on_finished: Callable, on_progress: Callable,
+                   on_error: Callable, done: Callable[[], None],
+                   trace: Optional[Trace] = None) -> None:
+    """Sends the upload request once the arbiter allows it.
+
+    Args:
+      filename: Name of the file to upload
+      payload: Content in bytes. Shared with other uploads, never modified.
+      on_finished: Callback after request completes.
+      on_progress: Callback while file uploads.
+      on_error: Callback if the request fails.
+      done: Tells the arbiter that the request is over.
+      trace: Records request assembly and transfer. Can be None.
+    """
+    self._upload_ticket = None
+    assembly_span = begin_span(trace, 'assemble_multipart',
+                               printer=self._ip_address)
     if USE_QT5:
       content_disposition_header = QNetworkRequest.ContentDispositionHeader
       content_type_header = QNetworkRequest.ContentTypeHeader
@@ -188,10 +354,15 @@ class ApiClient:
     http_part.setHeader(content_disposition_header,
                         f'form-data; name="file"; filename="{filename}"')
     http_part.setHeader(content_type_header, 'application/octet-stream')
-    http_part.setBody(payload)
+    payload_buffer = QBuffer()
+    payload_buffer.setData(payload)  # Implicitly shared, not copied.
+    payload_buffer.open(READ_ONLY_MODE)
+    http_part.setBodyDevice(payload_buffer)
 
     http_multi_part = QHttpMultiPart(form_data_type)
     http_multi_part.append(http_part)
+    # Buffer lives as long as the multi-part.
+    payload_buffer.setParent(http_multi_part)
 
     request = self._create_empty_request('/upload')
     # Must encode bytes boundary into string!
@@ -199,60 +370,187 @@ class ApiClient:
     request.setHeader(content_type_header,
                       f'multipart/form-data; boundary={bytes_boundary}')
 
+    assembly_span.end(bytes_processed=payload.size())
+    transfer_span = begin_span(trace, 'transfer', printer=self._ip_address)
     reply = self._network_manager.post(request, http_multi_part)
-    # Upload is special: on_error is connected directly on reply.error
-    self._register_callback(reply, on_finished, None)
+    reply.finished.connect(
+        lambda: transfer_span.end(bytes_processed=payload.size(),
+                                  error=_has_error(reply)))
+    # Upload is special: on_error is connected directly on reply.error.
+    # Finished is always emitted, also after errors or abort.
+    self._register_callback(reply, _then(on_finished, done), done)
     reply.uploadProgress.connect(on_progress)
+    self._set_upload_stall_deadline(reply)
     if USE_QT5:
       reply.error.connect(on_error)
     else:
       reply.errorOccurred.connect(on_error)
-    # Prevent HTTP multi-part to be garbage-collected.
+    # Prevent HTTP multi-part to be garbage-collected. Deleted with the reply.
     http_multi_part.setParent(reply)
     self._upload_model_reply = reply  # Cache to cancel.
 
+    def forget_reply() -> None:
+      if self._upload_model_reply is reply:
+        self._upload_model_reply = None  # About to be deleted.
+
+    reply.finished.connect(forget_reply)
+
+  def stream_upload_print(self, filename: str, stream: GCodeStream,
+                          on_finished: Callable, on_progress: Callable,
+                          on_error: Callable,
+                          trace: Optional[Trace] = None) -> None:
+    """Uploads g-code to the printer while it is being written.
+
+    The request uses chunked transfer encoding, see StreamingUploader.
+
+    Args:
+      filename: Name of the file to upload.
+      stream: G-code being written.
+      on_finished: Callback after request completes.
+      on_progress: Callback with bytes sent and bytes written so far.
+      on_error: Callback if the request fails.
+      trace: Records the transfer. Can be None.
+    """
+    self._upload_ticket = self._arbiter.submit(
+        Priority.UPLOAD,
+        lambda done: self._start_streaming_upload(
+            filename, stream, on_finished, on_progress, on_error, done, trace))
+
+  def _start_streaming_upload(
+      self, filename: str, stream: GCodeStream, on_finished: Callable,
+      on_progress: Callable, on_error: Callable, done: Callable[[], None],
+      trace: Optional[Trace] = None) -> None:
+    """Starts the streaming upload once the arbiter allows it.
+
+    Args:
+      filename: Name of the file to upload.
+      stream: G-code being written.
+      on_finished: Callback after request completes.
+      on_progress: Callback with bytes sent and bytes written so far.
+      on_error: Callback if the request fails.
+      done: Tells the arbiter that the request is over.
+      trace: Records the transfer. Can be None.
+    """
+    self._upload_ticket = None
+    transfer_span = begin_span(trace, 'transfer', printer=self._ip_address,
+                               streamed=True)
+    uploader = None
+
+    def on_closed() -> None:
+      transfer_span.end(bytes_processed=stream.bytes_written)
+      if self._streaming_uploader is uploader:
+        self._streaming_uploader = None
+      done()
+
+    uploader = StreamingUploader(
+        self._ip_address, filename, stream, on_finished, on_progress,
+        on_error, on_closed, self._arbiter.dispatcher,
+        self._get_upload_stall_timeout_secs(),
+        yield_to_polls=lambda: UploadScheduler.get_scheduler().yield_to_polls(
+            self._ip_address))
+    self._streaming_uploader = uploader  # Cache to cancel.
+    uploader.start()
+
   def cancel_upload_print(self) -> None:
-    """Cancels the upload request."""
+    """Cancels the upload request, also if it has not been sent yet."""
     Logger.log('d', 'Cancelling upload request.')
+    if self._upload_ticket:
+      self._arbiter.cancel(self._upload_ticket)
+      self._upload_ticket = None
     if self._upload_model_reply:
       self._upload_model_reply.abort()
       self._upload_model_reply = None
+    if self._streaming_uploader:
+      self._streaming_uploader.cancel()
+      self._streaming_uploader = None
 
-  def set_target_hotend_temperature(self,
-                                    temperature: int,
-                                    on_finished: Callable,
-                                    on_error: Callable) -> None:
+  def set_target_hotend_temperature(
+      self, temperature: int, on_finished: Callable, on_error: Callable,
+      on_sent: Optional[Callable[[int], None]] = None) -> None:
     """Tells the printer the target hotend temperature.
 
+    If a previous temperature command is in flight, the request waits and is
+    superseded by any newer hotend temperature requested meanwhile.
+
     Args:
       temperature: Target hotend temperature.
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
+      on_sent: Callback with the temperature when the request is sent.
     """
     if temperature < 0 or temperature > MAX_TARGET_HOTEND_TEMPERATURE:
       Logger.log('e', 'Target hotend temperature out of range.')
       return
-    reply = self._network_manager.get(
-        self._create_empty_request(f'/set?cmd={{C:T{temperature:04d}}}'))
-    self._register_callback(reply, on_finished, on_error)
-
-  def set_target_bed_temperature(self,
-                                 temperature: int,
-                                 on_finished: Callable,
-                                 on_error: Callable) -> None:
+    self._submit_temperature_command(
+        'hotend', f'/set?cmd={{C:T{temperature:04d}}}', temperature,
+        on_finished, on_error, on_sent)
+
+  def set_target_bed_temperature(
+      self, temperature: int, on_finished: Callable, on_error: Callable,
+      on_sent: Optional[Callable[[int], None]] = None) -> None:
     """Requests the printer to set a target bed temperature.
 
+    If a previous temperature command is in flight, the request waits and is
+    superseded by any newer bed temperature requested meanwhile.
+
     Args:
       temperature: Target bed temperature.
       on_finished: Callback after request completes.
       on_error: Callback if the request fails.
+      on_sent: Callback with the temperature when the request is sent.
     """
     if temperature < 0 or temperature > MAX_TARGET_BED_TEMPERATURE:
       Logger.log('e', 'Target bed temperature out of range.')
       return
-    reply = self._network_manager.get(
-        self._create_empty_request(f'/set?cmd={{C:P{temperature:03d}}}'))
-    self._register_callback(reply, on_finished, on_error)
+    self._submit_temperature_command(
+        'bed', f'/set?cmd={{C:P{temperature:03d}}}', temperature,
+        on_finished, on_error, on_sent)
+
+  def _submit_temperature_command(
+      self, heater: str, path: str, temperature: int, on_finished: Callable,
+      on_error: Callable, on_sent: Optional[Callable[[int], None]]) -> None:
+    """Queues a temperature command in the coalescer.
+
+    Args:
+      heater: 'hotend' or 'bed'. Pending commands per heater collapse.
+      path: HTTP relative path of the command.
+      temperature: Target temperature.
+      on_finished: Callback after request completes.
+      on_error: Callback if the request fails.
+      on_sent: Callback with the temperature when the request is sent.
+    """
+
+    def send(done: Callable[[], None]) -> None:
+      self._get(f'set_target_{heater}_temperature', path, Priority.COMMAND,
+                _then(on_finished, done),
+                _then(on_error, done),
+                on_sent=(lambda: on_sent(temperature)) if on_sent else None)
+
+    self._temperature_commands.submit(heater, send)
+
+  def _get(self, command: str, path: str, priority: Priority,
+           on_finished: Optional[Callable], on_error: Optional[Callable],
+           on_sent: Optional[Callable[[], None]] = None) -> None:
+    """Queues a GET request in the printer's arbiter.
+
+    Args:
+      command: API client method, for metrics.
+      path: HTTP relative path.
+      priority: Request priority.
+      on_finished: Callback after request completes. Can be None.
+      on_error: Callback if the request fails. Can be None.
+      on_sent: Callback when the request is sent.
+    """
+
+    def start(done: Callable[[], None]) -> None:
+      if on_sent:
+        on_sent()
+      reply = self._network_manager.get(self._create_empty_request(path))
+      self._register_callback(reply, _then(on_finished, done),
+                              _then(on_error, done))
+      self._set_deadline(reply, path, command)
+
+    self._arbiter.submit(priority, start)
 
   def _create_empty_request(self, path: str) -> QNetworkRequest:
     """"Creates an empty HTTP request (GET or POST).
@@ -260,9 +558,12 @@ class ApiClient:
     Args:
       path: HTTP relative path.
     """
-    url = QUrl(f'http://{self._ip_address}{path}')
-    Logger.log('d', url.toString())
-    request = QNetworkRequest(url)
+    if path == _STATUS_PATH:
+      SampledLogger.log('d', 'status_request', self._ip_address,
+                        'Request to %s%s.', self._ip_address, path)
+    else:
+      Logger.log('d', 'Request to %s%s.', self._ip_address, path)
+    request = QNetworkRequest(QUrl(f'http://{self._ip_address}{path}'))
     if USE_QT5:
       request.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
     else:
@@ -0,0 +1,61 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Callable, Dict
+
+# A command receives a callback to call once its request is over.
+Command = Callable[[Callable[[], None]], None]
+
+
+class CommandCoalescer:
+  """Sends one command at a time, collapsing pending commands by key.
+
+  A command submitted while another one is in flight waits. If a newer
+  command with the same key is submitted before it is sent, the older one is
+  dropped, so only the latest value reaches the printer.
+  """
+
+  def __init__(self) -> None:
+    self._pending: Dict[str, Command] = {}
+    self._is_in_flight = False
+
+  @property
+  def pending_count(self) -> int:
+    """Number of commands waiting to be sent."""
+    return len(self._pending)
+
+  @property
+  def is_in_flight(self) -> bool:
+    """True while a command has been sent and is not over yet."""
+    return self._is_in_flight
+
+  def submit(self, key: str, command: Command) -> None:
+    """Sends a command, or queues it if another command is in flight.
+
+    Args:
+      key: Commands with the same key supersede each other.
+      command: Sends the request. Must call the given callback exactly once
+        when the request finishes or fails.
+    """
+    self._pending[key] = command  # Replaces an older one, keeps its turn.
+    self._send_next()
+
+  def _send_next(self) -> None:
+    """Sends the oldest pending command if none is in flight."""
+    if self._is_in_flight or not self._pending:
+      return
+    key = next(iter(self._pending))
+    command = self._pending.pop(key)
+    self._is_in_flight = True
+    is_done = False
+
+    def done() -> None:
+      nonlocal is_done
+      if is_done:
+        return
+      is_done = True
+      self._is_in_flight = False
+      self._send_next()
+
+    command(done)
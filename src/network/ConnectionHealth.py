@@ -0,0 +1,78 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import enum
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RECOVERY_THRESHOLD = 2
+# Failure threshold multiplier while uploads congest the printer's network.
+BUSY_NETWORK_FAILURE_FACTOR = 3
+
+
+class State(enum.Enum):
+  """Connection state of a printer."""
+  ONLINE = 'online'
+  DEGRADED = 'degraded'  # Recent polls failed, not offline yet.
+  OFFLINE = 'offline'
+
+
+class ConnectionHealth:
+  """Decides whether a printer is online from consecutive poll results.
+
+  A single missed poll only degrades the connection. The printer goes offline
+  after several consecutive failures, and comes back online after several
+  consecutive successes, so that it does not flap on lossy networks. Only
+  these two changes are reported, so that callers act on them once instead
+  of on every poll.
+  """
+
+  def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+               recovery_threshold: int = DEFAULT_RECOVERY_THRESHOLD) -> None:
+    """Constructor.
+
+    Args:
+      failure_threshold: Consecutive failures to go offline.
+      recovery_threshold: Consecutive successes to go back online.
+    """
+    self._failure_threshold = max(1, failure_threshold)
+    self._recovery_threshold = max(1, recovery_threshold)
+    self._consecutive_failures = 0
+    self._consecutive_successes = 0
+    self.state = State.ONLINE
+
+  def on_success(self) -> bool:
+    """Records a successful poll.
+
+    Returns:
+      True if the printer just came back online, i.e. was offline before.
+    """
+    self._consecutive_failures = 0
+    self._consecutive_successes += 1
+    was_offline = self.state == State.OFFLINE
+    if (not was_offline
+        or self._consecutive_successes >= self._recovery_threshold):
+      self.state = State.ONLINE
+    return was_offline and self.state == State.ONLINE
+
+  def on_failure(self, is_network_busy: bool = False) -> bool:
+    """Records a failed poll.
+
+    Args:
+      is_network_busy: True if uploads to other printers congest the network.
+        More consecutive failures are then needed to go offline.
+
+    Returns:
+      True if the printer just went offline.
+    """
+    self._consecutive_successes = 0
+    self._consecutive_failures += 1
+    was_offline = self.state == State.OFFLINE
+    threshold = self._failure_threshold
+    if is_network_busy:
+      threshold *= BUSY_NETWORK_FAILURE_FACTOR
+    if self._consecutive_failures >= threshold:
+      self.state = State.OFFLINE
+    elif self.state == State.ONLINE:
+      self.state = State.DEGRADED
+    return not was_offline and self.state == State.OFFLINE
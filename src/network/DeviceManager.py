@@ -2,14 +2,15 @@
 Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
-from typing import Optional, Callable, List, cast
+import json
+from typing import Optional, Callable, List, Tuple, cast
 
 try:
   # Cura 5.0.0+.
-  from PyQt6.QtCore import pyqtSignal, QObject
+  from PyQt6.QtCore import pyqtSignal, QByteArray, QObject, QTimer
 except ImportError:
   # Cura 4.9.1 or older.
-  from PyQt5.QtCore import pyqtSignal, QObject
+  from PyQt5.QtCore import pyqtSignal, QByteArray, QObject, QTimer
 
 from UM import i18nCatalog
 from UM.Logger import Logger
@@ -21,12 +22,44 @@ from cura.CuraApplication import CuraApplication
 from cura.Settings.CuraStackBuilder import CuraStackBuilder
 from cura.Settings.GlobalStack import GlobalStack
 # pylint:disable=relative-beyond-top-level
+from . import RequestArbiter
+from . import UploadScheduler
 from .ApiClient import ApiClient
+from .ConnectionHealth import ConnectionHealth, DEFAULT_FAILURE_THRESHOLD, DEFAULT_RECOVERY_THRESHOLD, State
 from .PrinterHeartbeat import PrinterHeartbeat
-from ..MPSM2NetworkedPrinterOutputDevice import MPSM2NetworkedPrinterOutputDevice
+from .StatusMailbox import StatusMailbox
+from ..metrics import Metrics
+from ..metrics.MetricsServer import MetricsServer
+from ..models.FleetListModel import FleetListModel
+from ..models.PrintTimeTable import PrintTimeTable
+from ..MPSM2NetworkedPrinterOutputDevice import BROADCAST_TARGET_PREFERENCE, MPSM2NetworkedPrinterOutputDevice
+from ..utils import PrinterPreferences
+from ..utils import SampledLogger
 
 _METADATA_MPSM2_KEY = 'mpsm2_network_key'
 _MANUAL_DEVICES_PREFERENCE_KEY = 'mpsm2networkprinting/manual_instances'
+# Local port for Prometheus metrics. 0 disables the endpoint.
+_METRICS_PORT_PREFERENCE_KEY = 'mpsm2networkprinting/metrics_port'
+# Consecutive missed heartbeats before a printer is considered offline.
+_OFFLINE_AFTER_FAILURES_PREFERENCE_KEY = (
+    'mpsm2networkprinting/offline_after_failures')
+# Consecutive heartbeats before an offline printer is considered online.
+_ONLINE_AFTER_SUCCESSES_PREFERENCE_KEY = (
+    'mpsm2networkprinting/online_after_successes')
+# Comma-separated networks, e.g. one per access point. Printers in the same
+# network share upload bandwidth.
+_NETWORK_SEGMENTS_PREFERENCE_KEY = 'mpsm2networkprinting/network_segments'
+_MAX_UPLOADS_PER_SEGMENT_PREFERENCE_KEY = (
+    'mpsm2networkprinting/max_uploads_per_segment')
+# Aggregate upload throughput measurements, see UploadScheduler.
+_UPLOAD_SEGMENT_STATS_PREFERENCE_KEY = (
+    'mpsm2networkprinting/upload_segment_stats')
+
+# Heartbeat results of the whole fleet are handled at most 4 times a second.
+_HEARTBEAT_DRAIN_INTERVAL_MS = 250
+
+_RECONNECTS = Metrics.counter(
+    'mpsm2_reconnects_total', 'Times a printer came back online.', ['printer'])
 
 
 def _get_stored_manual_addresses() -> List[str]:
@@ -38,6 +71,50 @@ def _get_stored_manual_addresses() -> List[str]:
   return preferences.getValue(_MANUAL_DEVICES_PREFERENCE_KEY).split(',')
 
 
+def _get_int_preference(key: str, default: int) -> int:
+  """Returns an integer from Cura user's preferences.
+
+  Args:
+    key: Preference key.
+    default: Returned if the preference is not set or not a number.
+  """
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(key, default)
+  try:
+    return int(preferences.getValue(key))
+  except (TypeError, ValueError):
+    return default
+
+
+def _create_upload_scheduler() -> UploadScheduler.UploadScheduler:
+  """Returns an upload scheduler configured from Cura user's preferences."""
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(_NETWORK_SEGMENTS_PREFERENCE_KEY, '')
+  preferences.addPreference(_UPLOAD_SEGMENT_STATS_PREFERENCE_KEY, '{}')
+  try:
+    stats = json.loads(
+        preferences.getValue(_UPLOAD_SEGMENT_STATS_PREFERENCE_KEY) or '{}')
+  except ValueError:
+    Logger.log('w', 'Could not parse stored upload measurements. Resetting.')
+    stats = {}
+  return UploadScheduler.UploadScheduler(
+      segments=UploadScheduler.parse_segments(
+          preferences.getValue(_NETWORK_SEGMENTS_PREFERENCE_KEY) or ''),
+      max_concurrency=_get_int_preference(
+          _MAX_UPLOADS_PER_SEGMENT_PREFERENCE_KEY,
+          UploadScheduler.DEFAULT_MAX_CONCURRENCY),
+      stats=stats if isinstance(stats, dict) else {},
+      dispatcher=CuraApplication.getInstance().callLater,
+      on_measured=_store_upload_segment_stats)
+
+
+def _store_upload_segment_stats() -> None:
+  """Stores upload throughput measurements in Cura user's preferences."""
+  CuraApplication.getInstance().getPreferences().setValue(
+      _UPLOAD_SEGMENT_STATS_PREFERENCE_KEY,
+      json.dumps(UploadScheduler.get_scheduler().to_dict(), sort_keys=True))
+
+
 def _get_device_id(address: str) -> str:
   """Returns device ID given an IP address."""
   return 'manual:{}'.format(address)
@@ -65,7 +142,7 @@ def _connect_to_output_device(device: MPSM2NetworkedPrinterOutputDevice,
     device.connect()
   output_device_manager = (
       CuraApplication.getInstance().getOutputDeviceManager())
-  if device.key not in output_device_manager.getOutputDeviceIds():
+  if output_device_manager.getOutputDevice(device.key) is None:
     output_device_manager.addOutputDevice(device)
 
 
@@ -117,23 +194,43 @@ class DeviceManager(QObject):
 
   def __init__(self) -> None:
     super().__init__()
-    self._discovered_devices = {}
+    self._discovered_devices = {}  # Device key -> device.
+    self._devices_by_address = {}  # IP address -> device.
+    self._is_devices_changed_pending = False
+    # Monitor stage overview of all discovered devices.
+    self._fleet = FleetListModel(self)
     self._background_threads = {}
+    self._connection_health = {}  # Address -> ConnectionHealth.
+    self._status_mailbox = StatusMailbox()
+    self._heartbeat_drain_timer = QTimer(self)
+    self._heartbeat_drain_timer.setInterval(_HEARTBEAT_DRAIN_INTERVAL_MS)
+    self._heartbeat_drain_timer.timeout.connect(self._drain_heartbeats)
     self._output_device_manager = (
         CuraApplication.getInstance().getOutputDeviceManager())
     ContainerRegistry.getInstance().containerRemoved.connect(
         self._on_printer_container_removed)
     self._add_manual_device_in_progress = False
+    # Network requests are started on the main thread, also those from
+    # heartbeat threads.
+    RequestArbiter.set_dispatcher(CuraApplication.getInstance().callLater)
+    UploadScheduler.set_scheduler(_create_upload_scheduler())
+    self._metrics_server: Optional[MetricsServer] = None
 
   def start(self) -> None:
     Logger.log('d', 'Starting Device Manager.')
+    self._start_metrics_server()
+    self._heartbeat_drain_timer.start()
     for address in _get_stored_manual_addresses():
       self._create_heartbeat_thread(address)
 
   def stop(self) -> None:
     Logger.log('d', 'Stopping Device Manager.')
+    self._heartbeat_drain_timer.stop()
     for instance_name in list(self._discovered_devices):
       self._on_discovered_device_removed(instance_name)
+    if self._metrics_server:
+      self._metrics_server.stop()
+      self._metrics_server = None
 
   def start_discovery(self) -> None:
     Logger.log('d', 'Start discovery.')
@@ -157,9 +254,22 @@ class DeviceManager(QObject):
     for device in self._discovered_devices.values():
       if device.key == stored_device_id:
         _connect_to_output_device(device, active_machine)
-      elif device.key in output_device_manager.getOutputDeviceIds():
+      elif output_device_manager.getOutputDevice(device.key) is not None:
         output_device_manager.removeOutputDevice(device.key)
 
+  def _reconnect(self, device: MPSM2NetworkedPrinterOutputDevice) -> None:
+    """Connects a device that came back online if it is the active machine.
+
+    Other devices are left as they are, unlike connect_to_active_machine.
+
+    Args:
+      device: Device that is online again.
+    """
+    active_machine = CuraApplication.getInstance().getGlobalContainerStack()
+    if (active_machine and device.key
+        == active_machine.getMetaDataEntry(_METADATA_MPSM2_KEY)):
+      _connect_to_output_device(device, active_machine)
+
   def add_device(
       self,
       address: str,
@@ -197,12 +307,64 @@ class DeviceManager(QObject):
 
     if address in _get_stored_manual_addresses():
       _remove_stored_manual_address(address)
+      PrinterPreferences.remove_printer(address)
+      SampledLogger.forget(address)
 
     if address in self._background_threads:
       Logger.log('d', 'Stopping background thread for address %s.', address)
       self._background_threads[address].stopBeat()
       self._background_threads[address].quit()
       del self._background_threads[address]
+    self._connection_health.pop(address, None)
+    self._status_mailbox.discard(address)
+    RequestArbiter.remove_arbiter(address)
+
+  def broadcast_print(
+      self, file_name: str, payload: QByteArray,
+      preheat_temperatures: Tuple[Optional[int], Optional[int]],
+      print_time_table: Optional[PrintTimeTable] = None,
+      content_hash: Optional[str] = None) -> None:
+    """Uploads a print job to all printers selected for multi-printer sends.
+
+    All uploads run concurrently and read from the same payload. Each printer
+    reports its own progress and errors, so a failing printer does not affect
+    the others.
+
+    Args:
+      file_name: Name of the file to upload.
+      payload: G-code in bytes. Shared by all uploads.
+      preheat_temperatures: Preheat bed and hotend temperatures.
+      print_time_table: Slicer's time estimates. Can be None.
+      content_hash: SHA-256 of the g-code. Can be None.
+    """
+    addresses = PrinterPreferences.get_addresses_with(
+        BROADCAST_TARGET_PREFERENCE, True)
+    Logger.log('d', 'Sending %s to %d selected printers.', file_name,
+               len(addresses))
+    for address in addresses:
+      device = cast(MPSM2NetworkedPrinterOutputDevice,
+                    self._devices_by_address.get(address))
+      if (not device
+          or not device.isConnected()
+          or device.is_uploading()
+          or device.is_printing()):
+        Logger.log('w', 'Printer at %s is not ready. Skipping.', address)
+        continue
+      device.upload_print_job(file_name, payload, preheat_temperatures,
+                              print_time_table, content_hash)
+
+  def _start_metrics_server(self) -> None:
+    """Serves metrics on localhost if the user enabled it."""
+    port = _get_int_preference(_METRICS_PORT_PREFERENCE_KEY, 0)
+    if not port or self._metrics_server:
+      return
+    try:
+      self._metrics_server = MetricsServer(port)
+      self._metrics_server.start()
+      Logger.log('i', 'Serving metrics on http://127.0.0.1:%d/metrics.', port)
+    except OSError as error:
+      Logger.log('w', 'Could not serve metrics on port %d: %s', port, error)
+      self._metrics_server = None
 
   def _create_heartbeat_thread(self, address: str) -> None:
     """Creates and starts a background thread to ping the printer status.
@@ -212,11 +374,15 @@ class DeviceManager(QObject):
     """
     Logger.log('d', 'Creating heartbeat thread for stored address: %s',
                address)
-    heartbeat_thread = PrinterHeartbeat(address)
-    heartbeat_thread.heartbeatSignal.connect(self._on_printer_heartbeat)
+    heartbeat_thread = PrinterHeartbeat(address, self._status_mailbox)
     self.onPrinterUpload.connect(heartbeat_thread.handle_printer_busy)
     heartbeat_thread.start()
     self._background_threads[address] = heartbeat_thread
+    self._connection_health[address] = ConnectionHealth(
+        _get_int_preference(_OFFLINE_AFTER_FAILURES_PREFERENCE_KEY,
+                            DEFAULT_FAILURE_THRESHOLD),
+        _get_int_preference(_ONLINE_AFTER_SUCCESSES_PREFERENCE_KEY,
+                            DEFAULT_RECOVERY_THRESHOLD))
 
   def _on_printer_container_removed(self,
                                     container: ContainerInterface) -> None:
@@ -249,10 +415,13 @@ class DeviceManager(QObject):
       CuraApplication.getInstance().callLater(callback, False, address)
       return
 
-    Logger.log('d', 'Received response from printer on address %s: %s.',
-               address, response)
-    device = MPSM2NetworkedPrinterOutputDevice(_get_device_id(address), address)
+    SampledLogger.log('d', 'status_response', address,
+                      'Received response from printer on address %s: %s.',
+                      address, response)
+    device = MPSM2NetworkedPrinterOutputDevice(_get_device_id(address), address,
+                                               fleet=self._fleet)
     device.onPrinterUpload.connect(self.onPrinterUpload)
+    device.broadcastRequested.connect(self.broadcast_print)
     device.update_printer_status(response)
     discovered_printers_model = (
         CuraApplication.getInstance().getDiscoveredPrintersModel())
@@ -264,8 +433,9 @@ class DeviceManager(QObject):
         machine_type=device.printerType,
         device=device)
     _store_manual_address(address)
-    self._discovered_devices[device.getId()] = device
-    self.discoveredDevicesChanged.emit()
+    self._discovered_devices[device.key] = device
+    self._devices_by_address[address] = device
+    self._notify_discovered_devices_changed()
     self.connect_to_active_machine()
     if callback is not None:
       CuraApplication.getInstance().callLater(callback, True, address)
@@ -280,9 +450,27 @@ class DeviceManager(QObject):
     device = self._discovered_devices.pop(device_id, None)
     if not device:
       return
+    self._devices_by_address.pop(device.address, None)
     device.close()
     (CuraApplication.getInstance()
      .getDiscoveredPrintersModel().removeDiscoveredPrinter(device.address))
+    self._notify_discovered_devices_changed()
+
+  def _notify_discovered_devices_changed(self) -> None:
+    """Emits discoveredDevicesChanged once per event loop iteration.
+
+    Adding or removing many printers at once, e.g. on start or when a subnet
+    goes offline, results in a single signal.
+    """
+    if self._is_devices_changed_pending:
+      return
+    self._is_devices_changed_pending = True
+    CuraApplication.getInstance().callLater(
+        self._emit_discovered_devices_changed)
+
+  def _emit_discovered_devices_changed(self) -> None:
+    self._is_devices_changed_pending = False
+    self._fleet.set_devices(self._discovered_devices.values())
     self.discoveredDevicesChanged.emit()
 
   def _create_machine(self, device_id: str) -> None:
@@ -313,35 +501,57 @@ class DeviceManager(QObject):
       _connect_to_output_device(device, new_machine)
       self._create_heartbeat_thread(device.ipAddress)
 
+  def _drain_heartbeats(self) -> None:
+    """Handles the newest heartbeat result of each printer."""
+    for address, response in self._status_mailbox.drain().items():
+      if address in self._background_threads:
+        self._on_printer_heartbeat(address, response)
+
   def _on_printer_heartbeat(self, address: str, response: str) -> None:
     """Called when background heartbeat was received. Includes timeout.
 
+    A printer is closed only after several consecutive timeouts and reconnected
+    only after several consecutive responses, see ConnectionHealth. While
+    printers in the same network segment upload, more timeouts are tolerated:
+    the uploads congest the access point, not the printer. Views are notified
+    only when a printer comes back online, not on every response.
+
     Args:
       address: IP address
       response: HTTP body response to inquiry request.
     """
-    device = cast(
-        MPSM2NetworkedPrinterOutputDevice,
-        self._discovered_devices.get(_get_device_id(address)))
+    device = cast(MPSM2NetworkedPrinterOutputDevice,
+                  self._devices_by_address.get(address))
+    health = self._connection_health.get(address)
     if response == 'timeout':
-      if (device
+      if device and device.is_uploading():
+        return  # Request timeout is expected during job upload.
+      is_network_busy = (
+          UploadScheduler.get_scheduler().is_segment_busy(address))
+      if health and health.on_failure(is_network_busy):
+        Logger.log('d', 'Printer at %s is offline.', address)
+      else:
+        SampledLogger.log('d', 'heartbeat_timeout', address,
+                          'Printer at %s missed a heartbeat.', address)
+      state = health.state if health else State.OFFLINE
+      if (state == State.OFFLINE
+          and device
           and device.isConnected()
-          and not device.is_uploading()
           and not self._add_manual_device_in_progress):
-        # Request timeout is expected during job upload.
-        Logger.log('d', 'Discovered device timed out. Stopping device.')
+        Logger.log('d', 'Stopping device at %s.', address)
         device.close()
       return
+    came_online = health.on_success() if health else False
 
     if not device:
       self._on_printer_status_response(response, address)
       return
 
-    device = cast(
-        MPSM2NetworkedPrinterOutputDevice,
-        self._discovered_devices.get(_get_device_id(address)))
-    if not device.isConnected():
+    if health and health.state != State.ONLINE:
+      return  # Wait until the printer responds consistently.
+    if came_online:
       Logger.log('d', 'Printer at %s is up again. Reconnecting.', address)
-      self.connect_to_active_machine()
-      self.discoveredDevicesChanged.emit()
+      _RECONNECTS.labels(address).inc()
+      self._reconnect(device)
+      self._notify_discovered_devices_changed()
     device.update_printer_status(response)
@@ -0,0 +1,73 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Any, Dict, Optional
+
+# Failed uploads in a row with early preheating before falling back to
+# preheating after the upload.
+_MAX_CONSECUTIVE_FAILURES = 2
+
+
+class EarlyPreheatProfile:
+  """Tracks whether a printer tolerates preheating before an upload.
+
+  The printer handles one request at a time, so preheat commands cannot run
+  during the transfer. They are sent right before it instead, and the printer
+  heats while it receives the model.
+  """
+
+  def __init__(self, stats: Optional[Dict[str, Any]] = None) -> None:
+    """Constructor.
+
+    Args:
+      stats: Stored measurements, as returned by to_dict().
+    """
+    stats = stats or {}
+    self._is_rejected = bool(stats.get('rejected', False))
+    self._consecutive_failures = int(stats.get('consecutive_failures', 0))
+    self._jobs = int(stats.get('jobs', 0))
+    self._secs_saved = float(stats.get('secs_saved', 0))
+
+  def to_dict(self) -> Dict[str, Any]:
+    """Returns measurements in a JSON-serializable format."""
+    return {
+        'rejected': self._is_rejected,
+        'consecutive_failures': self._consecutive_failures,
+        'jobs': self._jobs,
+        'secs_saved': round(self._secs_saved, 1),
+    }
+
+  @property
+  def is_tolerated(self) -> bool:
+    """True if preheat commands should be sent before the upload."""
+    return (not self._is_rejected
+            and self._consecutive_failures < _MAX_CONSECUTIVE_FAILURES)
+
+  @property
+  def jobs(self) -> int:
+    """Number of successful uploads with early preheating."""
+    return self._jobs
+
+  @property
+  def secs_saved(self) -> float:
+    """Total seconds of heating that overlapped with uploads."""
+    return self._secs_saved
+
+  def mark_rejected(self) -> None:
+    """Records that the firmware rejected a preheat command before upload."""
+    self._is_rejected = True
+
+  def record_upload(self, success: bool, secs_saved: float = 0) -> None:
+    """Records the outcome of an upload with early preheating.
+
+    Args:
+      success: True if the upload completed.
+      secs_saved: Seconds the printer heated while receiving the model.
+    """
+    if not success:
+      self._consecutive_failures += 1
+      return
+    self._consecutive_failures = 0
+    self._jobs += 1
+    self._secs_saved += max(0.0, secs_saved)
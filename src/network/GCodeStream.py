@@ -0,0 +1,167 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import collections
+import hashlib
+import io
+import threading
+from typing import Deque, Iterator, Optional, Tuple
+
+# pylint:disable=relative-beyond-top-level
+from ..models.PrintTimeTable import PrintTimeTable
+from ..parsers.GcodePreheatSettingsParser import PreheatScanner
+from ..parsers.GcodePrintTimeParser import PrintTimeScanner
+
+# G-code written but not sent yet, before the writer has to wait.
+DEFAULT_MAX_BUFFERED_BYTES = 1024 * 1024
+
+
+class StreamCancelledError(Exception):
+  """Raised to the reader when the stream is cancelled."""
+
+
+class GCodeStream(io.TextIOBase):
+  """Text stream that hands g-code to an upload while it is being written.
+
+  The writer thread blocks while too much g-code waits to be sent, so memory
+  stays bounded by what the network drains. G-code is dropped once it is
+  read: its hash, preheat temperatures and time markers are measured as it
+  is written instead. Thread-safe.
+  """
+
+  def __init__(self,
+               max_buffered_bytes: int = DEFAULT_MAX_BUFFERED_BYTES) -> None:
+    """Constructor.
+
+    Args:
+      max_buffered_bytes: G-code waiting to be sent before writes block.
+    """
+    super().__init__()
+    self._max_buffered_bytes = max_buffered_bytes
+    self._condition = threading.Condition()
+    self._pending: Deque[bytes] = collections.deque()
+    self._pending_bytes = 0
+    self._bytes_written = 0
+    # Only used by the writer thread until it finishes. Read them after.
+    self._hash = hashlib.sha256()
+    self._preheat_scanner = PreheatScanner()
+    self._print_time_scanner = PrintTimeScanner()
+    self._is_finished = False
+    self._is_cancelled = False
+    self._has_reader = True
+
+  @property
+  def bytes_written(self) -> int:
+    """Number of encoded bytes written so far."""
+    with self._condition:
+      return self._bytes_written
+
+  @property
+  def is_finished(self) -> bool:
+    """True once the writer wrote all the g-code."""
+    with self._condition:
+      return self._is_finished
+
+  @property
+  def content_hash(self) -> str:
+    """SHA-256 of the g-code. Complete once the writer finished."""
+    return self._hash.hexdigest()
+
+  @property
+  def preheat_temperatures(self) -> Tuple[Optional[int], Optional[int]]:
+    """Preheat bed and hotend temperatures. Complete once the writer
+    finished."""
+    return self._preheat_scanner.get_temperatures()
+
+  @property
+  def print_time_table(self) -> Optional[PrintTimeTable]:
+    """Slicer's time estimates. Complete once the writer finished."""
+    return self._print_time_scanner.get_table()
+
+  @property
+  def is_cancelled(self) -> bool:
+    """True if the writer or the upload gave up."""
+    with self._condition:
+      return self._is_cancelled
+
+  def writable(self) -> bool:
+    """See base class."""
+    return True
+
+  def write(self, text: str) -> int:
+    """Queues g-code for the upload. Blocks while the buffer is full.
+
+    Writes after a cancel are discarded, so the writer finishes quickly.
+
+    Args:
+      text: G-code.
+
+    Returns:
+      Number of characters written.
+    """
+    if self.is_cancelled:
+      return len(text)
+    data = text.encode('utf-8')
+    # Measured outside of the lock, so that the reader is not held up.
+    self._hash.update(data)
+    self._preheat_scanner.feed(data)
+    self._print_time_scanner.feed(data)
+    with self._condition:
+      while (self._has_reader and not self._is_cancelled and self._pending
+             and self._pending_bytes + len(data) > self._max_buffered_bytes):
+        self._condition.wait()
+      if self._is_cancelled:
+        return len(text)
+      self._bytes_written += len(data)
+      if self._has_reader:
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+      self._condition.notify_all()
+    return len(text)
+
+  def finish(self) -> None:
+    """Tells the reader that all the g-code was written."""
+    with self._condition:
+      self._is_finished = True
+      self._condition.notify_all()
+
+  def cancel(self) -> None:
+    """Stops both the writer and the reader."""
+    with self._condition:
+      self._is_cancelled = True
+      self._pending.clear()
+      self._pending_bytes = 0
+      self._condition.notify_all()
+
+  def detach_reader(self) -> None:
+    """Stops buffering for the reader, for example if the upload failed.
+
+    The writer carries on without blocking and its g-code is dropped, so that
+    it finishes quickly.
+    """
+    with self._condition:
+      self._has_reader = False
+      self._pending.clear()
+      self._pending_bytes = 0
+      self._condition.notify_all()
+
+  def read_chunks(self) -> Iterator[bytes]:
+    """Yields g-code as it is written, until the writer finishes.
+
+    Raises:
+      StreamCancelledError: if the stream is cancelled.
+    """
+    while True:
+      with self._condition:
+        while (not self._pending and not self._is_finished
+               and not self._is_cancelled):
+          self._condition.wait()
+        if self._is_cancelled:
+          raise StreamCancelledError()
+        if not self._pending:
+          return  # Finished.
+        chunk = self._pending.popleft()
+        self._pending_bytes -= len(chunk)
+        self._condition.notify_all()
+      yield chunk
@@ -2,6 +2,8 @@
 Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
+import socket
+import threading
 import time
 from http.client import HTTPConnection
 
@@ -12,9 +14,23 @@ except ImportError:
   # Cura 4.9.1 or older.
   from PyQt5.QtCore import QThread, pyqtSignal
 
+# pylint:disable=relative-beyond-top-level
+from . import RequestArbiter
+from . import UploadScheduler
+from .RequestArbiter import Priority
+from .StatusMailbox import StatusMailbox
+from ..metrics import Metrics
 
-_REQUEST_TIMEOUT_SECS = 2
 _POLL_INTERVAL_SECS = 2
+# Deadline multiplier while uploads congest the printer's network segment.
+_BUSY_NETWORK_TIMEOUT_FACTOR = 2
+
+_RTT_SECONDS = Metrics.histogram(
+    'mpsm2_heartbeat_rtt_seconds', 'Round-trip time of status polls.',
+    ['printer'])
+_TIMEOUTS = Metrics.counter(
+    'mpsm2_heartbeat_timeouts_total', 'Status polls without a response.',
+    ['printer'])
 
 
 class PrinterHeartbeat(QThread):
@@ -22,15 +38,22 @@ class PrinterHeartbeat(QThread):
   Background thread that polls printer status.
 
   Status contains printer state, temperatures and printing progress.
+  Responses, or 'timeout', are put in a mailbox that the main thread drains,
+  instead of being emitted as queued signals that pile up while the main
+  thread is busy.
   """
-  heartbeatSignal = pyqtSignal(str, str)  # Address, raw response.
   onPrinterUpload = pyqtSignal(bool)
 
-  def __init__(self, address: str, parent=None) -> None:
+  def __init__(self, address: str, mailbox: StatusMailbox,
+               parent=None) -> None:
     QThread.__init__(self, parent)
     self._address = address
+    self._mailbox = mailbox
+    self._arbiter = RequestArbiter.get_arbiter(address)
     self._is_running = True
     self._is_uploading = False
+    self._rtt_seconds = _RTT_SECONDS.labels(address)
+    self._timeouts = _TIMEOUTS.labels(address)
 
   def handle_printer_busy(self, is_uploading: bool) -> None:
     self._is_uploading = is_uploading
@@ -46,14 +69,71 @@ class PrinterHeartbeat(QThread):
       time.sleep(_POLL_INTERVAL_SECS)
 
   def _inquiry(self) -> None:
-    """Queries printer status."""
-    connection = HTTPConnection(self._address, timeout=_REQUEST_TIMEOUT_SECS)
+    """Queries printer status when the printer's arbiter allows it.
+
+    The poll is skipped if other requests to the printer are waiting. The
+    arbiter's turn is given back on every exit path, including when the beat
+    stops after the arbiter dequeued the poll but before it started.
+    """
+    is_ready = threading.Event()
+    lock = threading.Lock()
+    arbiter_done = []
+    is_abandoned = False
+
+    def start(done) -> None:
+      with lock:
+        if not is_abandoned:
+          arbiter_done.append(done)
+          is_ready.set()
+          return
+      done()  # Started after the heartbeat gave up: release right away.
+
+    ticket = self._arbiter.submit(Priority.POLL, start,
+                                  on_dropped=is_ready.set)
+    try:
+      while not is_ready.wait(_POLL_INTERVAL_SECS):
+        if ticket and self._arbiter.cancel(ticket):
+          return  # Printer is busy with other requests.
+        if not self._is_running:
+          return
+      if arbiter_done and self._is_running:
+        self._request_status()
+    finally:
+      with lock:
+        is_abandoned = True
+        to_release = list(arbiter_done)
+      for done in to_release:
+        done()
+
+  def _request_status(self) -> None:
+    """Requests printer status and puts the response in the mailbox.
+
+    The deadline comes from the printer's measured round-trip time, and is
+    longer while other printers on the same network segment upload. Chunked
+    uploads on the segment hold back their data until the poll is over.
+    """
+    rtt_estimator = self._arbiter.rtt_estimator
+    scheduler = UploadScheduler.get_scheduler()
+    timeout_secs = rtt_estimator.timeout_secs
+    if scheduler.is_segment_busy(self._address):
+      timeout_secs *= _BUSY_NETWORK_TIMEOUT_FACTOR
+    connection = HTTPConnection(self._address, timeout=timeout_secs)
+    started_at = time.monotonic()
     try:
-      connection.request('GET', '/inquiry')
-      response = connection.getresponse()
-      self.heartbeatSignal.emit(self._address,
-                                response.read().decode('utf-8'))
+      with scheduler.reserve_poll(self._address):
+        connection.request('GET', '/inquiry')
+        response = connection.getresponse()
+        body = response.read().decode('utf-8')
+      rtt_secs = time.monotonic() - started_at
+      rtt_estimator.add_sample(rtt_secs)
+      self._rtt_seconds.observe(rtt_secs)
+      self._mailbox.put(self._address, body)
+    except socket.timeout:
+      rtt_estimator.on_timeout()
+      self._timeouts.inc()
+      self._mailbox.put(self._address, 'timeout')
     except Exception:
-      self.heartbeatSignal.emit(self._address, 'timeout')
+      self._timeouts.inc()
+      self._mailbox.put(self._address, 'timeout')
     finally:
       connection.close()
@@ -0,0 +1,56 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Any, Callable, Dict
+
+
+class ReplyRegistry:
+  """Owns network replies while they are in flight.
+
+  Keeps each reply's callback from being garbage-collected until the reply
+  finishes. Qt emits finished after success, errors and aborts alike. The
+  callback then runs once and the reply is scheduled for deletion together
+  with its children, such as upload multi-parts and deadline timers. Adding
+  and removing a reply are O(1).
+  """
+
+  def __init__(self) -> None:
+    self._callbacks: Dict[Any, Callable[[], None]] = {}
+
+  def __len__(self) -> int:
+    """Number of replies in flight."""
+    return len(self._callbacks)
+
+  def __contains__(self, reply: Any) -> bool:
+    """Returns True if the reply is in flight.
+
+    Args:
+      reply: QNetworkReply.
+    """
+    return reply in self._callbacks
+
+  def add(self, reply: Any, on_finished: Callable[[], None]) -> None:
+    """Takes ownership of a reply.
+
+    Args:
+      reply: QNetworkReply.
+      on_finished: Called once when the reply finishes.
+    """
+    self._callbacks[reply] = on_finished
+    reply.finished.connect(lambda: self._on_finished(reply))
+
+  def _on_finished(self, reply: Any) -> None:
+    """Runs the callback of a finished reply and disposes of it.
+
+    Args:
+      reply: QNetworkReply.
+    """
+    on_finished = self._callbacks.pop(reply, None)
+    if on_finished is None:
+      return  # Already handled.
+    try:
+      on_finished()
+    finally:
+      # Deferred to the event loop: other finished listeners still run.
+      reply.deleteLater()
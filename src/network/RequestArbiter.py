@@ -0,0 +1,235 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import enum
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .RttEstimator import RttEstimator
+from ..metrics import Metrics
+
+# Starts a request. Receives a callback to call once the request is over.
+Start = Callable[[Callable[[], None]], None]
+# Runs a function, for example on the thread that owns network requests.
+Dispatcher = Callable[[Callable[[], None]], None]
+
+
+class Priority(enum.IntEnum):
+  """Request priorities. Lower value is served first."""
+  CONTROL = 0  # Cancel, pause and resume.
+  COMMAND = 1  # Start, temperatures, settings and on-demand status.
+  UPLOAD = 2
+  POLL = 3  # Periodic status polls. Dropped while other work is queued.
+
+
+class Ticket:
+  """Handle to a submitted request."""
+
+  def __init__(self, priority: Priority, start: Start,
+               on_dropped: Optional[Callable[[], None]],
+               submitted_at: float) -> None:
+    self.priority = priority
+    self.start = start
+    self.on_dropped = on_dropped
+    self.submitted_at = submitted_at
+
+
+class RequestArbiter:
+  """Serializes all requests to one printer by priority.
+
+  The firmware handles one request at a time, so at most one request is in
+  flight. Thread-safe: requests can be submitted and finished from any thread.
+  """
+
+  def __init__(self, dispatcher: Optional[Dispatcher] = None,
+               clock: Callable[[], float] = time.monotonic,
+               on_waited: Optional[Callable[[Priority, float], None]] = None
+               ) -> None:
+    """Constructor.
+
+    Args:
+      dispatcher: Runs the start of every request. Default runs it directly.
+      clock: Monotonic clock in seconds.
+      on_waited: Called with the priority and queue wait in seconds of each
+        request that is sent, e.g. to export metrics.
+    """
+    self._dispatcher = dispatcher or (lambda function: function())
+    self._clock = clock
+    self._on_waited = on_waited
+    self._lock = threading.Lock()
+    self._queue: List[Tuple[int, int, Ticket]] = []
+    self._sequence = itertools.count()
+    self._in_flight: Optional[Ticket] = None
+    # Round-trip time of the printer, shared by all its clients.
+    self.rtt_estimator = RttEstimator()
+    # Priority -> [count, total wait secs, max wait secs].
+    self._wait_stats = {priority: [0, 0.0, 0.0] for priority in Priority}
+
+  @property
+  def dispatcher(self) -> Dispatcher:
+    """Runs functions on the thread that starts requests."""
+    return self._dispatcher
+
+  @property
+  def queue_depth(self) -> int:
+    """Number of requests waiting, excluding the one in flight."""
+    with self._lock:
+      return len(self._queue)
+
+  @property
+  def is_busy(self) -> bool:
+    """True while a request is in flight."""
+    with self._lock:
+      return self._in_flight is not None
+
+  def get_wait_stats(self) -> Dict[str, Tuple[int, float, float]]:
+    """Returns how long requests waited before being sent.
+
+    Returns:
+      Per priority name: count, mean and maximum wait in seconds.
+    """
+    with self._lock:
+      return {priority.name: (count, total / count if count else 0.0, longest)
+              for priority, (count, total, longest)
+              in self._wait_stats.items()}
+
+  def submit(self, priority: Priority, start: Start,
+             on_dropped: Optional[Callable[[], None]] = None
+             ) -> Optional[Ticket]:
+    """Queues a request.
+
+    Args:
+      priority: Request priority.
+      start: Sends the request. Must call the given callback exactly once
+        when the request finishes or fails.
+      on_dropped: Called if a poll is dropped instead of being sent.
+
+    Returns:
+      Ticket to cancel the request while it waits. None if dropped.
+    """
+    dropped: List[Ticket] = []
+    ticket = Ticket(priority, start, on_dropped, self._clock())
+    with self._lock:
+      if priority == Priority.POLL:
+        if self._queue:
+          # Higher-priority work or another poll is already waiting.
+          dropped.append(ticket)
+          ticket = None
+      else:
+        dropped = [queued for _, _, queued in self._queue
+                   if queued.priority == Priority.POLL]
+        if dropped:
+          self._queue = [entry for entry in self._queue
+                         if entry[2].priority != Priority.POLL]
+          heapq.heapify(self._queue)
+      if ticket:
+        heapq.heappush(self._queue,
+                       (int(priority), next(self._sequence), ticket))
+    for dropped_ticket in dropped:
+      if dropped_ticket.on_dropped:
+        dropped_ticket.on_dropped()
+    self._send_next()
+    return ticket
+
+  def cancel(self, ticket: Ticket) -> bool:
+    """Removes a request that has not been sent yet.
+
+    Args:
+      ticket: Request to cancel.
+
+    Returns:
+      True if removed. False if it was already sent.
+    """
+    with self._lock:
+      for index, entry in enumerate(self._queue):
+        if entry[2] is ticket:
+          self._queue.pop(index)
+          heapq.heapify(self._queue)
+          return True
+    return False
+
+  def _send_next(self) -> None:
+    """Sends the highest-priority request if none is in flight."""
+    with self._lock:
+      if self._in_flight or not self._queue:
+        return
+      _, _, ticket = heapq.heappop(self._queue)
+      self._in_flight = ticket
+      wait_secs = self._clock() - ticket.submitted_at
+      stats = self._wait_stats[ticket.priority]
+      stats[0] += 1
+      stats[1] += wait_secs
+      stats[2] = max(stats[2], wait_secs)
+    if self._on_waited:
+      self._on_waited(ticket.priority, wait_secs)
+    is_done = False
+
+    def done() -> None:
+      nonlocal is_done
+      with self._lock:
+        if is_done:
+          return
+        is_done = True
+        self._in_flight = None
+      self._send_next()
+
+    self._dispatcher(lambda: ticket.start(done))
+
+
+_QUEUE_DEPTH = Metrics.gauge(
+    'mpsm2_request_queue_depth', 'Requests waiting to be sent to a printer.',
+    ['printer'])
+_WAIT_SECONDS = Metrics.histogram(
+    'mpsm2_request_wait_seconds',
+    'Time requests waited in the queue before being sent.',
+    ['printer', 'priority'])
+
+_arbiters: Dict[str, RequestArbiter] = {}
+_arbiters_lock = threading.Lock()
+_dispatcher: Optional[Dispatcher] = None
+
+
+def set_dispatcher(dispatcher: Dispatcher) -> None:
+  """Sets how arbiters created from now on start requests.
+
+  Args:
+    dispatcher: Runs a function, for example on the Qt main thread.
+  """
+  global _dispatcher  # pylint:disable=global-statement
+  _dispatcher = dispatcher
+
+
+def get_arbiter(address: str) -> RequestArbiter:
+  """Returns the arbiter of a printer, shared by all its clients.
+
+  Args:
+    address: Printer's IP address.
+  """
+  with _arbiters_lock:
+    if address not in _arbiters:
+      wait_seconds = {priority: _WAIT_SECONDS.labels(address,
+                                                     priority.name.lower())
+                      for priority in Priority}
+      arbiter = RequestArbiter(
+          _dispatcher,
+          on_waited=lambda priority, secs: wait_seconds[priority].observe(secs))
+      _QUEUE_DEPTH.labels(address).set_function(lambda: arbiter.queue_depth)
+      _arbiters[address] = arbiter
+    return _arbiters[address]
+
+
+def remove_arbiter(address: str) -> None:
+  """Forgets the arbiter of a printer.
+
+  Args:
+    address: Printer's IP address.
+  """
+  with _arbiters_lock:
+    _arbiters.pop(address, None)
+  _QUEUE_DEPTH.remove(address)
+  for priority in Priority:
+    _WAIT_SECONDS.remove(address, priority.name.lower())
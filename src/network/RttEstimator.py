@@ -0,0 +1,88 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+
+# Smoothing factors and variance multiplier from RFC 6298.
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+_K = 4
+
+
+class RttEstimator:
+  """Estimates request deadlines from a printer's measured round-trip time.
+
+  Like TCP's retransmission timeout, the deadline is the smoothed round-trip
+  time plus a margin of four times its variance. Each timeout doubles the
+  deadline until a new sample is measured. Thread-safe.
+  """
+
+  def __init__(self, initial_timeout_secs: float = 2,
+               min_timeout_secs: float = 0.5,
+               max_timeout_secs: float = 10) -> None:
+    """Constructor.
+
+    Args:
+      initial_timeout_secs: Deadline until the first sample is measured.
+      min_timeout_secs: Lower bound for any deadline.
+      max_timeout_secs: Upper bound for any deadline.
+    """
+    if not 0 < min_timeout_secs <= initial_timeout_secs <= max_timeout_secs:
+      raise ValueError('Invalid timeouts: '
+                       f'{min_timeout_secs}s, {initial_timeout_secs}s, '
+                       f'{max_timeout_secs}s.')
+    self._min_timeout_secs = min_timeout_secs
+    self._max_timeout_secs = max_timeout_secs
+    self._timeout_secs = initial_timeout_secs
+    self._smoothed_rtt_secs = None
+    self._rtt_variance_secs = None
+    self._backoff = 1
+    self._timeout_count = 0
+    self._lock = threading.Lock()
+
+  @property
+  def smoothed_rtt_secs(self) -> float:
+    """Smoothed round-trip time. None until the first sample."""
+    return self._smoothed_rtt_secs
+
+  @property
+  def timeout_secs(self) -> float:
+    """Deadline for the next request."""
+    with self._lock:
+      return min(self._timeout_secs * self._backoff, self._max_timeout_secs)
+
+  @property
+  def timeout_count(self) -> int:
+    """Number of requests that missed their deadline."""
+    return self._timeout_count
+
+  def add_sample(self, rtt_secs: float) -> None:
+    """Updates the estimation with a measured round-trip time.
+
+    Only requests which did not time out should be measured.
+
+    Args:
+      rtt_secs: Time between sending a request and receiving its response.
+    """
+    with self._lock:
+      if self._smoothed_rtt_secs is None:
+        self._smoothed_rtt_secs = rtt_secs
+        self._rtt_variance_secs = rtt_secs / 2
+      else:
+        self._rtt_variance_secs = (
+            (1 - _BETA) * self._rtt_variance_secs
+            + _BETA * abs(self._smoothed_rtt_secs - rtt_secs))
+        self._smoothed_rtt_secs = (
+            (1 - _ALPHA) * self._smoothed_rtt_secs + _ALPHA * rtt_secs)
+      timeout_secs = self._smoothed_rtt_secs + _K * self._rtt_variance_secs
+      self._timeout_secs = min(max(timeout_secs, self._min_timeout_secs),
+                               self._max_timeout_secs)
+      self._backoff = 1
+
+  def on_timeout(self) -> None:
+    """Doubles the deadline after a request missed it."""
+    with self._lock:
+      self._timeout_count += 1
+      if self._timeout_secs * self._backoff < self._max_timeout_secs:
+        self._backoff *= 2
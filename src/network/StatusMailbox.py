@@ -0,0 +1,47 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+from typing import Dict
+
+
+class StatusMailbox:
+  """Keeps the newest status response of each printer until it is read.
+
+  Heartbeat threads put responses, the main thread drains them periodically.
+  A response that is not read before the next one arrives is dropped, so a
+  stalled main thread catches up with one update per printer. Thread-safe.
+  """
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._responses: Dict[str, str] = {}
+    self.superseded_count = 0
+
+  def put(self, address: str, response: str) -> None:
+    """Stores the newest response of a printer.
+
+    Args:
+      address: Printer's IP address.
+      response: Status response, or 'timeout'.
+    """
+    with self._lock:
+      if address in self._responses:
+        self.superseded_count += 1
+      self._responses[address] = response
+
+  def drain(self) -> Dict[str, str]:
+    """Returns and forgets the newest response of every printer."""
+    with self._lock:
+      responses, self._responses = self._responses, {}
+    return responses
+
+  def discard(self, address: str) -> None:
+    """Forgets the pending response of a printer.
+
+    Args:
+      address: Printer's IP address.
+    """
+    with self._lock:
+      self._responses.pop(address, None)
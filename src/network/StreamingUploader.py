@@ -0,0 +1,160 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import http.client
+import threading
+import uuid
+from typing import Callable, Iterator, Optional
+
+from .GCodeStream import GCodeStream, StreamCancelledError
+
+# Runs a function, for example on the Qt main thread.
+Dispatcher = Callable[[Callable[[], None]], None]
+
+
+class StreamingUploader:
+  """Uploads g-code to a printer while it is being written.
+
+  Sends a POST multipart/form-data request with chunked transfer encoding on
+  a worker thread, draining a GCodeStream. Callbacks run through the
+  dispatcher. Cancelling the upload cancels the stream, and a cancelled stream
+  aborts the upload. Neither calls on_finished nor on_error.
+  """
+
+  def __init__(self, address: str, filename: str, stream: GCodeStream,
+               on_finished: Callable[[str], None],
+               on_progress: Callable[[int, int], None],
+               on_error: Callable[[], None],
+               on_closed: Callable[[], None], dispatcher: Dispatcher,
+               stall_timeout_secs: float, port: int = 80,
+               yield_to_polls: Optional[Callable[[], None]] = None) -> None:
+    """Constructor.
+
+    Args:
+      address: Printer's IP address.
+      filename: Name of the file to upload.
+      stream: G-code being written.
+      on_finished: Called with the HTTP body response.
+      on_progress: Called with bytes sent and bytes written so far.
+      on_error: Called if the upload fails.
+      on_closed: Called last, whatever the outcome, also after a cancel.
+      dispatcher: Runs the callbacks.
+      stall_timeout_secs: The upload fails if the socket makes no progress
+        for this long.
+      port: HTTP port of the printer.
+      yield_to_polls: Called before each chunk, may block while status polls
+        on the same network are in flight.
+    """
+    self._address = address
+    self._filename = filename
+    self._stream = stream
+    self._on_finished = on_finished
+    self._on_progress = on_progress
+    self._on_error = on_error
+    self._on_closed = on_closed
+    self._dispatcher = dispatcher
+    self._stall_timeout_secs = stall_timeout_secs
+    self._port = port
+    self._yield_to_polls = yield_to_polls or (lambda: None)
+    self._lock = threading.Lock()
+    self._connection: Optional[http.client.HTTPConnection] = None
+    self._is_cancelled = False
+    self._is_over = False
+    self._thread = threading.Thread(
+        target=self._run, name=f'StreamingUploader-{address}', daemon=True)
+
+  def start(self) -> None:
+    """Starts the upload on a worker thread."""
+    self._thread.start()
+
+  def cancel(self) -> None:
+    """Aborts the upload and stops the g-code writer.
+
+    Does nothing once the upload finished or failed, so the writer can complete
+    the g-code for a retry.
+    """
+    with self._lock:
+      if self._is_over:
+        return
+      self._is_cancelled = True
+      connection = self._connection
+    self._stream.cancel()
+    if connection and connection.sock:
+      connection.sock.close()  # Unblocks a pending send or receive.
+
+  def join(self, timeout_secs: Optional[float] = None) -> None:
+    """Waits for the worker thread to end.
+
+    Args:
+      timeout_secs: Maximum wait. None waits forever.
+    """
+    self._thread.join(timeout_secs)
+
+  def _body(self, boundary: str) -> Iterator[bytes]:
+    """Yields the multipart body as the g-code is written.
+
+    Args:
+      boundary: Multipart boundary.
+    """
+    yield (f'--{boundary}\r\n'
+           f'Content-Disposition: form-data; name="file"; '
+           f'filename="{self._filename}"\r\n'
+           'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+    bytes_sent = 0
+    for chunk in self._stream.read_chunks():
+      self._yield_to_polls()
+      yield chunk
+      bytes_sent += len(chunk)
+      self._dispatch(self._on_progress, bytes_sent, self._stream.bytes_written)
+    yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+  def _run(self) -> None:
+    """Runs the upload on the worker thread."""
+    try:
+      self._upload()
+    finally:
+      self._dispatch(self._on_closed)
+
+  def _upload(self) -> None:
+    """Sends the request and waits for the response."""
+    boundary = uuid.uuid4().hex
+    connection = http.client.HTTPConnection(
+        self._address, self._port, timeout=self._stall_timeout_secs)
+    with self._lock:
+      if self._is_cancelled:
+        return
+      self._connection = connection
+    try:
+      connection.request(
+          'POST', '/upload', body=self._body(boundary),
+          headers={'Content-Type':
+                   f'multipart/form-data; boundary={boundary}'},
+          encode_chunked=True)
+      response = connection.getresponse()
+      body = response.read().decode('utf-8', errors='replace')
+      is_ok = response.status == 200
+    except StreamCancelledError:
+      return  # Writer failed or upload cancelled. Handled by their owners.
+    except (OSError, http.client.HTTPException):
+      is_ok = False
+    finally:
+      connection.close()
+    with self._lock:
+      if self._is_cancelled:
+        return
+      self._is_over = True
+    if is_ok:
+      self._dispatch(self._on_finished, body)
+    else:
+      self._stream.detach_reader()  # Let the writer finish.
+      self._dispatch(self._on_error)
+
+  def _dispatch(self, callback: Callable, *args) -> None:
+    """Runs a callback through the dispatcher.
+
+    Args:
+      callback: Function to run.
+      args: Arguments of the function.
+    """
+    self._dispatcher(lambda: callback(*args))
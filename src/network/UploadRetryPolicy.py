@@ -0,0 +1,50 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+
+
+class UploadRetryPolicy:
+  """Capped exponential backoff for print job upload retries."""
+
+  def __init__(self,
+               max_attempts: int = 5,
+               initial_delay_secs: float = 5,
+               max_delay_secs: float = 120,
+               multiplier: float = 2) -> None:
+    """Constructor.
+
+    Args:
+      max_attempts: Maximum number of retries after the first upload failed.
+      initial_delay_secs: Delay before the first retry.
+      max_delay_secs: Upper bound for any delay.
+      multiplier: Delay growth factor between consecutive retries.
+    """
+    if max_attempts < 0:
+      raise ValueError(f'Invalid maximum attempts: {max_attempts}.')
+    if initial_delay_secs < 0 or max_delay_secs < initial_delay_secs:
+      raise ValueError(
+          f'Invalid delays: {initial_delay_secs}s, {max_delay_secs}s.')
+    if multiplier < 1:
+      raise ValueError(f'Invalid multiplier: {multiplier}.')
+    self.max_attempts = max_attempts
+    self._initial_delay_secs = initial_delay_secs
+    self._max_delay_secs = max_delay_secs
+    self._multiplier = multiplier
+
+  def can_retry(self, attempt: int) -> bool:
+    """Returns True if another retry is allowed.
+
+    Args:
+      attempt: Number of retries already made.
+    """
+    return attempt < self.max_attempts
+
+  def get_delay_secs(self, attempt: int) -> float:
+    """Returns the delay before the next retry.
+
+    Args:
+      attempt: Number of retries already made.
+    """
+    delay = self._initial_delay_secs * self._multiplier ** attempt
+    return min(delay, self._max_delay_secs)
@@ -0,0 +1,394 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import collections
+import contextlib
+import ipaddress
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..metrics import Metrics
+
+# Runs a function, for example on the Qt main thread.
+Dispatcher = Callable[[Callable[[], None]], None]
+
+DEFAULT_MAX_CONCURRENCY = 4
+# Fraction of the best aggregate throughput that is good enough. The fewest
+# concurrent uploads reaching it are preferred: more uploads would mostly add
+# contention and leave less airtime for status polls.
+_SATURATION_RATIO = 0.9
+# Weight of the newest aggregate throughput sample.
+_EWMA_WEIGHT = 0.3
+# Printers outside of the configured segments are grouped by /24 network.
+_DEFAULT_PREFIX_LENGTH = 24
+# Longest time upload data is held back for status polls on its segment.
+MAX_POLL_WAIT_SECS = 1.0
+
+_CONCURRENCY_LIMIT = Metrics.gauge(
+    'mpsm2_upload_concurrency_limit',
+    'Concurrent uploads allowed per network segment.', ['segment'])
+_QUEUED_UPLOADS = Metrics.gauge(
+    'mpsm2_queued_uploads',
+    'Uploads waiting for other uploads on the same network segment.',
+    ['segment'])
+
+
+def parse_segments(value: str) -> List[str]:
+  """Returns the networks of a comma-separated list, skipping invalid ones.
+
+  Args:
+    value: For example '192.168.1.0/25,192.168.1.128/25'.
+  """
+  segments = []
+  for network in value.split(','):
+    try:
+      segments.append(str(ipaddress.ip_network(network.strip(),
+                                               strict=False)))
+    except ValueError:
+      continue
+  return segments
+
+
+class _Upload:
+  """Upload holding a slot of its segment."""
+  __slots__ = ('started_at', 'concurrency_secs')
+
+  def __init__(self, started_at: float) -> None:
+    self.started_at = started_at
+    # Integral of the number of concurrent uploads over time.
+    self.concurrency_secs = 0.0
+
+
+class _Segment:
+  """Uploads and measurements of printers sharing a network segment."""
+
+  def __init__(self, throughputs: Dict[int, float]) -> None:
+    self.active: Dict[str, _Upload] = {}
+    self.queue: Deque[Tuple[str, Callable[[], None]]] = collections.deque()
+    # Concurrent uploads -> aggregate bytes per second.
+    self.throughputs = throughputs
+    self.changed_at = 0.0
+
+
+class UploadScheduler:
+  """Limits concurrent uploads to printers sharing a network segment.
+
+  Uploads over the limit wait in a queue, first come first served. Segments
+  without measurements allow the maximum concurrency, so that a batch is sent
+  about as fast as a single upload. The limit is then lowered from the
+  aggregate throughput measured at each concurrency: it settles on the fewest
+  uploads reaching most of the best throughput, and drops below concurrencies
+  at which uploads only failed.
+
+  Status polls take precedence over upload data: uploads that send their data
+  in chunks hold the next chunk back while a poll on their segment is in
+  flight.
+
+  Scheduling must be done from a single thread. Poll reservations and
+  is_segment_busy() are thread-safe.
+  """
+
+  def __init__(self, segments: Sequence[str] = (),
+               max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+               stats: Optional[Dict[str, Dict[str, float]]] = None,
+               dispatcher: Optional[Dispatcher] = None,
+               on_measured: Optional[Callable[[], None]] = None,
+               clock: Callable[[], float] = time.monotonic) -> None:
+    """Constructor.
+
+    Args:
+      segments: Networks, e.g. '192.168.1.0/25', each served by one access
+        point.
+      max_concurrency: Maximum concurrent uploads per segment.
+      stats: Stored measurements, as returned by to_dict().
+      dispatcher: Runs the start of queued uploads. Default runs it directly.
+      on_measured: Called when the measurements changed, e.g. to store them.
+      clock: Monotonic clock in seconds.
+    """
+    self._networks = [ipaddress.ip_network(segment, strict=False)
+                      for segment in segments]
+    self._max_concurrency = max(1, max_concurrency)
+    self._stats = stats or {}
+    self._dispatcher = dispatcher or (lambda function: function())
+    self._on_measured = on_measured
+    self._clock = clock
+    self._segments: Dict[str, _Segment] = {}
+    # Segment -> status polls in flight.
+    self._polls_in_flight: Dict[str, int] = collections.Counter()
+    self._polls_done = threading.Condition()
+
+  def to_dict(self) -> Dict[str, Dict[str, float]]:
+    """Returns measurements in a JSON-serializable format."""
+    stats = dict(self._stats)
+    for name, segment in self._segments.items():
+      stats[name] = {str(concurrency): round(throughput, 1)
+                     for concurrency, throughput
+                     in sorted(segment.throughputs.items())}
+    return stats
+
+  def get_segment(self, address: str) -> str:
+    """Returns the network segment of a printer.
+
+    Args:
+      address: Printer's IP address.
+    """
+    try:
+      ip_address = ipaddress.ip_address(address)
+    except ValueError:
+      return address  # Host name: cannot tell, so not grouped.
+    for network in self._networks:
+      if ip_address in network:
+        return str(network)
+    return str(ipaddress.ip_network(
+        f'{address}/{_DEFAULT_PREFIX_LENGTH}', strict=False))
+
+  def get_concurrency_limit(self, address: str) -> int:
+    """Returns the concurrent uploads allowed in the segment of a printer.
+
+    Args:
+      address: Printer's IP address.
+    """
+    throughputs = self._get_segment(address).throughputs
+    if not throughputs:
+      return self._max_concurrency
+    best = max(throughputs.values())
+    if not best:
+      # Uploads only failed: back off below the fewest that failed.
+      return max(1, min(min(throughputs) - 1, self._max_concurrency))
+    limit = min(concurrency for concurrency, throughput in throughputs.items()
+                if throughput >= _SATURATION_RATIO * best)
+    if limit == max(throughputs):
+      # Still scaling, or more uploads were not tried yet.
+      return self._max_concurrency
+    return min(limit, self._max_concurrency)
+
+  def has_free_slot(self, address: str) -> bool:
+    """Returns True if an upload to the printer would start right away.
+
+    Args:
+      address: Printer's IP address.
+    """
+    segment = self._get_segment(address)
+    return (not segment.queue
+            and len(segment.active) < self.get_concurrency_limit(address))
+
+  def is_queued(self, address: str) -> bool:
+    """Returns True if an upload to the printer waits for a slot.
+
+    Args:
+      address: Printer's IP address.
+    """
+    return any(queued == address
+               for queued, _ in self._get_segment(address).queue)
+
+  def is_segment_busy(self, address: str) -> bool:
+    """Returns True while any printer in the printer's segment uploads.
+
+    Args:
+      address: Printer's IP address.
+    """
+    segment = self._segments.get(self.get_segment(address))
+    return bool(segment and segment.active)
+
+  @contextlib.contextmanager
+  def reserve_poll(self, address: str) -> Iterator[None]:
+    """Holds back chunked uploads on the printer's segment during a poll.
+
+    Args:
+      address: Printer's IP address.
+    """
+    name = self.get_segment(address)
+    with self._polls_done:
+      self._polls_in_flight[name] += 1
+    try:
+      yield
+    finally:
+      with self._polls_done:
+        self._polls_in_flight[name] -= 1
+        if not self._polls_in_flight[name]:
+          del self._polls_in_flight[name]
+          self._polls_done.notify_all()
+
+  def yield_to_polls(self, address: str,
+                     max_wait_secs: float = MAX_POLL_WAIT_SECS) -> None:
+    """Waits until no status poll is in flight on the printer's segment.
+
+    Called by uploads between chunks.
+
+    Args:
+      address: Printer's IP address.
+      max_wait_secs: Longest wait, so that a hung poll does not stall uploads.
+    """
+    name = self.get_segment(address)
+    with self._polls_done:
+      self._polls_done.wait_for(lambda: name not in self._polls_in_flight,
+                                max_wait_secs)
+
+  def request(self, address: str, start: Callable[[], None]) -> bool:
+    """Starts an upload if its segment has a free slot, otherwise queues it.
+
+    Args:
+      address: Printer's IP address.
+      start: Starts the upload. Called through the dispatcher if queued.
+
+    Returns:
+      True if the upload started right away.
+    """
+    segment = self._get_segment(address)
+    self.cancel(address)  # At most one upload per printer.
+    if self.has_free_slot(address):
+      self._activate(segment, address)
+      start()
+      return True
+    segment.queue.append((address, start))
+    self._update_metrics(address)
+    return False
+
+  def finish(self, address: str, bytes_sent: int, success: bool) -> None:
+    """Releases the slot of an upload and measures the segment throughput.
+
+    Failed uploads that ran alongside others count as no throughput at their
+    concurrency. Those that ran alone are not measured.
+
+    Args:
+      address: Printer's IP address.
+      bytes_sent: Size of the upload.
+      success: True if the upload completed.
+    """
+    segment = self._get_segment(address)
+    upload = self._deactivate(segment, address)
+    if upload is None:
+      return
+    secs = self._clock() - upload.started_at
+    concurrency = (max(1, round(upload.concurrency_secs / secs))
+                   if secs > 0 else 1)
+    if secs > 0 and (success or concurrency > 1):
+      throughput = bytes_sent / secs * concurrency if success else 0.0
+      previous = segment.throughputs.get(concurrency)
+      segment.throughputs[concurrency] = (
+          throughput if previous is None
+          else _EWMA_WEIGHT * throughput + (1 - _EWMA_WEIGHT) * previous)
+      if self._on_measured:
+        self._on_measured()
+    self._start_queued(segment, address)
+
+  def cancel(self, address: str) -> None:
+    """Releases the slot of an upload, or removes it from the queue.
+
+    Nothing is measured. Does nothing if the printer has no upload.
+
+    Args:
+      address: Printer's IP address.
+    """
+    segment = self._get_segment(address)
+    if self._deactivate(segment, address) is not None:
+      self._start_queued(segment, address)
+      return
+    for index, (queued, _) in enumerate(segment.queue):
+      if queued == address:
+        del segment.queue[index]
+        self._update_metrics(address)
+        return
+
+  def _get_segment(self, address: str) -> _Segment:
+    """Returns the segment of a printer, creating it if needed.
+
+    Args:
+      address: Printer's IP address.
+    """
+    name = self.get_segment(address)
+    if name not in self._segments:
+      stored = self._stats.get(name, {})
+      self._segments[name] = _Segment(
+          {int(concurrency): float(throughput)
+           for concurrency, throughput in stored.items()})
+    return self._segments[name]
+
+  def _advance(self, segment: _Segment) -> None:
+    """Accounts the time since the last change to every active upload.
+
+    Args:
+      segment: Segment whose uploads changed.
+    """
+    now = self._clock()
+    elapsed = now - segment.changed_at
+    for upload in segment.active.values():
+      upload.concurrency_secs += len(segment.active) * elapsed
+    segment.changed_at = now
+
+  def _activate(self, segment: _Segment, address: str) -> None:
+    """Gives a slot to an upload.
+
+    Args:
+      segment: Segment of the printer.
+      address: Printer's IP address.
+    """
+    self._advance(segment)
+    segment.active[address] = _Upload(self._clock())
+    self._update_metrics(address)
+
+  def _deactivate(self, segment: _Segment, address: str) -> Optional[_Upload]:
+    """Takes the slot of an upload back.
+
+    Args:
+      segment: Segment of the printer.
+      address: Printer's IP address.
+
+    Returns:
+      The upload, or None if the printer held no slot.
+    """
+    if address not in segment.active:
+      return None
+    self._advance(segment)
+    upload = segment.active.pop(address)
+    self._update_metrics(address)
+    return upload
+
+  def _start_queued(self, segment: _Segment, address: str) -> None:
+    """Starts queued uploads while the segment has free slots.
+
+    Args:
+      segment: Segment with a released slot.
+      address: Address of any printer in the segment.
+    """
+    while (segment.queue
+           and len(segment.active) < self.get_concurrency_limit(address)):
+      queued, start = segment.queue.popleft()
+      self._activate(segment, queued)
+      upload = segment.active[queued]
+      # The upload may be cancelled before the dispatcher runs it.
+      self._dispatcher(lambda queued=queued, start=start, upload=upload: (
+          start() if segment.active.get(queued) is upload else None))
+    self._update_metrics(address)
+
+  def _update_metrics(self, address: str) -> None:
+    """Exports the limit and queue length of a printer's segment.
+
+    Args:
+      address: Printer's IP address.
+    """
+    name = self.get_segment(address)
+    segment = self._segments[name]
+    _CONCURRENCY_LIMIT.labels(name).set(self.get_concurrency_limit(address))
+    _QUEUED_UPLOADS.labels(name).set(len(segment.queue))
+
+
+_scheduler = UploadScheduler()
+
+
+def get_scheduler() -> UploadScheduler:
+  """Returns the upload scheduler shared by all printers."""
+  return _scheduler
+
+
+def set_scheduler(scheduler: UploadScheduler) -> None:
+  """Replaces the upload scheduler shared by all printers.
+
+  Args:
+    scheduler: Configured scheduler. Uploads in progress in the previous
+      scheduler are not moved.
+  """
+  global _scheduler  # pylint:disable=global-statement
+  _scheduler = scheduler
@@ -0,0 +1,121 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Any, Dict, Optional
+
+# Upload speed levels set with M563 S<level>, fastest first.
+# Source: https://github.com/nokemono42/MP-Select-Mini-Web
+SPEED_LEVELS = (4, 3, 2)
+# Firmware default: 39 Kbps. Level 4 is 91 Kbps on Monoprice Select Mini V2.
+DEFAULT_SPEED_LEVEL = 2
+# Weight of the newest outcome in the failure rate of a level. Two failures
+# in a row make a level unreliable, a success after them makes it reliable.
+_FAILURE_RATE_WEIGHT = 0.5
+# Failure rates above this prefer a slower level.
+_MAX_FAILURE_RATE = 0.5
+# Failure rate kept by unreliable levels per successful upload at another
+# level, so that they are tried again after a few uploads.
+_FAILURE_RATE_DECAY = 0.9
+
+
+class UploadSpeedProfile:
+  """Learns the fastest reliable upload speed level of a printer.
+
+  Measurements are taken passively from real uploads, so choosing a level
+  does not cost any calibration transfer. Failures weigh less as uploads
+  succeed, so that a few unrelated Wi-Fi failures do not rule out a faster
+  level for good.
+  """
+
+  def __init__(self, stats: Optional[Dict[str, Any]] = None) -> None:
+    """Constructor.
+
+    Args:
+      stats: Stored measurements, as returned by to_dict().
+    """
+    stats = stats or {}
+    self._unsupported = set(stats.get('unsupported', []))
+    self._levels = {}
+    for level in SPEED_LEVELS:
+      level_stats = stats.get('levels', {}).get(str(level), {})
+      self._levels[level] = {
+          'bytes': int(level_stats.get('bytes', 0)),
+          'secs': float(level_stats.get('secs', 0)),
+          'failure_rate': float(level_stats.get('failure_rate', 0)),
+      }
+
+  def to_dict(self) -> Dict[str, Any]:
+    """Returns measurements in a JSON-serializable format."""
+    return {
+        'unsupported': sorted(self._unsupported),
+        'levels': {str(level): dict(level_stats)
+                   for level, level_stats in self._levels.items()},
+    }
+
+  def record_upload(self, level: int, bytes_sent: int, secs: float,
+                    success: bool) -> None:
+    """Records the outcome of an upload.
+
+    Args:
+      level: Speed level the upload ran at.
+      bytes_sent: Number of bytes transferred.
+      secs: Duration of the transfer.
+      success: True if the upload completed.
+    """
+    if level not in self._levels:
+      return
+    level_stats = self._levels[level]
+    level_stats['failure_rate'] = (
+        _FAILURE_RATE_WEIGHT * (0.0 if success else 1.0)
+        + (1 - _FAILURE_RATE_WEIGHT) * level_stats['failure_rate'])
+    if not success:
+      return
+    if secs > 0:
+      level_stats['bytes'] += bytes_sent
+      level_stats['secs'] += secs
+    for other_level, other_stats in self._levels.items():
+      if other_level != level and not self._is_reliable(other_level):
+        other_stats['failure_rate'] *= _FAILURE_RATE_DECAY
+
+  def mark_unsupported(self, level: int) -> None:
+    """Records that the firmware rejected a speed level.
+
+    Args:
+      level: Rejected speed level.
+    """
+    self._unsupported.add(level)
+
+  def get_throughput(self, level: int) -> Optional[float]:
+    """Returns the measured throughput in bytes per second, if any.
+
+    Args:
+      level: Speed level.
+    """
+    level_stats = self._levels.get(level)
+    if not level_stats or not level_stats['secs']:
+      return None
+    return level_stats['bytes'] / level_stats['secs']
+
+  def get_best_level(self) -> int:
+    """Returns the speed level to use for the next upload.
+
+    Fastest measured reliable level if any. Otherwise, the fastest level that
+    has not been ruled out yet.
+    """
+    candidates = [level for level in SPEED_LEVELS
+                  if level not in self._unsupported
+                  and self._is_reliable(level)]
+    measured = [level for level in candidates
+                if self.get_throughput(level) is not None]
+    if measured:
+      return max(measured, key=self.get_throughput)
+    return candidates[0] if candidates else DEFAULT_SPEED_LEVEL
+
+  def _is_reliable(self, level: int) -> bool:
+    """Returns True unless recent uploads at the level mostly failed.
+
+    Args:
+      level: Speed level.
+    """
+    return self._levels[level]['failure_rate'] <= _MAX_FAILURE_RATE
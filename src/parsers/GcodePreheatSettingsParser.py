@@ -3,7 +3,67 @@ Copyright 2020 Luc Rubio <luc@loociano.com>
 Plugin is licensed under the GNU Lesser General Public License v3.0.
 """
 import re
-from typing import Tuple
+from typing import Optional, Tuple
+
+
+class PreheatScanner:
+  """Finds preheat temperatures in g-code fed in chunks.
+
+  Only the last incomplete line is kept between chunks, and scanning stops
+  once both temperatures are found.
+  """
+
+  def __init__(self) -> None:
+    self._bed_temperature: Optional[int] = None
+    self._hotend_temperature: Optional[int] = None
+    self._incomplete_line = b''
+
+  @property
+  def is_done(self) -> bool:
+    """True once both temperatures are found."""
+    return (self._bed_temperature is not None
+            and self._hotend_temperature is not None)
+
+  def feed(self, data: bytes) -> None:
+    """Scans the complete lines of the g-code written so far.
+
+    Args:
+      data: Next UTF-8 bytes of the g-code.
+    """
+    if self.is_done:
+      return
+    data = self._incomplete_line + data
+    end = data.rfind(b'\n') + 1
+    self._scan(data[:end])
+    self._incomplete_line = b'' if self.is_done else data[end:]
+
+  def get_temperatures(self) -> Tuple[Optional[int], Optional[int]]:
+    """Returns preheat bed and hotend temperature. Both can be None."""
+    self._scan(self._incomplete_line)
+    self._incomplete_line = b''
+    return self._bed_temperature, self._hotend_temperature
+
+  def _scan(self, gcode: bytes) -> None:
+    """Looks for the temperatures not found yet.
+
+    Args:
+      gcode: Complete lines following the ones scanned before.
+    """
+    for line in gcode.decode('utf-8').splitlines():
+      if self.is_done:
+        return
+
+      if self._bed_temperature is None:
+        # M190 = Wait for bed temperature to reach target temperature.
+        bed_match = re.match(r"^.*M190 S(\d+).*$", line)
+        if bed_match is not None:
+          self._bed_temperature = int(bed_match.group(1))
+
+      if self._hotend_temperature is None:
+        # M109 = Set Extruder Temperature and wait.
+        hotend_match = re.match(r"^.*M109 S(\d+).*$", line)
+        if hotend_match is not None:
+          self._hotend_temperature = int(hotend_match.group(1))
 
 
 # TODO: convert Tuple to new class.
@@ -16,22 +76,6 @@ def parse(gcode: bytes) -> Tuple[int, int]:
   Returns:
     Tuple with preheat bed and hotend temperature. Both can be None.
   """
-  bed_temperature, hotend_temperature = None, None
-
-  for line in gcode.decode('utf-8').splitlines():
-    if bed_temperature is not None and hotend_temperature is not None:
-      return bed_temperature, hotend_temperature
-
-    if bed_temperature is None:
-      # M190 = Wait for bed temperature to reach target temperature.
-      bed_match = re.match(r"^.*M190 S(\d+).*$", line)
-      if bed_match is not None:
-        bed_temperature = int(bed_match.group(1))
-
-    if hotend_temperature is None:
-      # M109 = Set Extruder Temperature and wait.
-      hotend_match = re.match(r"^.*M109 S(\d+).*$", line)
-      if hotend_match is not None:
-        hotend_temperature = int(hotend_match.group(1))
-
-  return bed_temperature, hotend_temperature
+  scanner = PreheatScanner()
+  scanner.feed(gcode)
+  return scanner.get_temperatures()
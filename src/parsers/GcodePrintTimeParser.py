@@ -0,0 +1,112 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import List, Optional
+
+# pylint:disable=relative-beyond-top-level
+from ..models.PrintTimeTable import PrintTimeTable
+
+_TOTAL_TIME_MARKER = b';TIME:'
+_ELAPSED_TIME_MARKER = b';TIME_ELAPSED:'
+# Cura writes the total print time in the header.
+_HEADER_BYTES = 4096
+
+
+def _parse_number(gcode: bytes, start: int) -> Optional[float]:
+  """Parses the number after a marker, up to the end of the line."""
+  end = gcode.find(b'\n', start)
+  try:
+    return float(gcode[start:end if end != -1 else len(gcode)])
+  except ValueError:
+    return None
+
+
+class PrintTimeScanner:
+  """Builds a print time table from g-code fed in chunks.
+
+  Only the last incomplete line is kept between chunks, so g-code can be
+  scanned while it is uploaded without keeping it.
+  """
+
+  def __init__(self) -> None:
+    self._offsets: List[int] = []
+    self._elapsed_secs: List[float] = []
+    self._total_secs: Optional[float] = None
+    # Bytes scanned before the incomplete line.
+    self._position = 0
+    self._incomplete_line = b''
+
+  def feed(self, data: bytes) -> None:
+    """Scans the complete lines of the g-code written so far.
+
+    Args:
+      data: Next UTF-8 bytes of the g-code.
+    """
+    data = self._incomplete_line + data
+    end = data.rfind(b'\n') + 1
+    self._total_secs = self._scan(data[:end], self._offsets,
+                                  self._elapsed_secs)
+    self._position += end
+    self._incomplete_line = data[end:]
+
+  def get_table(self) -> Optional[PrintTimeTable]:
+    """Returns the table of the g-code fed so far.
+
+    Returns:
+      Table from file position to estimated elapsed time. None if the g-code
+      has no time markers.
+    """
+    offsets = list(self._offsets)
+    elapsed_secs = list(self._elapsed_secs)
+    total_secs = self._scan(self._incomplete_line, offsets, elapsed_secs)
+    if not offsets:
+      return None
+    if total_secs is None or total_secs < elapsed_secs[-1]:
+      total_secs = elapsed_secs[-1]
+    return PrintTimeTable(offsets, elapsed_secs,
+                          self._position + len(self._incomplete_line),
+                          total_secs)
+
+  def _scan(self, gcode: bytes, offsets: List[int],
+            elapsed_secs: List[float]) -> Optional[float]:
+    """Appends the time markers of complete lines. Scans without decoding.
+
+    Args:
+      gcode: Lines following the ones scanned before.
+      offsets: File positions of the markers so far.
+      elapsed_secs: Elapsed time of the markers so far.
+
+    Returns:
+      Total print time from the header, if found so far.
+    """
+    position = gcode.find(_ELAPSED_TIME_MARKER)
+    while position != -1:
+      value = _parse_number(gcode, position + len(_ELAPSED_TIME_MARKER))
+      if value is not None and (not elapsed_secs or value >= elapsed_secs[-1]):
+        offsets.append(self._position + position)
+        elapsed_secs.append(value)
+      position = gcode.find(_ELAPSED_TIME_MARKER,
+                            position + len(_ELAPSED_TIME_MARKER))
+    if self._total_secs is None and self._position < _HEADER_BYTES:
+      header_position = gcode.find(_TOTAL_TIME_MARKER, 0,
+                                   _HEADER_BYTES - self._position)
+      if header_position != -1:
+        return _parse_number(gcode,
+                             header_position + len(_TOTAL_TIME_MARKER))
+    return self._total_secs
+
+
+def parse(gcode: bytes) -> Optional[PrintTimeTable]:
+  """Builds a print time table from Cura's ;TIME_ELAPSED: markers.
+
+  Args:
+    gcode: UTF-8 byte stream.
+
+  Returns:
+    Table from file position to estimated elapsed time. None if the g-code
+    has no time markers.
+  """
+  scanner = PrintTimeScanner()
+  scanner.feed(gcode)
+  return scanner.get_table()
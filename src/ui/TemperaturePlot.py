@@ -0,0 +1,196 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+from typing import Optional
+
+USE_QT5 = False
+try:
+  # Cura 5.0.0+.
+  from PyQt6.QtCore import pyqtProperty, pyqtSignal
+  from PyQt6.QtGui import QColor
+  from PyQt6.QtQml import qmlRegisterType
+  from PyQt6.QtQuick import QQuickItem, QSGFlatColorMaterial, QSGGeometry, QSGGeometryNode, QSGNode
+  _HAS_CONTENTS = QQuickItem.Flag.ItemHasContents
+  _DRAW_LINE_STRIP = QSGGeometry.DrawingMode.DrawLineStrip
+  _DRAW_LINES = QSGGeometry.DrawingMode.DrawLines
+  _DIRTY_GEOMETRY = QSGNode.DirtyStateBit.DirtyGeometry
+  _DIRTY_MATERIAL = QSGNode.DirtyStateBit.DirtyMaterial
+except ImportError:
+  # Cura 4.9.1 or older.
+  from PyQt5.QtCore import pyqtProperty, pyqtSignal
+  from PyQt5.QtGui import QColor
+  from PyQt5.QtQml import qmlRegisterType
+  from PyQt5.QtQuick import QQuickItem, QSGFlatColorMaterial, QSGGeometry, QSGGeometryNode, QSGNode
+  _HAS_CONTENTS = QQuickItem.ItemHasContents
+  _DRAW_LINE_STRIP = QSGGeometry.DrawLineStrip
+  _DRAW_LINES = QSGGeometry.DrawLines
+  _DIRTY_GEOMETRY = QSGNode.DirtyGeometry
+  _DIRTY_MATERIAL = QSGNode.DirtyMaterial
+  USE_QT5 = True
+
+# pylint:disable=relative-beyond-top-level
+from ..models.TemperatureHistory import TemperatureHistory
+
+QML_MODULE = 'MPSM2'
+
+
+class _LineNode:
+  """Geometry node drawing lines in a flat color.
+
+  Keeps Python references to the geometry and material, which the node does
+  not own.
+  """
+
+  def __init__(self, drawing_mode, line_width: float) -> None:
+    self.geometry = QSGGeometry(QSGGeometry.defaultAttributes_Point2D(), 0)
+    self.geometry.setDrawingMode(drawing_mode)
+    self.geometry.setLineWidth(line_width)
+    self.material = QSGFlatColorMaterial()
+    self.node = QSGGeometryNode()
+    self.node.setGeometry(self.geometry)
+    self.node.setMaterial(self.material)
+
+  def set_color(self, color: QColor) -> None:
+    if self.material.color() != color:
+      self.material.setColor(color)
+      self.node.markDirty(_DIRTY_MATERIAL)
+
+  def set_points(self, points) -> None:
+    """Replaces the vertices.
+
+    Args:
+      points: Sequence of (x, y) in item coordinates.
+    """
+    if self.geometry.vertexCount() != len(points):
+      self.geometry.allocate(len(points))
+    vertices = self.geometry.vertexDataAsPoint2D()
+    for vertex, (x, y) in zip(vertices, points):
+      vertex.set(x, y)
+    self.node.markDirty(_DIRTY_GEOMETRY)
+
+
+class TemperaturePlot(QQuickItem):
+  """Plots a temperature history and its target with the Qt Quick scene
+  graph.
+
+  Vertices are built from the Python-side history, without JavaScript or a
+  software canvas.
+  """
+  historyChanged = pyqtSignal()
+  targetTemperatureChanged = pyqtSignal()
+  maxTemperatureChanged = pyqtSignal()
+  lineColorChanged = pyqtSignal()
+  targetColorChanged = pyqtSignal()
+
+  def __init__(self, parent=None) -> None:
+    super().__init__(parent)
+    self.setFlag(_HAS_CONTENTS, True)
+    self._history: Optional[TemperatureHistory] = None
+    self._target_temperature = 0.0
+    self._max_temperature = 1.0
+    self._line_color = QColor(128, 192, 255)
+    self._target_color = QColor(4, 100, 185)
+    self._line: Optional[_LineNode] = None
+    self._target_line: Optional[_LineNode] = None
+    self.widthChanged.connect(self.update)
+    self.heightChanged.connect(self.update)
+
+  @pyqtProperty(TemperatureHistory, notify=historyChanged)
+  def history(self) -> Optional[TemperatureHistory]:
+    return self._history
+
+  @history.setter
+  def history(self, history: Optional[TemperatureHistory]) -> None:
+    if history is self._history:
+      return
+    if self._history:
+      self._history.rowsInserted.disconnect(self._on_history_changed)
+    self._history = history
+    if history:
+      # Every new sample inserts a row.
+      history.rowsInserted.connect(self._on_history_changed)
+    self.historyChanged.emit()
+    self.update()
+
+  def _on_history_changed(self, *_) -> None:
+    self.update()
+
+  @pyqtProperty(float, notify=targetTemperatureChanged)
+  def targetTemperature(self) -> float:
+    return self._target_temperature
+
+  @targetTemperature.setter
+  def targetTemperature(self, temperature: float) -> None:
+    if temperature != self._target_temperature:
+      self._target_temperature = temperature
+      self.targetTemperatureChanged.emit()
+      self.update()
+
+  @pyqtProperty(float, notify=maxTemperatureChanged)
+  def maxTemperature(self) -> float:
+    return self._max_temperature
+
+  @maxTemperature.setter
+  def maxTemperature(self, temperature: float) -> None:
+    if temperature != self._max_temperature:
+      self._max_temperature = temperature
+      self.maxTemperatureChanged.emit()
+      self.update()
+
+  @pyqtProperty(QColor, notify=lineColorChanged)
+  def lineColor(self) -> QColor:
+    return self._line_color
+
+  @lineColor.setter
+  def lineColor(self, color: QColor) -> None:
+    if color != self._line_color:
+      self._line_color = QColor(color)
+      self.lineColorChanged.emit()
+      self.update()
+
+  @pyqtProperty(QColor, notify=targetColorChanged)
+  def targetColor(self) -> QColor:
+    return self._target_color
+
+  @targetColor.setter
+  def targetColor(self, color: QColor) -> None:
+    if color != self._target_color:
+      self._target_color = QColor(color)
+      self.targetColorChanged.emit()
+      self.update()
+
+  def _to_y(self, temperature: float) -> float:
+    """Maps a temperature to a y coordinate, 0 at the bottom."""
+    ratio = min(max(temperature / max(self._max_temperature, 1), 0), 1)
+    return (1 - ratio) * self.height()
+
+  # pylint:disable=invalid-name
+  def updatePaintNode(self, node: Optional[QSGNode], _) -> QSGNode:
+    """See base class. Called on the render thread while the GUI thread is
+    blocked."""
+    if node is None:
+      node = QSGNode()
+      self._target_line = _LineNode(_DRAW_LINES, 1)
+      self._line = _LineNode(_DRAW_LINE_STRIP, 2)
+      node.appendChildNode(self._target_line.node)
+      node.appendChildNode(self._line.node)
+    width = self.width()
+    samples = self._history.samples if self._history else ()
+    capacity = self._history.capacity if self._history else 0
+    # Newest sample at the right edge, as the history fills up.
+    step = width / max(capacity - 1, 1)
+    offset = width - step * (len(samples) - 1)
+    self._line.set_color(self._line_color)
+    self._line.set_points([(offset + index * step, self._to_y(sample))
+                           for index, sample in enumerate(samples)])
+    self._target_line.set_color(self._target_color)
+    target_y = self._to_y(self._target_temperature)
+    self._target_line.set_points(
+        [(offset, target_y), (width, target_y)] if len(samples) > 1 else [])
+    return node
+
+
+def register_qml_types() -> None:
+  """Makes TemperaturePlot available in QML as 'import MPSM2 1.0'."""
+  qmlRegisterType(TemperaturePlot, QML_MODULE, 1, 0, 'TemperaturePlot')
@@ -0,0 +1,72 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import json
+from typing import Any, Dict, List
+
+from UM.Logger import Logger
+# pylint:disable=import-error
+from cura.CuraApplication import CuraApplication
+
+_PRINTER_PREFERENCES_KEY = 'mpsm2networkprinting/printer_preferences'
+
+
+def _get_all() -> Dict[str, Dict[str, Any]]:
+  """Returns per-printer preferences from Cura user's preferences."""
+  preferences = CuraApplication.getInstance().getPreferences()
+  preferences.addPreference(_PRINTER_PREFERENCES_KEY, '{}')
+  try:
+    stored = json.loads(preferences.getValue(_PRINTER_PREFERENCES_KEY) or '{}')
+  except ValueError:
+    Logger.log('w', 'Could not parse stored printer preferences. Resetting.')
+    return {}
+  return stored if isinstance(stored, dict) else {}
+
+
+def get_value(address: str, key: str, default: Any = None) -> Any:
+  """Returns a stored preference of a printer.
+
+  Args:
+    address: Printer's IP address.
+    key: Preference name.
+    default: Returned if the preference is not stored.
+  """
+  return _get_all().get(address, {}).get(key, default)
+
+
+def set_value(address: str, key: str, value: Any) -> None:
+  """Stores a preference of a printer in Cura user's preferences.
+
+  Args:
+    address: Printer's IP address.
+    key: Preference name.
+    value: JSON-serializable value.
+  """
+  stored = _get_all()
+  stored.setdefault(address, {})[key] = value
+  CuraApplication.getInstance().getPreferences().setValue(
+      _PRINTER_PREFERENCES_KEY, json.dumps(stored, sort_keys=True))
+
+
+def get_addresses_with(key: str, value: Any) -> List[str]:
+  """Returns addresses of printers which have the given preference value.
+
+  Args:
+    key: Preference name.
+    value: Expected value.
+  """
+  return [address for address, printer_preferences in _get_all().items()
+          if printer_preferences.get(key) == value]
+
+
+def remove_printer(address: str) -> None:
+  """Removes all stored preferences of a printer.
+
+  Args:
+    address: Printer's IP address.
+  """
+  stored = _get_all()
+  if stored.pop(address, None) is not None:
+    CuraApplication.getInstance().getPreferences().setValue(
+        _PRINTER_PREFERENCES_KEY, json.dumps(stored, sort_keys=True))
@@ -0,0 +1,130 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Receives a log level ('d', 'i', 'w', 'e') and a formatted message.
+Sink = Callable[[str, str], None]
+
+# At most one message per key and printer is logged in this interval.
+DEFAULT_INTERVAL_SECS = 60
+
+
+def _log_to_cura(level: str, message: str) -> None:
+  """Writes a message to cura.log."""
+  from UM.Logger import Logger  # pylint:disable=import-outside-toplevel
+  Logger.log(level, message)
+
+
+class SampledLogger:
+  """Rate-limits repetitive log messages per printer.
+
+  Meant for messages logged on every poll or request. The first message of a
+  kind is logged, repetitions within the interval are only counted and
+  reported in a summary. Messages are formatted only if they are logged.
+  Thread-safe.
+  """
+
+  def __init__(self, sink: Optional[Sink] = None,
+               interval_secs: float = DEFAULT_INTERVAL_SECS,
+               clock: Callable[[], float] = time.monotonic) -> None:
+    """Constructor.
+
+    Args:
+      sink: Writes a message. Default writes to cura.log.
+      interval_secs: Minimum seconds between messages of the same kind and
+        printer.
+      clock: Monotonic clock in seconds.
+    """
+    self._sink = sink or _log_to_cura
+    self._interval_secs = interval_secs
+    self._clock = clock
+    self._lock = threading.Lock()
+    # (key, address) -> [last logged at, suppressed count].
+    self._entries: Dict[Tuple[str, str], List] = {}
+    self._last_summary_at = clock()
+
+  def log(self, level: str, key: str, address: str, message: str,
+          *args) -> None:
+    """Logs a message unless one of the same kind was logged recently.
+
+    Args:
+      level: Log level: 'd', 'i', 'w' or 'e'.
+      key: Kind of message, e.g. 'request'.
+      address: Printer's IP address.
+      message: Format string, formatted with args only if logged.
+      args: Format arguments.
+    """
+    now = self._clock()
+    summary = None
+    with self._lock:
+      entry = self._entries.get((key, address))
+      if entry is not None and now - entry[0] < self._interval_secs:
+        entry[1] += 1
+        is_logged = False
+      else:
+        suppressed = entry[1] if entry else 0
+        self._entries[(key, address)] = [now, 0]
+        is_logged = True
+      if now - self._last_summary_at >= self._interval_secs:
+        summary = self._take_summary(now)
+    if is_logged:
+      formatted = message % args if args else message
+      if suppressed:
+        formatted += f' ({suppressed} similar messages suppressed.)'
+      self._sink(level, formatted)
+    if summary:
+      self._sink('d', summary)
+
+  def _take_summary(self, now: float) -> Optional[str]:
+    """Returns counts of suppressed messages not reported yet, and resets
+    them. Must be called with the lock held."""
+    self._last_summary_at = now
+    counts = []
+    for (key, address), entry in sorted(self._entries.items()):
+      if entry[1] and now - entry[0] >= self._interval_secs:
+        counts.append(f'{key}@{address}: {entry[1]}')
+        entry[1] = 0
+    if not counts:
+      return None
+    return (f'Suppressed log messages in the last '
+            f'{self._interval_secs:g}s: {", ".join(counts)}.')
+
+  def forget(self, address: str) -> None:
+    """Drops the state of a printer.
+
+    Args:
+      address: Printer's IP address.
+    """
+    with self._lock:
+      for entry_key in [entry_key for entry_key in self._entries
+                        if entry_key[1] == address]:
+        del self._entries[entry_key]
+
+
+_sampled_logger = SampledLogger()
+
+
+def log(level: str, key: str, address: str, message: str, *args) -> None:
+  """Logs a repetitive message through the shared SampledLogger.
+
+  Args:
+    level: Log level: 'd', 'i', 'w' or 'e'.
+    key: Kind of message, e.g. 'request'.
+    address: Printer's IP address.
+    message: Format string, formatted with args only if logged.
+    args: Format arguments.
+  """
+  _sampled_logger.log(level, key, address, message, *args)
+
+
+def forget(address: str) -> None:
+  """Drops the state of a printer in the shared SampledLogger.
+
+  Args:
+    address: Printer's IP address.
+  """
+  _sampled_logger.forget(address)
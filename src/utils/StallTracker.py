@@ -0,0 +1,50 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import time
+from typing import Callable, Optional
+
+
+class StallTracker:
+  """Measures how long a thread's event loop was blocked.
+
+  tick() is called from a periodic timer on the measured thread. Any time
+  between ticks beyond the timer interval is a stall.
+  """
+
+  def __init__(self, interval_secs: float,
+               clock: Callable[[], float] = time.monotonic) -> None:
+    """Constructor.
+
+    Args:
+      interval_secs: Interval of the timer calling tick().
+      clock: Monotonic clock in seconds.
+    """
+    self._interval_secs = interval_secs
+    self._clock = clock
+    self._last_tick_at: Optional[float] = None
+    self.longest_stall_secs = 0.0
+
+  def start(self) -> None:
+    """Starts a new measurement."""
+    self._last_tick_at = self._clock()
+    self.longest_stall_secs = 0.0
+
+  def tick(self) -> None:
+    """Called by the periodic timer."""
+    now = self._clock()
+    if self._last_tick_at is not None:
+      stall_secs = now - self._last_tick_at - self._interval_secs
+      self.longest_stall_secs = max(self.longest_stall_secs, stall_secs)
+    self._last_tick_at = now
+
+  def stop(self) -> float:
+    """Ends the measurement.
+
+    Returns:
+      Longest stall in seconds.
+    """
+    self.tick()
+    self._last_tick_at = None
+    return self.longest_stall_secs
@@ -0,0 +1,109 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import asyncio
+from typing import List, Optional, Set
+
+
+class FakePrinterServer:
+  """Local HTTP server that answers like a Monoprice Select Mini V2."""
+
+  def __init__(self, status: str = 'T20/0P21/0/0I',
+               delay_secs: float = 0, record: bool = True) -> None:
+    self.status = status
+    self.delay_secs = delay_secs
+    # Long runs only count requests, so the fake itself does not grow.
+    self.record = record
+    self.paths: List[str] = []
+    self.uploads: List[bytes] = []
+    self.request_count = 0
+    self.upload_count = 0
+    self.aborted_uploads = 0
+    self.port: Optional[int] = None
+    self._server = None
+    self._handlers: Set[asyncio.Task] = set()
+    self._writers: Set[asyncio.StreamWriter] = set()
+
+  @property
+  def address(self) -> str:
+    return f'127.0.0.1:{self.port}'
+
+  async def start(self, port: int = 0) -> None:
+    self._server = await asyncio.start_server(self._accept, '127.0.0.1', port)
+    self.port = self._server.sockets[0].getsockname()[1]
+
+  async def stop(self) -> None:
+    self._server.close()
+    # Pending reads fail once the connections are aborted.
+    for writer in self._writers:
+      writer.transport.abort()
+    await asyncio.gather(*self._handlers, return_exceptions=True)
+    await self._server.wait_closed()
+
+  def _accept(self, reader: asyncio.StreamReader,
+              writer: asyncio.StreamWriter) -> None:
+    # Handlers are tracked here, not by asyncio, so that stop() can wait for
+    # them and those cancelled when the loop closes are not reported.
+    handler = asyncio.get_running_loop().create_task(
+        self._handle(reader, writer))
+    self._handlers.add(handler)
+    handler.add_done_callback(self._handlers.discard)
+    self._writers.add(writer)
+
+  async def _handle(self, reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter) -> None:
+    try:
+      await self._respond(reader, writer)
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      self._writers.discard(writer)
+      writer.close()
+      try:
+        await writer.wait_closed()
+      except ConnectionError:
+        pass
+
+  async def _respond(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+    head = await reader.readuntil(b'\r\n\r\n')
+    request_line, *header_lines = head.decode('utf-8').split('\r\n')
+    method, path, _ = request_line.split(' ')
+    self.request_count += 1
+    if self.record:
+      self.paths.append(path)
+    headers = {}
+    for line in header_lines:
+      name, _, value = line.partition(':')
+      headers[name.strip().lower()] = value.strip()
+    try:
+      upload = None
+      if method == 'POST' and headers.get('transfer-encoding') == 'chunked':
+        upload = await self._read_chunked(reader)
+      elif method == 'POST':
+        upload = await reader.readexactly(int(headers['content-length']))
+      if upload is not None:
+        self.upload_count += 1
+        if self.record:
+          self.uploads.append(upload)
+    except (asyncio.IncompleteReadError, ConnectionError):
+      self.aborted_uploads += 1
+      return
+    if self.delay_secs:
+      await asyncio.sleep(self.delay_secs)
+    body = self.status if path == '/inquiry' else 'OK'
+    writer.write(f'HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\n'
+                 f'Connection: close\r\n\r\n{body}'.encode('utf-8'))
+    await writer.drain()
+
+  @staticmethod
+  async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    body = bytearray()
+    while True:
+      size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+      if not size:
+        await reader.readuntil(b'\r\n')
+        return bytes(body)
+      body += await reader.readexactly(size)
+      await reader.readexactly(2)
@@ -0,0 +1,111 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import io
+import os
+import tempfile
+import unittest
+
+from src.headless import FleetCli
+from src.headless.AsyncApiClient import ApiError, AsyncApiClient
+from src.models.MPSM2PrinterStatusModel import MPSM2PrinterStatusModel
+from test.headless.FakePrinterServer import FakePrinterServer
+
+
+class AsyncApiClientTest(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.printer = FakePrinterServer()
+    await self.printer.start()
+    self.client = AsyncApiClient(self.printer.address, timeout_secs=1)
+
+  async def asyncTearDown(self):
+    await self.printer.stop()
+
+  async def test_get_printer_status(self):
+    model = await self.client.get_printer_status()
+    self.assertEqual(MPSM2PrinterStatusModel.State.IDLE, model.state)
+    self.assertEqual(20, model.hotend_temperature)
+    self.assertEqual(21, model.bed_temperature)
+
+  async def test_invalid_status(self):
+    self.printer.status = 'garbage'
+    with self.assertRaises(ApiError):
+      await self.client.get_printer_status()
+
+  async def test_commands(self):
+    await self.client.start_print()
+    await self.client.pause_print()
+    await self.client.resume_print()
+    await self.client.cancel_print()
+    await self.client.set_target_hotend_temperature(200)
+    await self.client.set_target_bed_temperature(60)
+    self.assertEqual(['/set?cmd={P:M}', '/set?cmd={P:P}', '/set?cmd={P:R}',
+                      '/set?cmd={P:X}', '/set?cmd={C:T0200}',
+                      '/set?cmd={C:P060}'], self.printer.paths)
+
+  async def test_temperature_out_of_range(self):
+    with self.assertRaises(ValueError):
+      await self.client.set_target_hotend_temperature(261)
+    with self.assertRaises(ValueError):
+      await self.client.set_target_bed_temperature(86)
+
+  async def test_upload_print(self):
+    payload = b'G28\n' * 100000
+    progress = []
+    response = await self.client.upload_print(
+        'model.gcode', payload, lambda sent, total: progress.append(sent))
+    self.assertEqual('OK', response)
+    self.assertIn(payload, self.printer.uploads[0])
+    self.assertIn(b'filename="model.gcode"', self.printer.uploads[0])
+    self.assertEqual(len(payload), progress[-1])
+
+  async def test_timeout(self):
+    self.printer.delay_secs = 2
+    client = AsyncApiClient(self.printer.address, timeout_secs=0.1)
+    with self.assertRaises(ApiError):
+      await client.get_printer_status()
+
+  async def test_connection_refused(self):
+    await self.printer.stop()
+    with self.assertRaises(ApiError):
+      await self.client.get_printer_status()
+    await self.printer.start()  # For tearDown.
+
+
+class FleetCliTest(unittest.IsolatedAsyncioTestCase):
+  async def test_run_on_fleet(self):
+    printers = [FakePrinterServer() for _ in range(3)]
+    for printer in printers:
+      await printer.start()
+    await printers[2].stop()
+    results = await FleetCli.run_on_fleet(
+        [printer.address for printer in printers],
+        lambda client: client.start_print(), concurrency=2, timeout_secs=1)
+    self.assertEqual([printer.address for printer in printers],
+                     [address for address, _, _, _ in results])
+    self.assertEqual([True, True, False],
+                     [success for _, success, _, _ in results])
+    for printer in printers[:2]:
+      await printer.stop()
+
+
+class FleetCliMainTest(unittest.TestCase):
+  def test_main_without_addresses(self):
+    output = io.StringIO()
+    self.assertEqual(2, FleetCli.main(['status'], output))
+
+  def test_main_upload_to_unreachable_printer(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'model.gcode')
+      with open(path, 'wb') as gcode_file:
+        gcode_file.write(b'G28\n')
+      output = io.StringIO()
+      self.assertEqual(1, FleetCli.main(
+          ['--timeout', '0.5', 'upload', path, '127.0.0.1:1'], output))
+    self.assertIn('127.0.0.1:1\tFAIL', output.getvalue())
+    self.assertIn('0/1 printers succeeded', output.getvalue())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,96 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+import urllib.error
+import urllib.request
+
+from src.metrics import Metrics
+from src.metrics.MetricsServer import MetricsServer
+
+
+class MetricsTest(unittest.TestCase):
+  def setUp(self):
+    self.registry = Metrics.Registry()
+
+  def test_counter(self):
+    counter = self.registry.register(
+        Metrics.Counter('requests_total', 'Requests.', ['printer']))
+    counter.labels('1.2.3.4').inc()
+    counter.labels('1.2.3.4').inc(2)
+    self.assertEqual(
+        '# HELP requests_total Requests.\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{printer="1.2.3.4"} 3\n', self.registry.render())
+
+  def test_labels_returns_same_child(self):
+    counter = Metrics.Counter('requests_total', 'Requests.', ['printer'])
+    self.assertIs(counter.labels('a'), counter.labels('a'))
+
+  def test_labels_wrong_count_raises(self):
+    counter = Metrics.Counter('requests_total', 'Requests.', ['printer'])
+    with self.assertRaises(ValueError):
+      counter.labels('a', 'b')
+
+  def test_gauge_function(self):
+    gauge = self.registry.register(
+        Metrics.Gauge('queue_depth', 'Queue depth.', ['printer']))
+    depth = [1]
+    gauge.labels('a').set_function(lambda: depth[0])
+    depth[0] = 5
+    self.assertIn('queue_depth{printer="a"} 5\n', self.registry.render())
+    gauge.remove('a')
+    self.assertNotIn('queue_depth{', self.registry.render())
+
+  def test_histogram_cumulative_buckets(self):
+    histogram = self.registry.register(
+        Metrics.Histogram('rtt_seconds', 'RTT.', buckets=(0.1, 1)))
+    child = histogram.labels()
+    for value in (0.05, 0.1, 0.5, 3):
+      child.observe(value)
+    rendered = self.registry.render()
+    self.assertIn('rtt_seconds_bucket{le="0.1"} 2\n', rendered)
+    self.assertIn('rtt_seconds_bucket{le="1"} 3\n', rendered)
+    self.assertIn('rtt_seconds_bucket{le="+Inf"} 4\n', rendered)
+    self.assertIn('rtt_seconds_sum 3.65\n', rendered)
+    self.assertIn('rtt_seconds_count 4\n', rendered)
+
+  def test_escapes_label_values(self):
+    counter = self.registry.register(
+        Metrics.Counter('errors_total', 'Errors.', ['reason']))
+    counter.labels('say "hi"\n').inc()
+    self.assertIn('errors_total{reason="say \\"hi\\"\\n"} 1\n',
+                  self.registry.render())
+
+  def test_register_same_name_returns_existing(self):
+    first = self.registry.register(Metrics.Counter('a_total', 'A.'))
+    second = self.registry.register(Metrics.Counter('a_total', 'A.'))
+    self.assertIs(first, second)
+    with self.assertRaises(ValueError):
+      self.registry.register(Metrics.Gauge('a_total', 'A.'))
+
+
+class MetricsServerTest(unittest.TestCase):
+  def setUp(self):
+    self.registry = Metrics.Registry()
+    self.registry.register(Metrics.Counter('a_total', 'A.')).labels().inc()
+    self.server = MetricsServer(0, self.registry)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_serves_metrics(self):
+    with urllib.request.urlopen(
+        f'http://127.0.0.1:{self.server.port}/metrics') as response:
+      self.assertEqual(200, response.status)
+      self.assertIn('a_total 1', response.read().decode('utf-8'))
+
+  def test_unknown_path(self):
+    with self.assertRaises(urllib.error.HTTPError):
+      urllib.request.urlopen(f'http://127.0.0.1:{self.server.port}/')
+
+
+if __name__ == '__main__':
+  unittest.main()
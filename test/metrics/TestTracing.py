@@ -0,0 +1,96 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from src.metrics.Tracing import NULL_SPAN, Trace, begin_span
+
+
+class TracingTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 10.0
+    self.trace = Trace('model.gcode', track_memory=False,
+                       clock=lambda: self.now)
+
+  def test_span_records_duration_and_bytes(self):
+    span = self.trace.begin('encode', printer='1.2.3.4')
+    self.now += 0.5
+    span.end(bytes_processed=1024)
+    event = self.trace.to_chrome_trace()['traceEvents'][1]
+    self.assertEqual('encode', event['name'])
+    self.assertEqual('X', event['ph'])
+    self.assertEqual(0, event['ts'])
+    self.assertEqual(500000, event['dur'])
+    self.assertEqual({'printer': '1.2.3.4', 'bytes': 1024}, event['args'])
+
+  def test_end_twice_records_once(self):
+    span = self.trace.begin('upload')
+    span.end()
+    span.end()
+    self.assertEqual(1, len(self.trace.spans))
+
+  def test_context_manager_records_error(self):
+    with self.assertRaises(ValueError):
+      with self.trace.begin('parse'):
+        raise ValueError()
+    self.assertEqual({'error': 'ValueError'}, self.trace.spans[0].args)
+
+  def test_events_sorted_by_start(self):
+    outer = self.trace.begin('write')
+    self.now += 1
+    with self.trace.begin('inner'):
+      self.now += 1
+    outer.end()
+    names = [event['name']
+             for event in self.trace.to_chrome_trace()['traceEvents'][1:]]
+    self.assertEqual(['write', 'inner'], names)
+
+  def test_tracks_memory(self):
+    was_tracing = tracemalloc.is_tracing()
+    trace = Trace('model.gcode')
+    with trace.begin('allocate'):
+      data = bytearray(1000000)
+    del data
+    trace.finish()
+    self.assertGreaterEqual(trace.spans[0].args['peak_memory_bytes'], 1000000)
+    self.assertEqual(was_tracing, tracemalloc.is_tracing())
+
+  def test_overlapping_traces_keep_tracking_memory(self):
+    was_tracing = tracemalloc.is_tracing()
+    first = Trace('first.gcode')
+    second = Trace('second.gcode')
+    first.finish()
+    with second.begin('allocate'):
+      data = bytearray(1000000)
+    del data
+    self.assertGreaterEqual(second.spans[0].args['peak_memory_bytes'], 1000000)
+    second.finish()
+    second.finish()
+    self.assertEqual(was_tracing, tracemalloc.is_tracing())
+
+  def test_write(self):
+    with self.trace.begin('encode'):
+      pass
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'traces', 'trace.json')
+      self.trace.write(path)
+      with open(path, encoding='utf-8') as trace_file:
+        self.assertEqual(self.trace.to_chrome_trace(), json.load(trace_file))
+
+  def test_begin_span_without_trace(self):
+    span = begin_span(None, 'encode')
+    self.assertIs(NULL_SPAN, span)
+    span.end(bytes_processed=10)
+
+  def test_begin_span_with_trace(self):
+    begin_span(self.trace, 'encode').end()
+    self.assertEqual('encode', self.trace.spans[0].name)
+
+
+if __name__ == '__main__':
+  unittest.main()
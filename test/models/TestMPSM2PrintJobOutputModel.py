@@ -0,0 +1,42 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.models.PrintTimeTable import PrintTimeTable
+
+try:
+  from src.models.MPSM2PrintJobOutputModel import MPSM2PrintJobOutputModel
+  _HAS_CURA = True
+except ImportError:  # Needs Cura and PyQt.
+  _HAS_CURA = False
+
+
+@unittest.skipUnless(_HAS_CURA, 'Cura is not available.')
+class MPSM2PrintJobOutputModelTest(unittest.TestCase):
+  def setUp(self):
+    self.model = MPSM2PrintJobOutputModel(output_controller=None)
+    self.table = PrintTimeTable([500], [90], total_bytes=1000, total_secs=100)
+
+  def test_tableBeforePrintStarts_isKept(self):
+    self.model.set_print_time_table(self.table)
+    self.model.update_progress(0)  # Idle while heating.
+    self.model.update_progress(1)
+    self.model.update_progress(2)
+    self.assertNotEqual('', self.model.estimated_time_left)
+
+  def test_jobEnds_forgetsTable(self):
+    self.model.set_print_time_table(self.table)
+    self.model.update_progress(1)
+    self.model.update_progress(100)
+    self.model.update_progress(0)  # Idle again.
+    # Next job, e.g. started from the printer, has no estimates: time left is
+    # only known after a couple of percent points.
+    self.model.update_progress(1)
+    self.model.update_progress(2)
+    self.assertEqual('', self.model.estimated_time_left)
+
+
+if __name__ == '__main__':
+  unittest.main()
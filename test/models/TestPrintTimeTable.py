@@ -0,0 +1,43 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.models.PrintTimeTable import PrintTimeTable
+
+
+class PrintTimeTableTest(unittest.TestCase):
+  def setUp(self):
+    # First half of the file takes 90 of 100 seconds.
+    self.table = PrintTimeTable([500], [90], total_bytes=1000, total_secs=100)
+
+  def test_elapsed_at_markers(self):
+    self.assertEqual(0, self.table.get_elapsed_secs(0))
+    self.assertEqual(90, self.table.get_elapsed_secs(50))
+    self.assertEqual(100, self.table.get_elapsed_secs(100))
+
+  def test_elapsed_interpolates(self):
+    self.assertAlmostEqual(45, self.table.get_elapsed_secs(25))
+    self.assertAlmostEqual(95, self.table.get_elapsed_secs(75))
+
+  def test_remaining(self):
+    self.assertAlmostEqual(55, self.table.get_remaining_secs(25))
+    self.assertEqual(0, self.table.get_remaining_secs(100))
+
+  def test_clamps_progress(self):
+    self.assertEqual(0, self.table.get_elapsed_secs(-5))
+    self.assertEqual(100, self.table.get_elapsed_secs(150))
+
+  def test_len(self):
+    self.assertEqual(1, len(self.table))
+
+  def test_invalid(self):
+    with self.assertRaises(ValueError):
+      PrintTimeTable([1, 2], [1], total_bytes=10, total_secs=10)
+    with self.assertRaises(ValueError):
+      PrintTimeTable([], [], total_bytes=0, total_secs=10)
+
+
+if __name__ == '__main__':
+  unittest.main()
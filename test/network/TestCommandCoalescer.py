@@ -0,0 +1,68 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.CommandCoalescer import CommandCoalescer
+
+
+class CommandCoalescerTest(unittest.TestCase):
+  def setUp(self):
+    self.coalescer = CommandCoalescer()
+    self.sent = []
+    self.done_callbacks = []
+
+  def _command(self, value):
+    def command(done):
+      self.sent.append(value)
+      self.done_callbacks.append(done)
+    return command
+
+  def test_submit_sendsImmediatelyWhenIdle(self):
+    self.coalescer.submit('hotend', self._command(200))
+    self.assertEqual([200], self.sent)
+    self.assertTrue(self.coalescer.is_in_flight)
+
+  def test_submit_onlyOneInFlight(self):
+    self.coalescer.submit('hotend', self._command(200))
+    self.coalescer.submit('bed', self._command(60))
+    self.assertEqual([200], self.sent)
+    self.done_callbacks[0]()
+    self.assertEqual([200, 60], self.sent)
+
+  def test_submit_collapsesPendingToLatestValue(self):
+    self.coalescer.submit('hotend', self._command(200))
+    self.coalescer.submit('hotend', self._command(205))
+    self.coalescer.submit('hotend', self._command(210))
+    self.assertEqual(1, self.coalescer.pending_count)
+    self.done_callbacks[0]()
+    self.assertEqual([200, 210], self.sent)
+
+  def test_collapsedCommand_keepsItsTurn(self):
+    self.coalescer.submit('hotend', self._command(200))
+    self.coalescer.submit('bed', self._command(60))
+    self.coalescer.submit('hotend', self._command(210))
+    self.coalescer.submit('bed', self._command(65))
+    self.done_callbacks[0]()
+    self.assertEqual([200, 65], self.sent)
+    self.done_callbacks[1]()
+    self.assertEqual([200, 65, 210], self.sent)
+
+  def test_done_isIdempotent(self):
+    self.coalescer.submit('hotend', self._command(200))
+    self.coalescer.submit('bed', self._command(60))
+    self.coalescer.submit('hotend', self._command(210))
+    self.done_callbacks[0]()
+    self.done_callbacks[0]()
+    self.assertEqual([200, 60], self.sent)
+    self.assertTrue(self.coalescer.is_in_flight)
+
+  def test_synchronousDone_sendsNext(self):
+    self.coalescer.submit('hotend', lambda done: done())
+    self.coalescer.submit('bed', self._command(60))
+    self.assertEqual([60], self.sent)
+
+
+if __name__ == '__main__':
+  unittest.main()
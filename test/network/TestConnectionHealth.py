@@ -0,0 +1,80 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.ConnectionHealth import ConnectionHealth, State
+
+
+class ConnectionHealthTest(unittest.TestCase):
+  def setUp(self):
+    self.health = ConnectionHealth(failure_threshold=3, recovery_threshold=2)
+
+  def _go_offline(self):
+    for _ in range(3):
+      self.health.on_failure()
+
+  def test_starts_online(self):
+    self.assertEqual(State.ONLINE, self.health.state)
+
+  def test_single_failure_degrades(self):
+    self.assertFalse(self.health.on_failure())
+    self.assertEqual(State.DEGRADED, self.health.state)
+    self.assertFalse(self.health.on_success())
+    self.assertEqual(State.ONLINE, self.health.state)
+
+  def test_goes_offline_after_threshold(self):
+    self.assertFalse(self.health.on_failure())
+    self.assertFalse(self.health.on_failure())
+    self.assertTrue(self.health.on_failure())
+    self.assertEqual(State.OFFLINE, self.health.state)
+
+  def test_offline_reportedOnce(self):
+    self._go_offline()
+    self.assertFalse(self.health.on_failure())
+    self.assertEqual(State.OFFLINE, self.health.state)
+
+  def test_success_resets_failures(self):
+    self.health.on_failure()
+    self.health.on_failure()
+    self.health.on_success()
+    self.health.on_failure()
+    self.health.on_failure()
+    self.assertEqual(State.DEGRADED, self.health.state)
+
+  def test_recovers_after_threshold(self):
+    self._go_offline()
+    self.assertFalse(self.health.on_success())
+    self.assertEqual(State.OFFLINE, self.health.state)
+    self.assertTrue(self.health.on_success())
+    self.assertEqual(State.ONLINE, self.health.state)
+
+  def test_online_successes_reportNoChange(self):
+    for _ in range(5):
+      self.assertFalse(self.health.on_success())
+    self.assertEqual(State.ONLINE, self.health.state)
+
+  def test_failure_interrupts_recovery(self):
+    self._go_offline()
+    self.health.on_success()
+    self.assertFalse(self.health.on_failure())
+    self.assertEqual(State.OFFLINE, self.health.state)
+    self.assertFalse(self.health.on_success())
+    self.assertTrue(self.health.on_success())
+
+  def test_thresholds_of_one(self):
+    health = ConnectionHealth(failure_threshold=1, recovery_threshold=1)
+    self.assertTrue(health.on_failure())
+    self.assertTrue(health.on_success())
+
+  def test_busy_network_relaxes_threshold(self):
+    for _ in range(8):
+      self.assertFalse(self.health.on_failure(is_network_busy=True))
+      self.assertEqual(State.DEGRADED, self.health.state)
+    self.assertTrue(self.health.on_failure(is_network_busy=True))
+    self.assertEqual(State.OFFLINE, self.health.state)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,95 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+from unittest import mock
+
+from src.metrics import Metrics
+from src.network import RequestArbiter
+from src.network import UploadScheduler
+from src.network.ConnectionHealth import ConnectionHealth
+
+try:
+  from src.network import DeviceManager
+  _HAS_CURA = True
+except ImportError:  # Needs Cura and PyQt.
+  _HAS_CURA = False
+
+_ACTIVE_ADDRESS = '10.0.0.1'
+_OTHER_ADDRESS = '10.0.0.2'
+_RESPONSE = 'T0:20 /0 B:20 /0 PRINTING 0 0 0 0 0 0'
+
+
+@unittest.skipUnless(_HAS_CURA, 'Cura is not available.')
+class DeviceManagerTest(unittest.TestCase):
+  def setUp(self):
+    application = self._patch('CuraApplication').getInstance.return_value
+    application.getPreferences.return_value.getValue.return_value = ''
+    application.getGlobalContainerStack.return_value.getMetaDataEntry \
+      .return_value = f'manual:{_ACTIVE_ADDRESS}'
+    self._patch('ContainerRegistry')
+    # pylint:disable=protected-access
+    self.addCleanup(RequestArbiter.set_dispatcher, RequestArbiter._dispatcher)
+    self.addCleanup(UploadScheduler.set_scheduler,
+                    UploadScheduler.get_scheduler())
+    self.manager = DeviceManager.DeviceManager()
+    self.notify = mock.patch.object(
+        self.manager, '_notify_discovered_devices_changed').start()
+    self.addCleanup(mock.patch.stopall)
+    self.active = self._add_device(_ACTIVE_ADDRESS, is_connected=True)
+    self.other = self._add_device(_OTHER_ADDRESS, is_connected=False)
+
+  def _patch(self, name):
+    patcher = mock.patch.object(DeviceManager, name)
+    self.addCleanup(patcher.stop)
+    return patcher.start()
+
+  def _add_device(self, address, is_connected):
+    device = mock.Mock()
+    device.key = f'manual:{address}'
+    device.isConnected.return_value = is_connected
+    device.is_uploading.return_value = False
+    # pylint:disable=protected-access
+    self.manager._devices_by_address[address] = device
+    self.manager._discovered_devices[device.key] = device
+    self.manager._connection_health[address] = ConnectionHealth(
+        failure_threshold=2, recovery_threshold=2)
+    return device
+
+  def _beat(self, address, response=_RESPONSE):
+    self.manager._on_printer_heartbeat(  # pylint:disable=protected-access
+        address, response)
+
+  def test_onlinePrinters_doNotNotify(self):
+    for _ in range(5):
+      self._beat(_ACTIVE_ADDRESS)
+      self._beat(_OTHER_ADDRESS)
+    self.notify.assert_not_called()
+    self.assertEqual(5, self.other.update_printer_status.call_count)
+    self.other.connect.assert_not_called()
+
+  def test_printerBackOnline_notifiesOnce(self):
+    self._beat(_OTHER_ADDRESS, 'timeout')
+    self._beat(_OTHER_ADDRESS, 'timeout')
+    for _ in range(4):
+      self._beat(_OTHER_ADDRESS)
+    self.notify.assert_called_once()
+    self.other.connect.assert_not_called()  # Not the active machine.
+
+  def test_reconnects_countsOnlyComingBackOnline(self):
+    for _ in range(3):
+      self._beat(_OTHER_ADDRESS)
+    self._beat(_ACTIVE_ADDRESS, 'timeout')
+    self._beat(_ACTIVE_ADDRESS, 'timeout')
+    for _ in range(3):
+      self._beat(_ACTIVE_ADDRESS)
+    metrics = Metrics.REGISTRY.render()
+    self.assertNotIn(f'mpsm2_reconnects_total{{printer="{_OTHER_ADDRESS}"}}',
+                     metrics)
+    self.assertIn(f'mpsm2_reconnects_total{{printer="{_ACTIVE_ADDRESS}"}} 1',
+                  metrics)
+
+
+if __name__ == '__main__':
+  unittest.main()
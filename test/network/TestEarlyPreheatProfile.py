@@ -0,0 +1,52 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.EarlyPreheatProfile import EarlyPreheatProfile
+
+
+class EarlyPreheatProfileTest(unittest.TestCase):
+  def test_noMeasurements_isTolerated(self):
+    self.assertTrue(EarlyPreheatProfile().is_tolerated)
+
+  def test_rejected_isNotTolerated(self):
+    profile = EarlyPreheatProfile()
+    profile.mark_rejected()
+    self.assertFalse(profile.is_tolerated)
+
+  def test_consecutiveFailures_isNotTolerated(self):
+    profile = EarlyPreheatProfile()
+    profile.record_upload(success=False)
+    self.assertTrue(profile.is_tolerated)
+    profile.record_upload(success=False)
+    self.assertFalse(profile.is_tolerated)
+
+  def test_success_resetsFailures(self):
+    profile = EarlyPreheatProfile()
+    profile.record_upload(success=False)
+    profile.record_upload(success=True)
+    profile.record_upload(success=False)
+    self.assertTrue(profile.is_tolerated)
+
+  def test_success_accumulatesTimeSaved(self):
+    profile = EarlyPreheatProfile()
+    profile.record_upload(success=True, secs_saved=120)
+    profile.record_upload(success=True, secs_saved=60.5)
+    profile.record_upload(success=True, secs_saved=-1)
+    self.assertEqual(3, profile.jobs)
+    self.assertEqual(180.5, profile.secs_saved)
+
+  def test_toDict_roundTrips(self):
+    profile = EarlyPreheatProfile()
+    profile.record_upload(success=True, secs_saved=30)
+    profile.record_upload(success=False)
+    profile.mark_rejected()
+    restored = EarlyPreheatProfile(profile.to_dict())
+    self.assertEqual(profile.to_dict(), restored.to_dict())
+    self.assertFalse(restored.is_tolerated)
+
+
+if __name__ == '__main__':
+  unittest.main()
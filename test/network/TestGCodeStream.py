@@ -0,0 +1,85 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import hashlib
+import threading
+import unittest
+
+from src.network.GCodeStream import GCodeStream, StreamCancelledError
+
+
+class GCodeStreamTest(unittest.TestCase):
+  def test_reader_gets_chunks_in_order(self):
+    stream = GCodeStream()
+    stream.write(';FLAVOR:Marlin\n')
+    stream.write('G28\n')
+    stream.finish()
+    self.assertEqual([b';FLAVOR:Marlin\n', b'G28\n'],
+                     list(stream.read_chunks()))
+    self.assertEqual(19, stream.bytes_written)
+
+  def test_measures_gcode_while_written(self):
+    gcode = ';TIME:60\nM190 S60\nM109 S200\nG1 X1\n;TIME_ELAPSED:30\n'
+    stream = GCodeStream()
+    for start in range(0, len(gcode), 5):
+      stream.write(gcode[start:start + 5])
+    stream.finish()
+    self.assertEqual(hashlib.sha256(gcode.encode('utf-8')).hexdigest(),
+                     stream.content_hash)
+    self.assertEqual((60, 200), stream.preheat_temperatures)
+    self.assertEqual(60, stream.print_time_table.total_secs)
+    self.assertEqual(len(gcode), stream.print_time_table.total_bytes)
+
+  def test_full_buffer_blocks_writer_until_drained(self):
+    stream = GCodeStream(max_buffered_bytes=4)
+    stream.write('abcd')
+    second_written = threading.Event()
+
+    def write_second():
+      stream.write('efgh')
+      second_written.set()
+
+    writer = threading.Thread(target=write_second)
+    writer.start()
+    self.assertFalse(second_written.wait(0.1))
+    chunks = stream.read_chunks()
+    self.assertEqual(b'abcd', next(chunks))
+    self.assertTrue(second_written.wait(1))
+    writer.join()
+    stream.finish()
+    self.assertEqual([b'efgh'], list(chunks))
+
+  def test_write_bigger_than_buffer_when_empty(self):
+    stream = GCodeStream(max_buffered_bytes=2)
+    stream.write('G1 X1\n')
+    stream.finish()
+    self.assertEqual([b'G1 X1\n'], list(stream.read_chunks()))
+
+  def test_cancel_unblocks_writer_and_stops_reader(self):
+    stream = GCodeStream(max_buffered_bytes=1)
+    stream.write('a')
+    writer = threading.Thread(target=stream.write, args=('b',))
+    writer.start()
+    stream.cancel()
+    writer.join(1)
+    self.assertFalse(writer.is_alive())
+    stream.write('discarded')
+    self.assertEqual(1, stream.bytes_written)
+    with self.assertRaises(StreamCancelledError):
+      list(stream.read_chunks())
+
+  def test_detach_reader_keeps_writing_without_blocking(self):
+    stream = GCodeStream(max_buffered_bytes=1)
+    stream.write('a')
+    stream.detach_reader()
+    stream.write('bc')
+    stream.finish()
+    self.assertEqual([], list(stream.read_chunks()))
+    self.assertEqual(3, stream.bytes_written)
+    self.assertEqual(hashlib.sha256(b'abc').hexdigest(), stream.content_hash)
+    self.assertFalse(stream.is_cancelled)
+
+
+if __name__ == '__main__':
+  unittest.main()
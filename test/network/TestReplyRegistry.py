@@ -0,0 +1,98 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import gc
+import sys
+import unittest
+
+from src.network.ReplyRegistry import ReplyRegistry
+
+_SOAK_REQUESTS = 1_000_000
+# Allocated memory blocks tolerated to grow over the soak, after warm-up.
+_SOAK_MAX_BLOCK_GROWTH = 1000
+
+
+class FakeSignal:
+  def __init__(self):
+    self._slots = []
+
+  def connect(self, slot):
+    self._slots.append(slot)
+
+  def emit(self):
+    for slot in self._slots:
+      slot()
+
+
+class FakeReply:
+  """Stands in for QNetworkReply: deleteLater() disconnects all slots."""
+  deleted = 0
+
+  def __init__(self, payload_size: int = 0):
+    self.finished = FakeSignal()
+    self.multi_part = bytearray(payload_size)  # Child owned by the reply.
+
+  def deleteLater(self):  # pylint:disable=invalid-name
+    FakeReply.deleted += 1
+    self.finished = FakeSignal()
+    self.multi_part = None
+
+
+class ReplyRegistryTest(unittest.TestCase):
+  def setUp(self):
+    self.registry = ReplyRegistry()
+    FakeReply.deleted = 0
+
+  def test_finished_runsCallbackOnceAndDisposes(self):
+    reply = FakeReply()
+    calls = []
+    self.registry.add(reply, lambda: calls.append(reply))
+    self.assertIn(reply, self.registry)
+    finished = reply.finished
+    finished.emit()
+    finished.emit()  # Qt does not, but must be harmless.
+    self.assertEqual([reply], calls)
+    self.assertEqual(0, len(self.registry))
+    self.assertEqual(1, FakeReply.deleted)
+
+  def test_failingCallback_stillDisposes(self):
+    reply = FakeReply()
+
+    def fail():
+      raise RuntimeError()
+
+    self.registry.add(reply, fail)
+    with self.assertRaises(RuntimeError):
+      reply.finished.emit()
+    self.assertEqual(0, len(self.registry))
+    self.assertEqual(1, FakeReply.deleted)
+
+  def test_inFlight_keepsCallbacks(self):
+    replies = [FakeReply() for _ in range(3)]
+    for reply in replies:
+      self.registry.add(reply, lambda: None)
+    replies[1].finished.emit()  # Aborted replies also emit finished.
+    self.assertEqual(2, len(self.registry))
+    self.assertNotIn(replies[1], self.registry)
+
+  def test_soak_memoryStaysFlat(self):
+    def simulate(requests: int) -> None:
+      for _ in range(requests):
+        reply = FakeReply(payload_size=64)
+        self.registry.add(reply, lambda: None)
+        reply.finished.emit()
+
+    simulate(1000)  # Warm up allocator caches.
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    simulate(_SOAK_REQUESTS)
+    gc.collect()
+    self.assertEqual(0, len(self.registry))
+    self.assertEqual(_SOAK_REQUESTS + 1000, FakeReply.deleted)
+    self.assertLess(sys.getallocatedblocks() - blocks_before,
+                    _SOAK_MAX_BLOCK_GROWTH)
+
+
+if __name__ == '__main__':
+  unittest.main()
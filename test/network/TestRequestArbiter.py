@@ -0,0 +1,135 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+import unittest
+
+from src.metrics import Metrics
+from src.network import RequestArbiter
+from src.network.RequestArbiter import Priority
+
+
+class RequestArbiterTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 0.0
+    self.arbiter = RequestArbiter.RequestArbiter(clock=lambda: self.now)
+    self.sent = []
+    self.done_callbacks = []
+
+  def _start(self, name):
+    def start(done):
+      self.sent.append(name)
+      self.done_callbacks.append(done)
+    return start
+
+  def test_submit_sendsOneAtATime(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.arbiter.submit(Priority.COMMAND, self._start('b'))
+    self.assertEqual(['a'], self.sent)
+    self.assertEqual(1, self.arbiter.queue_depth)
+    self.done_callbacks[0]()
+    self.assertEqual(['a', 'b'], self.sent)
+
+  def test_submit_servesHigherPriorityFirst(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('busy'))
+    self.arbiter.submit(Priority.UPLOAD, self._start('upload'))
+    self.arbiter.submit(Priority.COMMAND, self._start('temperature'))
+    self.arbiter.submit(Priority.CONTROL, self._start('cancel'))
+    for index in range(3):
+      self.done_callbacks[index]()
+    self.assertEqual(['busy', 'cancel', 'temperature', 'upload'], self.sent)
+
+  def test_poll_droppedWhenWorkIsQueued(self):
+    dropped = []
+    self.arbiter.submit(Priority.COMMAND, self._start('busy'))
+    self.arbiter.submit(Priority.COMMAND, self._start('temperature'))
+    ticket = self.arbiter.submit(Priority.POLL, self._start('poll'),
+                                 on_dropped=lambda: dropped.append(True))
+    self.assertIsNone(ticket)
+    self.assertEqual([True], dropped)
+
+  def test_queuedPoll_droppedByNewWork(self):
+    dropped = []
+    self.arbiter.submit(Priority.COMMAND, self._start('busy'))
+    self.arbiter.submit(Priority.POLL, self._start('poll'),
+                        on_dropped=lambda: dropped.append(True))
+    self.arbiter.submit(Priority.UPLOAD, self._start('upload'))
+    self.done_callbacks[0]()
+    self.assertEqual([True], dropped)
+    self.assertEqual(['busy', 'upload'], self.sent)
+
+  def test_cancel_removesQueuedRequest(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('busy'))
+    ticket = self.arbiter.submit(Priority.UPLOAD, self._start('upload'))
+    self.assertTrue(self.arbiter.cancel(ticket))
+    self.done_callbacks[0]()
+    self.assertEqual(['busy'], self.sent)
+    self.assertFalse(self.arbiter.is_busy)
+
+  def test_cancel_sentRequest_fails(self):
+    ticket = self.arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.assertFalse(self.arbiter.cancel(ticket))
+
+  def test_done_isIdempotent(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.arbiter.submit(Priority.COMMAND, self._start('b'))
+    self.arbiter.submit(Priority.COMMAND, self._start('c'))
+    self.done_callbacks[0]()
+    self.done_callbacks[0]()
+    self.assertEqual(['a', 'b'], self.sent)
+
+  def test_waitStats(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.arbiter.submit(Priority.UPLOAD, self._start('upload'))
+    self.now = 4.0
+    self.done_callbacks[0]()
+    count, mean_secs, max_secs = self.arbiter.get_wait_stats()['UPLOAD']
+    self.assertEqual((1, 4.0, 4.0), (count, mean_secs, max_secs))
+
+  def test_onWaited_calledWithPriorityAndWait(self):
+    waited = []
+    arbiter = RequestArbiter.RequestArbiter(
+        clock=lambda: self.now,
+        on_waited=lambda priority, secs: waited.append((priority, secs)))
+    arbiter.submit(Priority.COMMAND, self._start('a'))
+    arbiter.submit(Priority.UPLOAD, self._start('upload'))
+    self.now = 4.0
+    self.done_callbacks[0]()
+    self.assertEqual([(Priority.COMMAND, 0.0), (Priority.UPLOAD, 4.0)], waited)
+
+  def test_dispatcher_startsRequests(self):
+    dispatched = []
+    arbiter = RequestArbiter.RequestArbiter(dispatcher=dispatched.append)
+    arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.assertEqual([], self.sent)
+    dispatched[0]()
+    self.assertEqual(['a'], self.sent)
+
+  def test_doneFromAnotherThread(self):
+    self.arbiter.submit(Priority.COMMAND, self._start('a'))
+    self.arbiter.submit(Priority.COMMAND, self._start('b'))
+    thread = threading.Thread(target=self.done_callbacks[0])
+    thread.start()
+    thread.join()
+    self.assertEqual(['a', 'b'], self.sent)
+
+  def test_getArbiter_sharedPerAddress(self):
+    self.assertIs(RequestArbiter.get_arbiter('10.0.0.1'),
+                  RequestArbiter.get_arbiter('10.0.0.1'))
+    self.assertIsNot(RequestArbiter.get_arbiter('10.0.0.1'),
+                     RequestArbiter.get_arbiter('10.0.0.2'))
+    RequestArbiter.remove_arbiter('10.0.0.1')
+    RequestArbiter.remove_arbiter('10.0.0.2')
+
+  def test_getArbiter_exportsWaitTimes(self):
+    arbiter = RequestArbiter.get_arbiter('10.0.0.3')
+    arbiter.submit(Priority.COMMAND, lambda done: done())
+    self.assertIn('mpsm2_request_wait_seconds_count{printer="10.0.0.3",'
+                  'priority="command"} 1', Metrics.REGISTRY.render())
+    RequestArbiter.remove_arbiter('10.0.0.3')
+    self.assertNotIn('printer="10.0.0.3"', Metrics.REGISTRY.render())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,55 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.RttEstimator import RttEstimator
+
+
+class RttEstimatorTest(unittest.TestCase):
+  def test_noSamples_usesInitialTimeout(self):
+    self.assertEqual(2, RttEstimator(initial_timeout_secs=2).timeout_secs)
+
+  def test_firstSample_setsTimeout(self):
+    estimator = RttEstimator()
+    estimator.add_sample(0.2)
+    self.assertEqual(0.2, estimator.smoothed_rtt_secs)
+    # 0.2 + 4 * 0.1
+    self.assertAlmostEqual(0.6, estimator.timeout_secs)
+
+  def test_stableLink_shrinksTimeoutToMinimum(self):
+    estimator = RttEstimator(min_timeout_secs=0.5)
+    for _ in range(50):
+      estimator.add_sample(0.05)
+    self.assertEqual(0.5, estimator.timeout_secs)
+
+  def test_slowLink_growsTimeout(self):
+    estimator = RttEstimator(max_timeout_secs=10)
+    for _ in range(50):
+      estimator.add_sample(3)
+    self.assertGreater(estimator.timeout_secs, 3)
+    self.assertLessEqual(estimator.timeout_secs, 10)
+
+  def test_timeout_backsOffUntilNextSample(self):
+    estimator = RttEstimator(initial_timeout_secs=1, max_timeout_secs=10)
+    estimator.on_timeout()
+    self.assertEqual(2, estimator.timeout_secs)
+    estimator.on_timeout()
+    self.assertEqual(4, estimator.timeout_secs)
+    estimator.on_timeout()
+    estimator.on_timeout()
+    self.assertEqual(10, estimator.timeout_secs)
+    self.assertEqual(4, estimator.timeout_count)
+    estimator.add_sample(0.1)
+    self.assertEqual(0.5, estimator.timeout_secs)
+
+  def test_invalidTimeouts_fails(self):
+    with self.assertRaises(ValueError):
+      RttEstimator(initial_timeout_secs=20, max_timeout_secs=10)
+    with self.assertRaises(ValueError):
+      RttEstimator(min_timeout_secs=0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,53 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+import unittest
+
+from src.network.StatusMailbox import StatusMailbox
+
+
+class StatusMailboxTest(unittest.TestCase):
+  def setUp(self):
+    self.mailbox = StatusMailbox()
+
+  def test_drain_empty(self):
+    self.assertEqual({}, self.mailbox.drain())
+
+  def test_keeps_newest_per_printer(self):
+    self.mailbox.put('a', 'T1/0P1/0/0I')
+    self.mailbox.put('b', 'timeout')
+    self.mailbox.put('a', 'T2/0P2/0/0I')
+    self.assertEqual({'a': 'T2/0P2/0/0I', 'b': 'timeout'},
+                     self.mailbox.drain())
+    self.assertEqual(1, self.mailbox.superseded_count)
+
+  def test_drain_clears(self):
+    self.mailbox.put('a', 'timeout')
+    self.mailbox.drain()
+    self.assertEqual({}, self.mailbox.drain())
+
+  def test_discard(self):
+    self.mailbox.put('a', 'timeout')
+    self.mailbox.discard('a')
+    self.mailbox.discard('b')
+    self.assertEqual({}, self.mailbox.drain())
+
+  def test_concurrent_puts(self):
+    def put(address):
+      for index in range(1000):
+        self.mailbox.put(address, str(index))
+
+    threads = [threading.Thread(target=put, args=(str(address),))
+               for address in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual({str(address): '999' for address in range(8)},
+                     self.mailbox.drain())
+
+
+if __name__ == '__main__':
+  unittest.main()
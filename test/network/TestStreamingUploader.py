@@ -0,0 +1,82 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import asyncio
+import socket
+import threading
+import unittest
+
+from src.network.GCodeStream import GCodeStream
+from src.network.StreamingUploader import StreamingUploader
+from test.headless.FakePrinterServer import FakePrinterServer
+
+
+class StreamingUploaderTest(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.printer = FakePrinterServer()
+    await self.printer.start()
+    self.stream = GCodeStream(max_buffered_bytes=16)
+    self.callbacks = []
+    self.called_back = threading.Event()
+    self.closed = threading.Event()
+
+  async def asyncTearDown(self):
+    await self.printer.stop()
+
+  def _create_uploader(self, port: int) -> StreamingUploader:
+    return StreamingUploader(
+        '127.0.0.1', 'model.gcode', self.stream,
+        on_finished=lambda body: self._call_back('finished', body),
+        on_progress=lambda sent, total: self.callbacks.append(
+            ('progress', sent, total)),
+        on_error=lambda: self._call_back('error'),
+        on_closed=self.closed.set,
+        dispatcher=lambda function: function(),
+        stall_timeout_secs=1, port=port)
+
+  def _call_back(self, *args):
+    self.callbacks.append(args)
+    self.called_back.set()
+
+  async def test_uploads_while_writing(self):
+    uploader = self._create_uploader(self.printer.port)
+    uploader.start()
+    gcode = ''.join(f';LAYER:{layer}\n' for layer in range(10))
+    for line in gcode.splitlines(keepends=True):
+      await asyncio.to_thread(self.stream.write, line)
+    self.stream.finish()
+    self.assertTrue(await asyncio.to_thread(self.called_back.wait, 5))
+    self.assertEqual(('finished', 'OK'), self.callbacks[-1])
+    self.assertIn(('progress', len(gcode), len(gcode)), self.callbacks)
+    upload = self.printer.uploads[0]
+    self.assertIn(b'filename="model.gcode"', upload)
+    self.assertIn(gcode.encode('utf-8'), upload)
+    self.assertEqual(['/upload'], self.printer.paths)
+    self.assertTrue(await asyncio.to_thread(self.closed.wait, 5))
+
+  async def test_cancel_stops_writer_without_callbacks(self):
+    uploader = self._create_uploader(self.printer.port)
+    uploader.start()
+    await asyncio.to_thread(self.stream.write, 'G28\n')
+    uploader.cancel()
+    await asyncio.to_thread(uploader.join, 5)
+    self.assertTrue(self.stream.is_cancelled)
+    self.assertFalse(self.called_back.is_set())
+    self.assertTrue(self.closed.is_set())
+    self.assertEqual([], self.printer.uploads)
+
+  async def test_connection_error_detaches_writer(self):
+    with socket.socket() as unused:
+      unused.bind(('127.0.0.1', 0))
+      port = unused.getsockname()[1]
+    uploader = self._create_uploader(port)
+    uploader.start()
+    self.assertTrue(await asyncio.to_thread(self.called_back.wait, 5))
+    self.assertEqual(('error',), self.callbacks[-1])
+    self.stream.write('G28\n' * 10)  # Does not block.
+    self.assertFalse(self.stream.is_cancelled)
+
+
+if __name__ == '__main__':
+  unittest.main()
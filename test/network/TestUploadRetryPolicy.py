@@ -0,0 +1,39 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.UploadRetryPolicy import UploadRetryPolicy
+
+
+class UploadRetryPolicyTest(unittest.TestCase):
+  def test_delayGrowsExponentially(self):
+    policy = UploadRetryPolicy(initial_delay_secs=5, max_delay_secs=1000,
+                               multiplier=2)
+    self.assertEqual(5, policy.get_delay_secs(0))
+    self.assertEqual(10, policy.get_delay_secs(1))
+    self.assertEqual(20, policy.get_delay_secs(2))
+
+  def test_delayIsCapped(self):
+    policy = UploadRetryPolicy(initial_delay_secs=5, max_delay_secs=30)
+    self.assertEqual(30, policy.get_delay_secs(3))
+    self.assertEqual(30, policy.get_delay_secs(100))
+
+  def test_canRetry_untilMaxAttempts(self):
+    policy = UploadRetryPolicy(max_attempts=2)
+    self.assertTrue(policy.can_retry(0))
+    self.assertTrue(policy.can_retry(1))
+    self.assertFalse(policy.can_retry(2))
+
+  def test_invalidArguments_fails(self):
+    with self.assertRaises(ValueError):
+      UploadRetryPolicy(max_attempts=-1)
+    with self.assertRaises(ValueError):
+      UploadRetryPolicy(initial_delay_secs=10, max_delay_secs=5)
+    with self.assertRaises(ValueError):
+      UploadRetryPolicy(multiplier=0.5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,176 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import threading
+import time
+import unittest
+
+from src.network.UploadScheduler import UploadScheduler, parse_segments
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class UploadSchedulerTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    self.started = []
+    self.scheduler = UploadScheduler(['192.168.1.0/25', '192.168.1.128/25'],
+                                     max_concurrency=1, clock=self.clock)
+
+  def _request(self, address):
+    return self.scheduler.request(address,
+                                  lambda: self.started.append(address))
+
+  def test_parseSegments_skipsInvalid(self):
+    self.assertEqual(['192.168.1.0/25', '10.0.0.0/8'],
+                     parse_segments('192.168.1.0/25, foo,10.1.2.3/8,'))
+
+  def test_getSegment(self):
+    self.assertEqual('192.168.1.0/25',
+                     self.scheduler.get_segment('192.168.1.10'))
+    self.assertEqual('192.168.1.128/25',
+                     self.scheduler.get_segment('192.168.1.200'))
+    self.assertEqual('10.0.0.0/24', self.scheduler.get_segment('10.0.0.7'))
+    self.assertEqual('printer.local',
+                     self.scheduler.get_segment('printer.local'))
+
+  def test_noMeasurements_allowsMaxConcurrency(self):
+    scheduler = UploadScheduler(max_concurrency=3)
+    self.assertEqual(3, scheduler.get_concurrency_limit('192.168.1.10'))
+    for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+      self.assertTrue(scheduler.request(address, lambda: None))
+    self.assertFalse(scheduler.request('10.0.0.4', lambda: None))
+
+  def test_limitReached_queuesPerSegment(self):
+    self.assertTrue(self._request('192.168.1.10'))
+    self.assertFalse(self._request('192.168.1.11'))
+    self.assertTrue(self._request('192.168.1.200'))  # Other segment.
+    self.assertEqual(['192.168.1.10', '192.168.1.200'], self.started)
+    self.assertTrue(self.scheduler.is_queued('192.168.1.11'))
+    self.assertTrue(self.scheduler.is_segment_busy('192.168.1.99'))
+
+  def test_finish_startsQueuedUpload(self):
+    self._request('192.168.1.10')
+    self._request('192.168.1.11')
+    self.clock.now = 10
+    self.scheduler.finish('192.168.1.10', 10000, success=True)
+    self.assertEqual(['192.168.1.10', '192.168.1.11'], self.started)
+    self.assertFalse(self.scheduler.is_queued('192.168.1.11'))
+
+  def test_cancel_removesQueuedUpload(self):
+    self._request('192.168.1.10')
+    self._request('192.168.1.11')
+    self.scheduler.cancel('192.168.1.11')
+    self.scheduler.cancel('192.168.1.10')
+    self.assertEqual(['192.168.1.10'], self.started)
+    self.assertFalse(self.scheduler.is_segment_busy('192.168.1.10'))
+
+  def test_cancelBeforeDispatch_doesNotStart(self):
+    dispatched = []
+    scheduler = UploadScheduler(max_concurrency=1,
+                                dispatcher=dispatched.append,
+                                clock=self.clock)
+    scheduler.request('10.0.0.1', lambda: None)
+    scheduler.request('10.0.0.2', lambda: self.started.append('10.0.0.2'))
+    scheduler.cancel('10.0.0.1')
+    scheduler.cancel('10.0.0.2')
+    dispatched[0]()
+    self.assertEqual([], self.started)
+
+  def test_scalingThroughput_keepsMaxConcurrency(self):
+    scheduler = UploadScheduler(clock=self.clock)
+    scheduler.request('10.0.0.1', lambda: None)
+    scheduler.request('10.0.0.2', lambda: None)
+    self.clock.now = 10
+    scheduler.finish('10.0.0.1', 9000, success=True)
+    scheduler.finish('10.0.0.2', 9000, success=True)  # 1800 B/s.
+    self.assertEqual(4, scheduler.get_concurrency_limit('10.0.0.1'))
+
+  def test_saturatedThroughput_settlesOnFewestUploads(self):
+    scheduler = UploadScheduler(stats={'10.0.0.0/24': {'1': 1000,
+                                                       '2': 1800,
+                                                       '3': 1850}})
+    self.assertEqual(2, scheduler.get_concurrency_limit('10.0.0.1'))
+
+  def test_limit_cappedByMaxConcurrency(self):
+    scheduler = UploadScheduler(max_concurrency=2,
+                                stats={'10.0.0.0/24': {'1': 1000,
+                                                       '2': 1800}})
+    self.assertEqual(2, scheduler.get_concurrency_limit('10.0.0.1'))
+
+  def test_failureUnderContention_lowersLimit(self):
+    scheduler = UploadScheduler(stats={'10.0.0.0/24': {'1': 1000}},
+                                clock=self.clock)
+    scheduler.request('10.0.0.1', lambda: None)
+    scheduler.request('10.0.0.2', lambda: None)
+    self.clock.now = 10
+    scheduler.finish('10.0.0.1', 0, success=False)
+    scheduler.finish('10.0.0.2', 0, success=False)
+    self.assertEqual(1, scheduler.get_concurrency_limit('10.0.0.1'))
+    self.assertEqual({'10.0.0.0/24': {'1': 1000.0, '2': 0.0}},
+                     scheduler.to_dict())
+
+  def test_onlyFailures_backsOffBelowFailedConcurrency(self):
+    scheduler = UploadScheduler(stats={'10.0.0.0/24': {'3': 0, '4': 0}})
+    self.assertEqual(2, scheduler.get_concurrency_limit('10.0.0.1'))
+
+  def test_failureAlone_isNotMeasured(self):
+    self._request('192.168.1.10')
+    self.clock.now = 10
+    self.scheduler.finish('192.168.1.10', 0, success=False)
+    self.assertEqual({'192.168.1.0/25': {}}, self.scheduler.to_dict())
+
+  def test_concurrency_isTimeWeighted(self):
+    scheduler = UploadScheduler(stats={'10.0.0.0/24': {'1': 1000}},
+                                clock=self.clock)
+    scheduler.request('10.0.0.1', lambda: None)
+    self.clock.now = 1
+    scheduler.request('10.0.0.2', lambda: None)
+    self.clock.now = 2
+    scheduler.finish('10.0.0.2', 1000, success=True)
+    self.clock.now = 10
+    scheduler.finish('10.0.0.1', 10000, success=True)
+    # 10.0.0.1 shared the segment 1s out of 10s: measured alone.
+    self.assertEqual({'1': 1000.0, '2': 2000.0},
+                     scheduler.to_dict()['10.0.0.0/24'])
+
+  def test_isSegmentBusy_doesNotCreateSegments(self):
+    self.assertFalse(self.scheduler.is_segment_busy('10.0.0.1'))
+    self.assertEqual({}, self.scheduler.to_dict())
+
+  def test_yieldToPolls_waitsForPollOnSameSegment(self):
+    poll_started = threading.Event()
+    release_poll = threading.Event()
+
+    def poll():
+      with self.scheduler.reserve_poll('192.168.1.11'):
+        poll_started.set()
+        release_poll.wait()
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    poll_started.wait()
+    started_at = time.monotonic()
+    self.scheduler.yield_to_polls('192.168.1.200')  # Other segment.
+    self.assertLess(time.monotonic() - started_at, 0.5)
+    threading.Timer(0.1, release_poll.set).start()
+    self.scheduler.yield_to_polls('192.168.1.10', max_wait_secs=5)
+    self.assertTrue(release_poll.is_set())
+    thread.join()
+
+  def test_yieldToPolls_givesUpAfterMaxWait(self):
+    with self.scheduler.reserve_poll('192.168.1.11'):
+      started_at = time.monotonic()
+      self.scheduler.yield_to_polls('192.168.1.10', max_wait_secs=0.05)
+      self.assertGreaterEqual(time.monotonic() - started_at, 0.05)
+
+
+if __name__ == '__main__':
+  unittest.main()
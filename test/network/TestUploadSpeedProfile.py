@@ -0,0 +1,69 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.network.UploadSpeedProfile import DEFAULT_SPEED_LEVEL, UploadSpeedProfile
+
+
+class UploadSpeedProfileTest(unittest.TestCase):
+  def test_noMeasurements_prefersFastestLevel(self):
+    self.assertEqual(4, UploadSpeedProfile().get_best_level())
+
+  def test_unsupportedLevel_isSkipped(self):
+    profile = UploadSpeedProfile()
+    profile.mark_unsupported(4)
+    self.assertEqual(3, profile.get_best_level())
+
+  def test_allLevelsUnsupported_fallsBackToDefault(self):
+    profile = UploadSpeedProfile()
+    for level in (4, 3, 2):
+      profile.mark_unsupported(level)
+    self.assertEqual(DEFAULT_SPEED_LEVEL, profile.get_best_level())
+
+  def test_unreliableLevel_isSkipped(self):
+    profile = UploadSpeedProfile()
+    profile.record_upload(4, 0, 0, success=False)
+    self.assertEqual(4, profile.get_best_level())
+    profile.record_upload(4, 0, 0, success=False)
+    self.assertEqual(3, profile.get_best_level())
+
+  def test_successAfterFailures_restoresLevel(self):
+    profile = UploadSpeedProfile()
+    profile.record_upload(4, 0, 0, success=False)
+    profile.record_upload(4, 0, 0, success=False)
+    profile.record_upload(4, 1000, 10, success=True)
+    self.assertEqual(4, profile.get_best_level())
+
+  def test_unreliableLevel_isProbedAgain(self):
+    profile = UploadSpeedProfile()
+    profile.record_upload(4, 2000, 10, success=True)
+    profile.record_upload(4, 0, 0, success=False)
+    profile.record_upload(4, 0, 0, success=False)
+    uploads = 0
+    while profile.get_best_level() != 4 and uploads < 100:
+      profile.record_upload(3, 1000, 10, success=True)
+      uploads += 1
+    self.assertEqual(4, uploads)
+    profile.record_upload(4, 0, 0, success=False)  # Probe fails again.
+    self.assertEqual(3, profile.get_best_level())
+
+  def test_measuredLevels_picksFastest(self):
+    profile = UploadSpeedProfile()
+    profile.record_upload(4, 1000, 10, success=True)
+    profile.record_upload(3, 3000, 10, success=True)
+    self.assertEqual(100, profile.get_throughput(4))
+    self.assertEqual(3, profile.get_best_level())
+
+  def test_toDict_roundTrips(self):
+    profile = UploadSpeedProfile()
+    profile.mark_unsupported(4)
+    profile.record_upload(3, 2000, 10, success=True)
+    restored = UploadSpeedProfile(profile.to_dict())
+    self.assertEqual(200, restored.get_throughput(3))
+    self.assertEqual(3, restored.get_best_level())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -21,6 +21,12 @@ class GcodePreheatSettingsParserTest(unittest.TestCase):
     self.assertTupleEqual(
         (65, 205), GcodePreheatSettingsParser.parse(str.encode(gcode)))
 
+  def test_scannerChunksSplittingLines_success(self):
+    scanner = GcodePreheatSettingsParser.PreheatScanner()
+    for chunk in (b'M19', b'0 S65\nM104 S2', b'05\nM109 S2', b'05'):
+      scanner.feed(chunk)
+    self.assertTupleEqual((65, 205), scanner.get_temperatures())
+
   def test_parseOnlyPreheatBedTemperature_success(self):
     gcode = """
     M190 S65
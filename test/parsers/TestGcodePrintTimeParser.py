@@ -0,0 +1,54 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.parsers import GcodePrintTimeParser
+
+
+class GcodePrintTimeParserTest(unittest.TestCase):
+  def test_parses_markers(self):
+    gcode = (b';FLAVOR:Marlin\n;TIME:300\n'
+             b';LAYER:0\nG1 X1\n;TIME_ELAPSED:100.5\n'
+             b';LAYER:1\nG1 X2\n;TIME_ELAPSED:250\n'
+             b'M104 S0\n')
+    table = GcodePrintTimeParser.parse(gcode)
+    self.assertEqual(2, len(table))
+    self.assertEqual(300, table.total_secs)
+    self.assertEqual(len(gcode), table.total_bytes)
+    position = gcode.find(b';TIME_ELAPSED:250')
+    self.assertAlmostEqual(
+        250, table.get_elapsed_secs(100 * position / len(gcode)))
+
+  def test_without_markers(self):
+    self.assertIsNone(GcodePrintTimeParser.parse(b';TIME:300\nG28\n'))
+
+  def test_without_total_time(self):
+    table = GcodePrintTimeParser.parse(b'G28\n;TIME_ELAPSED:42\n')
+    self.assertEqual(42, table.total_secs)
+
+  def test_skips_invalid_markers(self):
+    table = GcodePrintTimeParser.parse(
+        b';TIME_ELAPSED:10\n;TIME_ELAPSED:abc\n;TIME_ELAPSED:5\n'
+        b';TIME_ELAPSED:20')
+    self.assertEqual(2, len(table))
+    self.assertEqual(20, table.total_secs)
+
+  def test_scanner_chunks_splitting_markers(self):
+    gcode = (b';FLAVOR:Marlin\n;TIME:300\n'
+             b';LAYER:0\nG1 X1\n;TIME_ELAPSED:100.5\n'
+             b';LAYER:1\nG1 X2\n;TIME_ELAPSED:250')
+    scanner = GcodePrintTimeParser.PrintTimeScanner()
+    for start in range(0, len(gcode), 7):
+      scanner.feed(gcode[start:start + 7])
+    table = scanner.get_table()
+    expected = GcodePrintTimeParser.parse(gcode)
+    self.assertEqual(expected.total_secs, table.total_secs)
+    self.assertEqual(expected.total_bytes, table.total_bytes)
+    self.assertEqual(expected.get_elapsed_secs(50),
+                     table.get_elapsed_secs(50))
+
+
+if __name__ == '__main__':
+  unittest.main()
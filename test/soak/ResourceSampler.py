@@ -0,0 +1,112 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import gc
+import os
+import resource
+import threading
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+# Resource name -> sampled value.
+Sample = Dict[str, int]
+
+_PROC_FD_DIRECTORY = '/proc/self/fd'
+_PROC_STATM = '/proc/self/statm'
+
+
+def _count_file_descriptors() -> Dict[str, int]:
+  """Returns open file descriptors and how many of them are sockets.
+
+  Only available on Linux. Elsewhere, both are 0.
+  """
+  try:
+    descriptors = os.listdir(_PROC_FD_DIRECTORY)
+  except OSError:
+    return {'open_files': 0, 'sockets': 0}
+  sockets = 0
+  for descriptor in descriptors:
+    try:
+      if os.readlink(os.path.join(_PROC_FD_DIRECTORY,
+                                  descriptor)).startswith('socket:'):
+        sockets += 1
+    except OSError:
+      pass  # Closed while listing, e.g. the directory itself.
+  return {'open_files': len(descriptors), 'sockets': sockets}
+
+
+def _get_rss_bytes() -> int:
+  """Returns the resident set size of the process.
+
+  Falls back to the peak resident set size where /proc is unavailable.
+  """
+  try:
+    with open(_PROC_STATM, encoding='ascii') as statm:
+      return int(statm.read().split()[1]) * resource.getpagesize()
+  except (OSError, IndexError, ValueError):
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceSampler:
+  """Samples resources of the current process that must not grow over time."""
+
+  def __init__(self,
+               probes: Optional[Dict[str, Callable[[], int]]] = None) -> None:
+    """Constructor.
+
+    Args:
+      probes: Extra resources to count, for example live QTimers.
+    """
+    self._probes = probes or {}
+
+  def sample(self) -> Sample:
+    """Returns the current usage of every resource."""
+    gc.collect()
+    sample = {
+        'threads': threading.active_count(),
+        'python_objects': len(gc.get_objects()),
+        'rss_bytes': _get_rss_bytes(),
+    }
+    sample.update(_count_file_descriptors())
+    for name, probe in self._probes.items():
+      sample[name] = probe()
+    return sample
+
+
+def find_violations(baseline: Sample, final: Sample,
+                    max_growth: Dict[str, int]) -> List[str]:
+  """Returns a description of every resource that grew past its limit.
+
+  Args:
+    baseline: Sample after warm-up.
+    final: Sample at the end of the run.
+    max_growth: Resource name -> maximum growth allowed.
+  """
+  violations = []
+  for name, limit in sorted(max_growth.items()):
+    if name not in baseline or name not in final:
+      continue
+    growth = final[name] - baseline[name]
+    if growth > limit:
+      violations.append(f'{name} grew by {growth} '
+                        f'({baseline[name]} -> {final[name]}), '
+                        f'limit is {limit}.')
+  return violations
+
+
+def get_top_allocators(before: tracemalloc.Snapshot,
+                       after: tracemalloc.Snapshot,
+                       limit: int = 10) -> List[str]:
+  """Returns the source lines whose allocations grew the most.
+
+  Args:
+    before: Snapshot after warm-up.
+    after: Snapshot at the end of the run.
+    limit: Maximum number of lines.
+  """
+  filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+  differences = after.filter_traces(filters).compare_to(
+      before.filter_traces(filters), 'lineno')
+  return [str(difference) for difference in differences[:limit]
+          if difference.size_diff > 0]
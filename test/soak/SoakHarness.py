@@ -0,0 +1,426 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+
+Simulates days of fleet traffic against local stand-in printers and fails if
+threads, sockets, file descriptors, Python objects or memory keep growing.
+
+Time is accelerated: every heartbeat tick polls all printers at once, without
+waiting. Uploads, cancels and printers going offline follow the simulated
+clock. Runs the networking code shared with the plugin: request arbiters,
+status mailbox, connection health, sampled logging, metrics and streaming
+uploads. Qt-bound classes (DeviceManager, PrinterHeartbeat and the output
+device) need a running Cura and are not covered.
+
+Usage, from the plugin directory:
+  python -m test.soak.SoakHarness --days 7 --printers 8 --report soak.txt
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+# pylint:disable=relative-beyond-top-level
+from src.headless.AsyncApiClient import ApiError, AsyncApiClient
+from src.metrics import Metrics
+from src.network.ConnectionHealth import ConnectionHealth
+from src.network.GCodeStream import GCodeStream
+from src.network.RequestArbiter import Priority, RequestArbiter
+from src.network.StatusMailbox import StatusMailbox
+from src.network.StreamingUploader import StreamingUploader
+from src.utils.SampledLogger import SampledLogger
+from test.headless.FakePrinterServer import FakePrinterServer
+from test.soak.ResourceSampler import (ResourceSampler, Sample,
+                                       find_violations, get_top_allocators)
+
+_SECS_PER_DAY = 24 * 3600
+_TIMEOUT_RESPONSE = 'timeout'
+# G-code line written by the simulated slicer.
+_GCODE_LINE = 'G1 X100.000 Y100.000 E1.00000\n'
+_GCODE_LINES_PER_WRITE = 128
+
+DEFAULT_MAX_GROWTH = {
+    'threads': 0,
+    'open_files': 0,
+    'sockets': 0,
+    'python_objects': 20000,
+    'rss_bytes': 64 * 1024 * 1024,
+}
+
+
+class Schedule(NamedTuple):
+  """Simulated seconds between events."""
+  heartbeat_secs: float = 2  # Mirrors PrinterHeartbeat.
+  upload_every_secs: float = 4 * 3600
+  cancel_every_uploads: int = 3  # Every n-th upload is cancelled halfway.
+  offline_every_secs: float = 6 * 3600
+  offline_for_secs: float = 10 * 60
+  sample_every_secs: float = 3600
+  warm_up_secs: float = 3600
+
+
+class SimulatedClock:
+  """Monotonic clock driven by the simulation."""
+
+  def __init__(self) -> None:
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+class SoakResult(NamedTuple):
+  """Outcome of a soak run."""
+  counts: Dict[str, int]
+  samples: List[Tuple[float, Sample]]  # Simulated seconds, sample.
+  violations: List[str]
+  top_allocators: List[str]
+
+
+class FleetSoak:
+  """Drives a fleet of stand-in printers on an accelerated schedule."""
+
+  def __init__(self, num_printers: int, schedule: Schedule = Schedule(),
+               upload_bytes: int = 512 * 1024) -> None:
+    """Constructor.
+
+    Args:
+      num_printers: Number of stand-in printers.
+      schedule: When events happen, in simulated seconds.
+      upload_bytes: Approximate size of each uploaded G-code.
+    """
+    self._schedule = schedule
+    self._upload_bytes = upload_bytes
+    self._clock = SimulatedClock()
+    self._printers = [FakePrinterServer(record=False)
+                      for _ in range(num_printers)]
+    self._clients: Dict[str, AsyncApiClient] = {}
+    self._arbiters: Dict[str, RequestArbiter] = {}
+    self._health: Dict[str, ConnectionHealth] = {}
+    self._mailbox = StatusMailbox()
+    self._logger = SampledLogger(lambda level, message: None,
+                                 clock=self._clock)
+    self._registry = Metrics.Registry()
+    self._rtt = self._registry.register(Metrics.Histogram(
+        'soak_heartbeat_rtt_seconds', 'Status poll round-trip time.',
+        ['printer'], Metrics.LATENCY_BUCKETS_SECS))
+    self._timeouts = self._registry.register(Metrics.Counter(
+        'soak_heartbeat_timeouts_total', 'Status polls without response.',
+        ['printer']))
+    self._uploads_in_flight: List[asyncio.Future] = []
+    # G-code writers and uploaders, joined before sampling threads.
+    self._workers: List = []
+    self.counts = {name: 0 for name in (
+        'polls', 'dropped_polls', 'timeouts', 'uploads', 'upload_errors',
+        'cancels', 'offline_events', 'went_offline', 'came_online')}
+
+  async def run(self, simulated_secs: float,
+                sample: Callable[[], Sample]) -> List[Tuple[float, Sample]]:
+    """Runs the simulation.
+
+    Args:
+      simulated_secs: Simulated duration.
+      sample: Samples resources while no upload is in flight.
+
+    Returns:
+      Resource samples, the first one after warm-up.
+    """
+    for printer in self._printers:
+      await printer.start()
+      address = printer.address
+      self._clients[address] = AsyncApiClient(address, timeout_secs=1)
+      self._arbiters[address] = RequestArbiter()
+      self._health[address] = ConnectionHealth()
+    samples = []
+    schedule = self._schedule
+    next_upload_at = schedule.upload_every_secs
+    next_offline_at = schedule.offline_every_secs
+    next_sample_at = schedule.warm_up_secs
+    offline_until: Dict[FakePrinterServer, float] = {}
+    upload_targets = itertools.cycle(self._printers)
+    offline_targets = itertools.cycle(reversed(self._printers))
+    uploads = itertools.count(1)
+    ticks = int(simulated_secs / schedule.heartbeat_secs)
+    for tick in range(ticks + 1):
+      self._clock.now = tick * schedule.heartbeat_secs
+      now = self._clock.now
+      for printer, until in list(offline_until.items()):
+        if now >= until:
+          del offline_until[printer]
+          await printer.start(printer.port)
+      if now >= next_offline_at:
+        next_offline_at += schedule.offline_every_secs
+        printer = next(offline_targets)
+        if printer not in offline_until:
+          self.counts['offline_events'] += 1
+          offline_until[printer] = now + schedule.offline_for_secs
+          await printer.stop()
+      if now >= next_upload_at:
+        next_upload_at += schedule.upload_every_secs
+        cancel = next(uploads) % schedule.cancel_every_uploads == 0
+        self._uploads_in_flight.append(
+            self._upload(next(upload_targets), cancel))
+      await asyncio.gather(*(self._poll(address)
+                             for address in self._clients))
+      self._drain_heartbeats()
+      self._uploads_in_flight = [upload for upload in self._uploads_in_flight
+                                 if not upload.done()]
+      if now >= next_sample_at and not self._uploads_in_flight:
+        self._join_workers()
+        self._registry.render()
+        samples.append((now, sample()))
+        next_sample_at = now + schedule.sample_every_secs
+    await asyncio.gather(*self._uploads_in_flight)
+    self._join_workers()
+    for printer in self._printers:
+      if printer not in offline_until:
+        await printer.stop()
+    return samples
+
+  def _poll(self, address: str) -> asyncio.Future:
+    """Polls a printer's status through its arbiter, like the heartbeat.
+
+    Args:
+      address: Printer's address.
+
+    Returns:
+      Resolved once the poll is over or dropped.
+    """
+    over = asyncio.get_running_loop().create_future()
+
+    def on_over(*_) -> None:
+      if not over.done():
+        over.set_result(None)
+
+    def start(done) -> None:
+      task = asyncio.ensure_future(self._get_status(address))
+      task.add_done_callback(lambda _: done())
+      task.add_done_callback(on_over)
+
+    def on_dropped() -> None:
+      self.counts['dropped_polls'] += 1  # Printer is busy uploading.
+      on_over()
+
+    self._arbiters[address].submit(Priority.POLL, start, on_dropped)
+    return over
+
+  async def _get_status(self, address: str) -> None:
+    """Requests a printer's status and posts the result to the mailbox.
+
+    Args:
+      address: Printer's address.
+    """
+    self.counts['polls'] += 1
+    started_at = time.monotonic()
+    try:
+      model = await self._clients[address].get_printer_status()
+    except ApiError:
+      self._mailbox.put(address, _TIMEOUT_RESPONSE)
+      return
+    self._rtt.labels(address).observe(time.monotonic() - started_at)
+    self._mailbox.put(address, model.state.name)
+
+  def _drain_heartbeats(self) -> None:
+    """Applies the newest poll result of every printer."""
+    for address, response in self._mailbox.drain().items():
+      health = self._health[address]
+      if response == _TIMEOUT_RESPONSE:
+        self.counts['timeouts'] += 1
+        self._timeouts.labels(address).inc()
+        self._logger.log('w', 'heartbeat_timeout', address,
+                         'Printer at %s did not respond.', address)
+        if health.on_failure():
+          self.counts['went_offline'] += 1
+      elif health.on_success():
+        self.counts['came_online'] += 1
+
+  def _upload(self, printer: FakePrinterServer,
+              cancel: bool) -> asyncio.Future:
+    """Streams G-code to a printer through its arbiter.
+
+    Args:
+      printer: Stand-in printer.
+      cancel: Whether to cancel the upload halfway.
+
+    Returns:
+      Resolved once the upload is over.
+    """
+    loop = asyncio.get_running_loop()
+    over = loop.create_future()
+    address = printer.address
+
+    def start(done) -> None:
+      self.counts['uploads'] += 1
+      stream = GCodeStream(max_buffered_bytes=64 * 1024)
+
+      def on_error() -> None:
+        self.counts['upload_errors'] += 1
+
+      def on_closed() -> None:
+        done()
+        over.set_result(None)
+
+      uploader = StreamingUploader(
+          '127.0.0.1', 'soak.gcode', stream, on_finished=lambda _: None,
+          on_progress=lambda *_: None, on_error=on_error, on_closed=on_closed,
+          dispatcher=loop.call_soon_threadsafe, stall_timeout_secs=5,
+          port=printer.port)
+      if cancel:
+        self.counts['cancels'] += 1
+      writer = threading.Thread(
+          target=self._write_gcode,
+          args=(stream, uploader.cancel if cancel else None),
+          name='SoakGCodeWriter')
+      self._workers += [writer, uploader]
+      writer.start()
+      uploader.start()
+
+    self._arbiters[address].submit(Priority.UPLOAD, start)
+    return over
+
+  def _write_gcode(self, stream: GCodeStream,
+                   cancel: Optional[Callable[[], None]]) -> None:
+    """Writes G-code like GCodeWriteFileJob does.
+
+    Args:
+      stream: Stream read by the upload.
+      cancel: Called halfway, like a user cancelling the upload. Can be None.
+    """
+    text = _GCODE_LINE * _GCODE_LINES_PER_WRITE
+    writes = max(1, self._upload_bytes // len(text))
+    for index in range(writes):
+      if cancel and index == writes // 2:
+        cancel()
+      stream.write(text)
+    stream.finish()
+
+  def _join_workers(self) -> None:
+    """Waits for the threads of finished uploads to end."""
+    for worker in self._workers:
+      worker.join()
+    self._workers.clear()
+
+
+def run_soak(num_printers: int, simulated_secs: float,
+             max_growth: Dict[str, int], schedule: Schedule = Schedule(),
+             upload_bytes: int = 512 * 1024,
+             top_allocators: int = 10) -> SoakResult:
+  """Runs a soak test.
+
+  Args:
+    num_printers: Number of stand-in printers.
+    simulated_secs: Simulated duration.
+    max_growth: Resource name -> maximum growth allowed after warm-up.
+    schedule: When events happen, in simulated seconds.
+    upload_bytes: Approximate size of each uploaded G-code.
+    top_allocators: Number of allocation sites to report. 0 disables
+      tracemalloc, which slows the run down.
+
+  Returns:
+    Counts of simulated events, resource samples, limit violations and the
+    allocation sites that grew the most.
+  """
+  soak = FleetSoak(num_printers, schedule, upload_bytes)
+  sampler = ResourceSampler()
+  # Taken with the first sample and with the latest one.
+  snapshots: List[tracemalloc.Snapshot] = []
+
+  def sample() -> Sample:
+    resources = sampler.sample()
+    if top_allocators and not tracemalloc.is_tracing():
+      tracemalloc.start()
+    if top_allocators:
+      snapshots[1 if snapshots else 0:] = [tracemalloc.take_snapshot()]
+    return resources
+
+  try:
+    samples = asyncio.run(soak.run(simulated_secs, sample))
+  finally:
+    tracemalloc.stop()
+  violations = []
+  if len(samples) >= 2:
+    violations = find_violations(samples[0][1], samples[-1][1], max_growth)
+  allocators = []
+  if len(snapshots) == 2:
+    allocators = get_top_allocators(*snapshots, limit=top_allocators)
+  return SoakResult(soak.counts, samples, violations, allocators)
+
+
+def format_report(result: SoakResult) -> str:
+  """Returns a human-readable report of a soak run.
+
+  Args:
+    result: Outcome of the run.
+  """
+  lines = ['Events:']
+  lines += [f'  {name}: {count}' for name, count in result.counts.items()]
+  if result.samples:
+    names = list(result.samples[0][1])
+    lines += ['', 'Samples (simulated hours):',
+              '  ' + '\t'.join(['hour'] + names)]
+    for simulated_secs, sample in result.samples:
+      lines.append('  ' + '\t'.join(
+          [f'{simulated_secs / 3600:.0f}']
+          + [str(sample.get(name, '')) for name in names]))
+  if result.top_allocators:
+    lines += ['', 'Top allocators since warm-up:']
+    lines += [f'  {allocator}' for allocator in result.top_allocators]
+  lines += ['']
+  if len(result.samples) < 2:
+    lines.append('INCONCLUSIVE: run too short to compare samples.')
+  elif result.violations:
+    lines.append('FAIL:')
+    lines += [f'  {violation}' for violation in result.violations]
+  else:
+    lines.append('PASS: no resource grew past its limit.')
+  return '\n'.join(lines)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(
+      description='Soak test of the fleet networking code.')
+  parser.add_argument('--days', type=float, default=1,
+                      help='Simulated days to run.')
+  parser.add_argument('--printers', type=int, default=4,
+                      help='Number of stand-in printers.')
+  parser.add_argument('--upload-kb', type=int, default=512,
+                      help='Size of each uploaded G-code.')
+  parser.add_argument('--top-allocators', type=int, default=10,
+                      help='Allocation sites to report. 0 is faster.')
+  parser.add_argument('--report', help='Also write the report to this file.')
+  for name, limit in DEFAULT_MAX_GROWTH.items():
+    parser.add_argument(f'--max-{name.replace("_", "-")}-growth', type=int,
+                        default=limit, dest=f'max_{name}_growth',
+                        help=f'Maximum growth of {name} after warm-up.')
+  return parser
+
+
+def main(argv: Optional[List[str]] = None, output: TextIO = sys.stdout) -> int:
+  """Runs the soak test.
+
+  Returns:
+    Exit code: 0 if no resource grew past its limit.
+  """
+  args = _build_parser().parse_args(argv)
+  max_growth = {name: getattr(args, f'max_{name}_growth')
+                for name in DEFAULT_MAX_GROWTH}
+  started_at = time.monotonic()
+  result = run_soak(args.printers, args.days * _SECS_PER_DAY, max_growth,
+                    upload_bytes=args.upload_kb * 1024,
+                    top_allocators=args.top_allocators)
+  report = (f'{format_report(result)}\n'
+            f'Simulated {args.days} days in '
+            f'{time.monotonic() - started_at:.0f}s.')
+  print(report, file=output)
+  if args.report:
+    with open(args.report, 'w', encoding='utf-8') as report_file:
+      report_file.write(report + '\n')
+  return 1 if result.violations or len(result.samples) < 2 else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
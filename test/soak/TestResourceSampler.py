@@ -0,0 +1,44 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import tracemalloc
+import unittest
+
+from test.soak.ResourceSampler import (ResourceSampler, find_violations,
+                                       get_top_allocators)
+
+
+class ResourceSamplerTest(unittest.TestCase):
+  def test_sample_includes_resources_and_probes(self):
+    sample = ResourceSampler({'timers': lambda: 3}).sample()
+    self.assertGreaterEqual(sample['threads'], 1)
+    self.assertGreater(sample['python_objects'], 0)
+    self.assertGreater(sample['rss_bytes'], 0)
+    self.assertGreaterEqual(sample['open_files'], sample['sockets'])
+    self.assertEqual(3, sample['timers'])
+
+  def test_find_violations(self):
+    baseline = {'threads': 2, 'sockets': 4, 'python_objects': 100}
+    final = {'threads': 3, 'sockets': 4, 'python_objects': 150}
+    violations = find_violations(
+        baseline, final,
+        {'threads': 0, 'sockets': 0, 'python_objects': 100, 'unknown': 0})
+    self.assertEqual(['threads grew by 1 (2 -> 3), limit is 0.'], violations)
+
+  def test_get_top_allocators(self):
+    tracemalloc.start()
+    try:
+      before = tracemalloc.take_snapshot()
+      leak = [bytearray(1024) for _ in range(100)]
+      after = tracemalloc.take_snapshot()
+    finally:
+      tracemalloc.stop()
+    allocators = get_top_allocators(before, after, limit=1)
+    self.assertEqual(1, len(allocators))
+    self.assertIn('TestResourceSampler.py', allocators[0])
+    self.assertEqual(100, len(leak))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,42 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import io
+import unittest
+
+from test.soak import SoakHarness
+from test.soak.SoakHarness import Schedule
+
+# Every event happens within a few simulated minutes.
+_SHORT_SCHEDULE = Schedule(
+    heartbeat_secs=2, upload_every_secs=60, cancel_every_uploads=2,
+    offline_every_secs=120, offline_for_secs=30, sample_every_secs=60,
+    warm_up_secs=60)
+
+
+class SoakHarnessTest(unittest.TestCase):
+  def test_short_run_covers_all_events(self):
+    result = SoakHarness.run_soak(
+        num_printers=2, simulated_secs=600,
+        max_growth=SoakHarness.DEFAULT_MAX_GROWTH, schedule=_SHORT_SCHEDULE,
+        upload_bytes=64 * 1024, top_allocators=0)
+    self.assertEqual(10, result.counts['uploads'])
+    self.assertEqual(5, result.counts['cancels'])
+    self.assertEqual(5, result.counts['offline_events'])
+    self.assertGreater(result.counts['timeouts'], 0)
+    self.assertGreater(result.counts['went_offline'], 0)
+    self.assertGreater(result.counts['came_online'], 0)
+    self.assertGreater(len(result.samples), 2)
+    self.assertEqual([], result.violations)
+    self.assertIn('PASS', SoakHarness.format_report(result))
+
+  def test_main_fails_if_run_too_short(self):
+    output = io.StringIO()
+    self.assertEqual(1, SoakHarness.main(
+        ['--days', '0', '--printers', '1', '--top-allocators', '0'], output))
+    self.assertIn('INCONCLUSIVE', output.getvalue())
+
+
+if __name__ == '__main__':
+  unittest.main()
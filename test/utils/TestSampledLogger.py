@@ -0,0 +1,72 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.utils.SampledLogger import SampledLogger
+
+
+class _Unformattable:
+  def __str__(self):
+    raise AssertionError('Formatted a suppressed message.')
+
+
+class SampledLoggerTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 0.0
+    self.messages = []
+    self.logger = SampledLogger(
+        sink=lambda level, message: self.messages.append((level, message)),
+        interval_secs=60, clock=lambda: self.now)
+
+  def test_logs_first_message(self):
+    self.logger.log('d', 'request', 'a', 'GET %s', '/inquiry')
+    self.assertEqual([('d', 'GET /inquiry')], self.messages)
+
+  def test_suppressed_messages_are_not_formatted(self):
+    self.logger.log('d', 'request', 'a', 'GET %s', '/inquiry')
+    self.logger.log('d', 'request', 'a', 'GET %s', _Unformattable())
+    self.assertEqual(1, len(self.messages))
+
+  def test_rate_limits_per_printer(self):
+    for _ in range(3):
+      self.logger.log('d', 'request', 'a', 'GET')
+      self.logger.log('d', 'request', 'b', 'GET')
+    self.assertEqual([('d', 'GET'), ('d', 'GET')], self.messages)
+
+  def test_rate_limits_per_key(self):
+    self.logger.log('d', 'request', 'a', 'GET')
+    self.logger.log('w', 'timeout', 'a', 'Timeout')
+    self.assertEqual([('d', 'GET'), ('w', 'Timeout')], self.messages)
+
+  def test_next_message_reports_suppressed_count(self):
+    for _ in range(4):
+      self.logger.log('d', 'request', 'a', 'GET')
+    self.now = 61
+    self.logger.log('d', 'request', 'a', 'GET')
+    self.assertEqual(('d', 'GET (3 similar messages suppressed.)'),
+                     self.messages[1])
+
+  def test_periodic_summary_reports_quiet_kinds(self):
+    self.logger.log('w', 'timeout', 'a', 'Timeout')
+    self.logger.log('w', 'timeout', 'a', 'Timeout')
+    self.now = 61
+    self.logger.log('d', 'request', 'b', 'GET')
+    self.assertEqual(
+        [('w', 'Timeout'), ('d', 'GET'),
+         ('d', 'Suppressed log messages in the last 60s: timeout@a: 1.')],
+        self.messages)
+    self.now = 200
+    self.logger.log('d', 'request', 'b', 'GET')
+    self.assertEqual(('d', 'GET'), self.messages[-1])
+
+  def test_forget(self):
+    self.logger.log('d', 'request', 'a', 'GET')
+    self.logger.forget('a')
+    self.logger.log('d', 'request', 'a', 'GET')
+    self.assertEqual(2, len(self.messages))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+"""
+Copyright 2020 Luc Rubio <luc@loociano.com>
+Plugin is licensed under the GNU Lesser General Public License v3.0.
+"""
+import unittest
+
+from src.utils.StallTracker import StallTracker
+
+
+class StallTrackerTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 0.0
+    self.tracker = StallTracker(0.05, clock=lambda: self.now)
+
+  def _tick_after(self, secs):
+    self.now += secs
+    self.tracker.tick()
+
+  def test_no_stall(self):
+    self.tracker.start()
+    for _ in range(10):
+      self._tick_after(0.05)
+    self.assertAlmostEqual(0.0, self.tracker.stop())
+
+  def test_longest_stall(self):
+    self.tracker.start()
+    self._tick_after(0.05)
+    self._tick_after(1.05)
+    self._tick_after(0.55)
+    self.assertAlmostEqual(1.0, self.tracker.stop())
+
+  def test_stall_before_stop(self):
+    self.tracker.start()
+    self.now += 2.05
+    self.assertAlmostEqual(2.0, self.tracker.stop())
+
+  def test_start_resets(self):
+    self.tracker.start()
+    self._tick_after(1.05)
+    self.tracker.stop()
+    self.now += 10  # Not measured.
+    self.tracker.start()
+    self._tick_after(0.05)
+    self.assertAlmostEqual(0.0, self.tracker.stop())
+
+
+if __name__ == '__main__':
+  unittest.main()